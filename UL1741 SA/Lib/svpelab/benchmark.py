@@ -0,0 +1,605 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import sys
+import os
+import math
+import time
+import json
+import shutil
+import tempfile
+import platform
+import argparse
+
+try:
+    import numpy as np
+except Exception, e:
+    print('Error: numpy python package not found!')  # This will appear in the SVP log file.
+
+import dataset
+import waveform
+import waveform_analysis
+import das
+import device_das_sim
+import vclock
+
+'''
+Benchmarks of the data and analysis hot paths.
+
+Each benchmark is run on synthetic 60 Hz three phase voltage and current waveforms (with 3rd and 5th harmonics and a
+little noise, generated from a fixed seed so runs are reproducible) at a set of sizes given as <duration>s@<rate>,
+for example 10s@24k for 10 seconds at 24000 samples/second. Sizes larger than the limit of a benchmark are skipped
+so the pure Python paths do not run for hours at the largest sizes. Benchmarks of paths that need an optional
+package, such as scipy for freq_from_crossings(), are skipped when the package is not installed.
+
+Each timing is taken as timeit does: the benchmark is repeated until a run takes at least MIN_TIME seconds and the
+time per call is recorded. The minimum and median of the repeats are saved, and the minimum is used for comparisons
+as it is the least affected by other activity on the machine.
+
+Run the benchmarks and save the results as a baseline:
+
+    python benchmark.py run --save baseline.json
+
+Run them again after a change and compare with the baseline. The report lists the change of each benchmark and the
+command exits with status 1 if any benchmark is slower than the baseline by more than the threshold (default 20%):
+
+    python benchmark.py run --compare baseline.json --threshold 0.2
+
+Results saved with --save can also be compared later with 'python benchmark.py compare baseline.json results.json'.
+Baselines are only meaningful on the machine and Python environment they were recorded on.
+'''
+
+DEFAULT_SIZES = ['1s@6k', '10s@12k', '60s@24k', '600s@48k']
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_REPEAT = 5
+MIN_TIME = 0.2
+F_NOM = 60.
+V_RMS = 240.
+I_RMS = 10.
+# DAS records sampled per waveform sample in the DAS sampling benchmark
+DAS_RECORD_RATIO = 100
+DAS_SAMPLE_INTERVAL = 50
+
+RESULTS_VERSION = 1
+
+
+class BenchmarkError(Exception):
+    """
+    Exception to wrap all benchmark generated exceptions.
+    """
+    pass
+
+
+def parse_size(size):
+    """
+    Parse a size string <duration>s@<rate>[k], returning (duration (secs), sample rate (samples/sec)).
+    """
+    try:
+        duration, rate = size.lower().split('@')
+        if duration.endswith('s'):
+            duration = duration[:-1]
+        mult = 1
+        if rate.endswith('k'):
+            rate = rate[:-1]
+            mult = 1000
+        return float(duration), int(float(rate) * mult)
+    except ValueError:
+        raise BenchmarkError('Invalid size: %s, expected <duration>s@<rate>, for example 10s@24k' % (size))
+
+
+def waveforms(duration, sample_rate, phases=3, freq=F_NOM, v_rms=V_RMS, i_rms=I_RMS, pf_angle=-0.3,
+              harmonics=((3, .02), (5, .01)), noise=.001, seed=0):
+    """
+    Synthetic multi-phase waveforms.
+
+    Returns (t, v, i) where t is the time array and v and i are lists of the voltage and current arrays of each
+    phase. Each harmonic is (order, amplitude relative to the fundamental) and noise is the relative amplitude of
+    the added gaussian noise.
+    """
+    rand = np.random.RandomState(seed)
+    n = int(round(duration * sample_rate))
+    t = np.arange(n) / float(sample_rate)
+    w = 2 * math.pi * freq * t
+    v = []
+    i = []
+    for p in range(phases):
+        shift = -2 * math.pi * p / 3.
+        vp = np.sin(w + shift)
+        ip = np.sin(w + shift + pf_angle)
+        for order, amp in harmonics:
+            vp += amp * np.sin(order * (w + shift))
+            ip += 2 * amp * np.sin(order * (w + shift + pf_angle))
+        vp *= v_rms * math.sqrt(2)
+        ip *= i_rms * math.sqrt(2)
+        if noise:
+            vp += rand.normal(0, noise * v_rms, n)
+            ip += rand.normal(0, noise * i_rms, n)
+        v.append(vp)
+        i.append(ip)
+    return t, v, i
+
+
+def waveform_points(phases=3):
+    return (['TIME'] + ['AC_V_%s' % (p + 1) for p in range(phases)] +
+            ['AC_I_%s' % (p + 1) for p in range(phases)])
+
+
+def waveform_dataset(duration, sample_rate, phases=3, **kwargs):
+    """
+    Synthetic waveforms as a Dataset with TIME, AC_V_<n> and AC_I_<n> points.
+    """
+    t, v, i = waveforms(duration, sample_rate, phases=phases, **kwargs)
+    return dataset.Dataset(waveform_points(phases), [c.tolist() for c in [t] + v + i], sample_rate=sample_rate)
+
+
+def waveform_waveform(duration, sample_rate, phases=3, **kwargs):
+    """
+    Synthetic waveforms as a Waveform with Time, AC_V_<n> and AC_I_<n> channels.
+    """
+    t, v, i = waveforms(duration, sample_rate, phases=phases, **kwargs)
+    wfm = waveform.Waveform()
+    wfm.channels = ['Time'] + waveform_points(phases)[1:]
+    wfm.channel_data = [c.tolist() for c in [t] + v + i]
+    wfm.sample_rate = sample_rate
+    wfm.sample_count = len(t)
+    return wfm
+
+
+class BenchScript(object):
+    """
+    Minimal test script for the benchmarks that use the DAS. Log messages are discarded.
+    """
+
+    def __init__(self, results_dir, params=None):
+        self._results_dir = results_dir
+        self.params = params or {}
+
+    def param_value(self, name):
+        return self.params.get(name)
+
+    def log(self, msg):
+        pass
+
+    log_debug = log_warning = log_error = log
+
+    def result_file_path(self, name):
+        return os.path.join(self._results_dir, name)
+
+
+class BenchDAS(das.DAS):
+    """
+    DAS reading a data file with the simulator device.
+    """
+
+    def __init__(self, ts, data_file, sample_interval=DAS_SAMPLE_INTERVAL):
+        das.DAS.__init__(self, ts, 'das')
+        self.params = {'ts': ts, 'points': self.points, 'data_file': data_file, 'use_timestamp': 'Disabled',
+                       'at_end': 'Loop to start'}
+        self.device = device_das_sim.Device(self.params)
+        self.data_points = self.device.data_points
+        self.sample_interval = sample_interval
+        self._init_sc_points()
+
+
+class Benchmark(object):
+    """
+    A benchmark of one hot path.
+
+    setup(ctx) is called once per size with a Context and returns the argument of run(), the timed call. limit is
+    the largest number of waveform samples the benchmark is run at. requires lists the optional modules the
+    benchmarked path needs.
+    """
+
+    def __init__(self, name, setup, run, limit, desc=None, requires=None):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.limit = limit
+        self.desc = desc
+        self.requires = requires or []
+
+    def missing(self):
+        """
+        Return the required modules that can not be imported.
+        """
+        missing = []
+        for module in self.requires:
+            try:
+                __import__(module)
+            except ImportError:
+                missing.append(module)
+        return missing
+
+
+class Context(object):
+    """
+    Waveform data of a size, generated on first use, and a temporary directory for files.
+    """
+
+    def __init__(self, duration, sample_rate, tmp_dir):
+        self.duration = duration
+        self.sample_rate = sample_rate
+        self.samples = int(round(duration * sample_rate))
+        self.tmp_dir = tmp_dir
+        self._waveforms = {}
+
+    def waveforms(self, phases=3):
+        wfm = self._waveforms.get(phases)
+        if wfm is None:
+            wfm = self._waveforms[phases] = waveforms(self.duration, self.sample_rate, phases=phases)
+        return wfm
+
+    def dataset(self):
+        t, v, i = self.waveforms()
+        return dataset.Dataset(waveform_points(len(v)), [c.tolist() for c in [t] + v + i],
+                               sample_rate=self.sample_rate)
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+
+def _append_setup(ctx):
+    ds = ctx.dataset()
+    return ds.points, [list(r) for r in zip(*ds.data)]
+
+
+def _append_run(arg):
+    points, rows = arg
+    ds = dataset.Dataset(list(points))
+    for r in rows:
+        ds.append(r)
+
+
+def _to_csv_setup(ctx):
+    return ctx.dataset(), ctx.path('to_csv.csv')
+
+
+def _to_csv_run(arg):
+    ds, filename = arg
+    ds.to_csv(filename)
+
+
+def _from_csv_setup(ctx):
+    filename = ctx.path('from_csv.csv')
+    ctx.dataset().to_csv(filename)
+    return filename
+
+
+def _from_csv_run(filename):
+    ds = dataset.Dataset()
+    ds.from_csv(filename)
+
+
+def _cycle_rms_setup(ctx):
+    t, v, i = ctx.waveforms()
+    wfm = waveform.Waveform()
+    wfm.channels = ['Time', 'AC_V_1']
+    wfm.channel_data = [t.tolist(), v[0].tolist()]
+    return wfm
+
+
+def _cycle_rms_run(wfm):
+    wfm.compute_cycle_rms('AC_V_1')
+
+
+def _rms_of_signal_setup(ctx):
+    t, v, i = ctx.waveforms()
+    return v[0], ctx.sample_rate
+
+
+def _rms_of_signal_run(arg):
+    v, fs = arg
+    # one cycle window
+    waveform_analysis.calculateRmsOfSignal(v, 1000. / F_NOM, fs)
+
+
+def _harmonic_setup(ctx):
+    t, v, i = ctx.waveforms()
+    n = int(round(ctx.sample_rate / F_NOM))
+    ts = BenchScript(ctx.tmp_dir)
+    return t, v[0], i[0], n, ctx.sample_rate, ts
+
+
+def _harmonic_run(arg):
+    # analysis of each cycle, one cycle per fft so the fft bins are the harmonics
+    t, v, i, n, fs, ts = arg
+    for start in xrange(0, len(t) - n + 1, n):
+        waveform_analysis.harmonic_analysis(t[start:start + n], v[start:start + n], i[start:start + n], fs, ts)
+
+
+def _freq_setup(ctx):
+    # single phase so the largest sizes fit in memory
+    t, v, i = ctx.waveforms(phases=1)
+    return t, v[0], ctx.sample_rate
+
+
+def _freq_run(arg):
+    t, v, fs = arg
+    waveform_analysis.freq_from_crossings(t, v, fs)
+
+
+def _das_setup(ctx):
+    # RMS data file of 1000 records for the simulator device
+    ds = dataset.Dataset(['TIME', 'AC_VRMS_1', 'AC_IRMS_1', 'AC_P_1', 'AC_Q_1', 'AC_FREQ_1'])
+    for k in range(1000):
+        ds.append([k * DAS_SAMPLE_INTERVAL / 1000., V_RMS, I_RMS, V_RMS * I_RMS, 0., F_NOM])
+    filename = ctx.path('das.csv')
+    ds.to_csv(filename)
+    ts = BenchScript(ctx.tmp_dir)
+    daq = BenchDAS(ts, filename)
+    records = max(ctx.samples // DAS_RECORD_RATIO, 1)
+    return ts, daq, records * DAS_SAMPLE_INTERVAL / 1000.
+
+
+def _das_run(arg):
+    ts, daq, duration = arg
+    # sample in virtual time so the benchmark measures the sampling and not the waits
+    saved = vclock.clock
+    vclock.bind(ts, vclock.VirtualClock())
+    try:
+        daq.data_capture(True)
+        ts.sleep(duration)
+        daq.data_capture(False)
+    finally:
+        vclock.clock = saved
+
+
+benchmarks = [
+    Benchmark('dataset_append', _append_setup, _append_run, 3000000,
+              desc='Dataset.append() of each waveform record'),
+    Benchmark('dataset_to_csv', _to_csv_setup, _to_csv_run, 1500000, desc='Dataset.to_csv()'),
+    Benchmark('dataset_from_csv', _from_csv_setup, _from_csv_run, 1500000, desc='Dataset.from_csv()'),
+    Benchmark('waveform_cycle_rms', _cycle_rms_setup, _cycle_rms_run, 3000000,
+              desc='Waveform.compute_cycle_rms() of one channel'),
+    Benchmark('rms_of_signal', _rms_of_signal_setup, _rms_of_signal_run, 3000000,
+              desc='calculateRmsOfSignal() with a one cycle window'),
+    Benchmark('harmonic_analysis', _harmonic_setup, _harmonic_run, 3000000,
+              desc='harmonic_analysis() of each cycle'),
+    Benchmark('freq_from_crossings', _freq_setup, _freq_run, 30000000, desc='freq_from_crossings() of one channel',
+              requires=['scipy.signal']),
+    Benchmark('das_sampling', _das_setup, _das_run, 30000000,
+              desc='DAS data capture of one record per %s waveform samples' % (DAS_RECORD_RATIO)),
+]
+
+
+def timeit(fn, arg, repeat=DEFAULT_REPEAT, min_time=MIN_TIME):
+    """
+    Return the time per call of fn(arg) for each repeat. The number of calls per repeat is doubled until a repeat
+    takes at least min_time.
+    """
+    timer = time.time
+    number = 1
+    while True:
+        start = timer()
+        for k in xrange(number):
+            fn(arg)
+        elapsed = timer() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    times = [elapsed / number]
+    for r in range(repeat - 1):
+        start = timer()
+        for k in xrange(number):
+            fn(arg)
+        times.append((timer() - start) / number)
+    return times, number
+
+
+def environment():
+    env = {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine()}
+    try:
+        env['numpy'] = np.__version__
+    except NameError:
+        pass
+    try:
+        import scipy
+        env['scipy'] = scipy.__version__
+    except ImportError:
+        pass
+    return env
+
+
+def select(names=None):
+    """
+    Return the benchmarks with names starting with one of the names, or all benchmarks if names is None.
+    """
+    selected = [b for b in benchmarks if not names or [n for n in names if b.name.startswith(n)]]
+    if not selected:
+        raise BenchmarkError('No benchmarks match: %s' % (', '.join(names)))
+    return selected
+
+
+def run(sizes=None, names=None, repeat=DEFAULT_REPEAT, min_time=MIN_TIME, log=None):
+    """
+    Run the benchmarks, returning the results dict. names limits the benchmarks run as in select().
+    """
+    if sizes is None:
+        sizes = DEFAULT_SIZES
+    selected = []
+    for b in select(names):
+        missing = b.missing()
+        if missing:
+            if log is not None:
+                log('%-40s skipped, requires %s' % (b.name, ', '.join(missing)))
+            continue
+        selected.append(b)
+    results = {}
+    tmp_dir = tempfile.mkdtemp(prefix='svp_benchmark_')
+    try:
+        for size in sizes:
+            duration, sample_rate = parse_size(size)
+            ctx = Context(duration, sample_rate, tmp_dir)
+            for b in selected:
+                key = '%s/%s' % (b.name, size)
+                if ctx.samples > b.limit:
+                    if log is not None:
+                        log('%-40s skipped, %s samples over limit of %s' % (key, ctx.samples, b.limit))
+                    continue
+                arg = b.setup(ctx)
+                times, number = timeit(b.run, arg, repeat=repeat, min_time=min_time)
+                times.sort()
+                entry = {'min': times[0], 'median': times[len(times) // 2], 'repeat': len(times),
+                         'number': number, 'samples': ctx.samples}
+                results[key] = entry
+                if log is not None:
+                    log('%-40s %10.4f s  (%0.3g Msamples/s)' %
+                        (key, entry['min'], ctx.samples / entry['min'] / 1e6))
+                arg = None
+            ctx = None
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {'version': RESULTS_VERSION, 'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'env': environment(),
+            'results': results}
+
+
+def save(results, filename):
+    f = open(filename, 'w')
+    try:
+        json.dump(results, f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+
+
+def load(filename):
+    f = open(filename, 'r')
+    try:
+        results = json.load(f)
+    finally:
+        f.close()
+    if results.get('version') != RESULTS_VERSION:
+        raise BenchmarkError('Unsupported benchmark results version in %s: %s' % (filename, results.get('version')))
+    return results
+
+
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD, keys=None):
+    """
+    Compare results with a baseline, limited to the benchmark/size keys in keys if given.
+
+    Returns a list of (name, baseline time, time, change, status) rows, change being the relative change of the
+    minimum time and status one of 'ok', 'faster', 'REGRESSED', 'new' or 'missing', and the number of regressions.
+    """
+    base = baseline['results']
+    if keys is not None:
+        base = dict([(k, v) for k, v in base.items() if k in keys])
+    new = results['results']
+    rows = []
+    regressed = 0
+    for key in sorted(set(base) | set(new)):
+        b = base.get(key)
+        n = new.get(key)
+        if b is None:
+            rows.append((key, None, n['min'], None, 'new'))
+        elif n is None:
+            rows.append((key, b['min'], None, None, 'missing'))
+        else:
+            change = n['min'] / b['min'] - 1 if b['min'] > 0 else 0.
+            if change > threshold:
+                status = 'REGRESSED'
+                regressed += 1
+            elif change < -threshold:
+                status = 'faster'
+            else:
+                status = 'ok'
+            rows.append((key, b['min'], n['min'], change, status))
+    return rows, regressed
+
+
+def report(baseline, results, threshold=DEFAULT_THRESHOLD, keys=None, out=sys.stdout):
+    """
+    Write the comparison report and return the number of regressions.
+    """
+    rows, regressed = compare(baseline, results, threshold, keys=keys)
+    for name in sorted(set(baseline.get('env', {})) | set(results.get('env', {}))):
+        b = baseline.get('env', {}).get(name)
+        n = results.get('env', {}).get(name)
+        if b != n:
+            out.write('Warning: %s differs from the baseline: %s -> %s\n' % (name, b, n))
+    out.write('%-40s %12s %12s %9s  %s\n' % ('Benchmark', 'Baseline (s)', 'Current (s)', 'Change', 'Status'))
+    fmt = lambda v: '%12.4f' % v if v is not None else '%12s' % '-'
+    for key, b, n, change, status in rows:
+        out.write('%-40s %s %s %9s  %s\n' % (key, fmt(b), fmt(n), '%+0.1f%%' % (change * 100)
+                                             if change is not None else '-', status))
+    out.write('%s of %s benchmarks regressed more than %0.0f%%\n' % (regressed, len(rows), threshold * 100))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the svpelab data and analysis hot paths.')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('run', help='run the benchmarks')
+    p.add_argument('-s', '--size', action='append', dest='sizes',
+                   help='size <duration>s@<rate>, for example 10s@24k (repeatable, default %s)' %
+                        (' '.join(DEFAULT_SIZES)))
+    p.add_argument('-b', '--benchmark', action='append', dest='names',
+                   help='run only benchmarks with names starting with this (repeatable)')
+    p.add_argument('-r', '--repeat', type=int, default=DEFAULT_REPEAT, help='timing repeats')
+    p.add_argument('--save', help='save the results to this file')
+    p.add_argument('--compare', help='compare the results with this baseline file')
+    p.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                   help='relative slowdown reported as a regression (default %s)' % (DEFAULT_THRESHOLD))
+    p.add_argument('-l', '--list', action='store_true', help='list the benchmarks')
+    p = sub.add_parser('compare', help='compare saved results with a baseline')
+    p.add_argument('baseline')
+    p.add_argument('results')
+    p.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                   help='relative slowdown reported as a regression (default %s)' % (DEFAULT_THRESHOLD))
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        regressed = report(load(args.baseline), load(args.results), args.threshold)
+        return 1 if regressed else 0
+
+    if args.list:
+        for b in benchmarks:
+            missing = b.missing()
+            print('%-24s %s (up to %s samples)%s' % (b.name, b.desc, b.limit,
+                                                    ', requires %s' % (', '.join(missing)) if missing else ''))
+        return 0
+    baseline = None
+    if args.compare:
+        baseline = load(args.compare)
+    log = lambda msg: (sys.stdout.write(msg + '\n'), sys.stdout.flush())
+    results = run(sizes=args.sizes, names=args.names, repeat=args.repeat, log=log)
+    if args.save:
+        save(results, args.save)
+    if baseline is not None:
+        # compare only the benchmarks and sizes that were run
+        keys = set(['%s/%s' % (b.name, size) for b in select(args.names) for size in (args.sizes or DEFAULT_SIZES)])
+        regressed = report(baseline, results, args.threshold, keys=keys)
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import os
+import shutil
+import json
+import hashlib
+
+'''
+Checkpoint and resume of test scripts at step granularity.
+
+A checkpoint records each completed test step, identified by a tuple of the loop values of the step (for example
+(priority, test, power level, sweep) in SA13), together with the result files written by the step. When a script is
+restarted with the same configuration and test parameters, completed steps are skipped. Their result files are copied from the earlier
+run into the new results directory and added to the results, so the final results are complete. The steps are checked
+in the innermost loop only, so the outer loops still set the instrument state (curves, power levels, etc.) before the
+first incomplete step is run.
+
+The checkpoint file is kept in the SVP 'Checkpoints' directory and is named after the test configuration. It starts
+with a hash of the script parameter values, and a checkpoint recorded with different parameter values is discarded.
+Each completed step is appended as one JSON line and flushed to disk, so a step is either recorded complete with all
+of its files or not at all. When a run resumes, the entries are rewritten to a temporary file which then replaces the
+checkpoint, so an interruption during the rewrite does not lose the earlier entries. The checkpoint file is removed
+when the script completes.
+
+    cp = checkpoint.checkpoint_init(ts)
+    for power in power_levels:
+        pv.power_set(power)
+        for count in range(n_r):
+            step = (power, count)
+            if cp is not None and cp.restore(step):
+                continue
+            ... run the step and save filename ...
+            if cp is not None:
+                cp.complete(step, [filename])
+    if cp is not None:
+        cp.close()
+'''
+
+CHECKPOINT_DEFAULT_ID = 'checkpoint'
+CHECKPOINT_DIR = 'Checkpoints'
+
+
+class CheckpointError(Exception):
+    """
+    Exception to wrap all checkpoint generated exceptions.
+    """
+    pass
+
+
+def step_key(step):
+    return json.dumps(list(step))
+
+
+def param_names(group):
+    """
+    Return the names of the parameters of a script info or parameter group, including those of nested groups.
+    """
+    names = [p.name for p in getattr(group, 'params', None) or []]
+    for g in getattr(group, 'param_groups', None) or []:
+        names.extend(param_names(g))
+    return names
+
+
+def params_hash(ts):
+    """
+    Return a hash of the values of the script parameters.
+    """
+    values = [(name, ts.param_value(name)) for name in sorted(set(param_names(ts.info)))]
+    return hashlib.sha1(repr(values)).hexdigest()
+
+
+class Checkpoint(object):
+    """
+    Checkpoint file of a test configuration.
+
+    filename - checkpoint file path.
+    params - hash of the test parameters, a checkpoint recorded with different parameters is discarded.
+    """
+
+    def __init__(self, ts, filename, params=None):
+        self.ts = ts
+        self.filename = filename
+        self.params = params
+        self.steps = {}
+        self.restored = 0
+        self._file = None
+        self._load()
+
+    def _load(self):
+        tmp_filename = self.filename + '.tmp'
+        if not os.path.exists(self.filename) and os.path.exists(tmp_filename):
+            # interrupted between removing the old checkpoint and renaming the complete rewrite on Windows
+            os.rename(tmp_filename, self.filename)
+        if not os.path.exists(self.filename):
+            return
+        f = open(self.filename, 'r')
+        try:
+            lines = f.read().splitlines()
+        finally:
+            f.close()
+        steps = {}
+        params = None
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # partially written last line of an interrupted run
+                continue
+            if 'params' in entry:
+                params = entry['params']
+            elif 'step' in entry:
+                steps[step_key(entry['step'])] = entry
+        if params != self.params:
+            self.ts.log('Checkpoint %s was recorded with different test parameters, discarding it' % (self.filename))
+            return
+        self.steps = steps
+        if self.steps:
+            self.ts.log('Resuming from checkpoint %s, %s completed steps' % (self.filename, len(self.steps)))
+
+    def _open(self):
+        if self._file is None:
+            d = os.path.dirname(self.filename)
+            if d and not os.path.exists(d):
+                os.makedirs(d)
+            # rewrite the valid entries to a temporary file that replaces the checkpoint once it is complete, so the
+            # completed steps are not lost if the run is interrupted during the rewrite
+            tmp_filename = self.filename + '.tmp'
+            self._file = open(tmp_filename, 'w')
+            self._write({'params': self.params})
+            for entry in self.steps.itervalues():
+                self._write(entry)
+            self._file.close()
+            if os.name == 'nt' and os.path.exists(self.filename):
+                # rename does not replace an existing file on Windows
+                os.remove(self.filename)
+            os.rename(tmp_filename, self.filename)
+            self._file = open(self.filename, 'a')
+
+    def _record(self, entry):
+        if self._file is None:
+            # the new file is written with all entries
+            self._open()
+        else:
+            self._write(entry)
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def done(self, step):
+        """
+        Return True if the step was completed in an earlier run.
+        """
+        return step_key(step) in self.steps
+
+    def restore(self, step):
+        """
+        If the step was completed in an earlier run, add its result files to the current results and return True.
+        """
+        entry = self.steps.get(step_key(step))
+        if entry is None:
+            return False
+        for path in entry['files']:
+            name = os.path.basename(path)
+            dest = self.ts.result_file_path(name)
+            if not os.path.exists(path):
+                raise CheckpointError('Checkpoint result file missing: %s' % (path))
+            if os.path.realpath(path) != os.path.realpath(dest):
+                shutil.copyfile(path, dest)
+            self.ts.result_file(name)
+        # record the files at their new location in case the new run is interrupted
+        entry['files'] = [self.ts.result_file_path(os.path.basename(path)) for path in entry['files']]
+        self._record(entry)
+        self.restored += 1
+        self.ts.log('Step %s completed in earlier run, skipping' % (list(step),))
+        return True
+
+    def complete(self, step, files=None):
+        """
+        Record a step as complete with the names of the result files it wrote.
+        """
+        entry = {'step': list(step), 'files': [self.ts.result_file_path(f) for f in (files or [])]}
+        self.steps[step_key(step)] = entry
+        self._record(entry)
+
+    def close(self, complete=True):
+        """
+        Close the checkpoint. The checkpoint file is removed if the script completed.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if complete and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+def params(info, group_name=None):
+    if group_name is None:
+        group_name = CHECKPOINT_DEFAULT_ID
+    name = lambda name: group_name + '.' + name
+    info.param_group(group_name, label='Checkpoint Parameters', glob=True)
+    info.param(name('mode'), label='Resume from checkpoint', default='Disabled', values=['Disabled', 'Enabled'],
+               desc='Record completed test steps and skip them when the test is restarted.')
+
+
+def checkpoint_dir(ts):
+    # SVP directory is the common parent of the library and results directories
+    prefix = os.path.commonprefix([os.path.realpath(__file__), os.path.realpath(ts._results_dir)])
+    if not prefix.endswith(os.sep):
+        prefix = os.path.dirname(prefix)
+    return os.path.join(prefix, CHECKPOINT_DIR)
+
+
+def checkpoint_init(ts, group_name=None):
+    """
+    Return the checkpoint of the test configuration if checkpoints are enabled, otherwise None.
+    """
+    if group_name is None:
+        group_name = CHECKPOINT_DEFAULT_ID
+    if ts.param_value(group_name + '.' + 'mode') != 'Enabled':
+        return None
+    filename = os.path.join(checkpoint_dir(ts), '%s.ckpt' % (ts.config_name()))
+    return Checkpoint(ts, filename, params=params_hash(ts))
@@ -34,8 +34,12 @@ import sys
 import os
 import glob
 import importlib
+import collections
 
 import dataset
+import vclock
+import instrument
+import timeline
 
 '''
 The DAS module supports collecting time series data records in a dataset. Each time series data record is comprised
@@ -64,6 +68,9 @@ the keys are the data point names and values are the data point values.
     waveform_force_trigger() - Create trigger event
     waveform_capture_dataset() - Return dataset (Dataset) created from last waveform capture.
 
+    waveform_capture_arm() - Arm a waveform capture without blocking and return a WaveformCapture handle.
+    waveform_capture_fetch() - Wait for the last armed waveform capture and return its dataset (Dataset).
+
 The DAS module supports adding additional data points to those provided by the data acquisition device. The additional
 data points are termed 'soft channel' and the values are maintained by updated the points in the dictionary.
 Soft channel data points are indicated using the 'sc_points' argument in data_init(). The 'sc_points' argument is a
@@ -76,11 +83,36 @@ dictionary of the DAS object. The soft channel points are added to each dataset
 
     daq.sc['SC_1'] = ''
     daq.sc['SC_2'] = 2
+
+Waveform captures can be run without blocking the script. waveform_capture_arm() arms the device and returns a
+WaveformCapture handle. The capture status is polled from an SVP timer and, on completion, the capture dataset is
+fetched and any registered callbacks are called with the handle. The script can continue (start a grid profile, log
+data, etc.) while the capture is in flight and then wait for the result. Arming requires a device with a
+waveform_arm() method, DASError is raised for other devices.
+
+    capture = daq_wf.waveform_capture_arm(callback=None)
+    grid.profile_start()
+    ...
+    ds = capture.result()
+
+The record layout is compiled once into a RecordSchema when the DAS is initialized. Each data point is assigned a
+slot index in a record vector with the device points first, in device point order, followed by the soft channel
+points. During data capture the device data and soft channel values are written into a preallocated record vector
+which is then appended to the dataset, so no per-sample dictionaries are created. Devices may implement
+data_read_into(rec) to write their values, already converted, directly into the record slots; otherwise the values
+of the list returned by data_read() are converted to float when possible as they are written into the slots. Soft
+channel values are converted when they are written. data_read() and data_capture_read() return a new dictionary
+keyed by point name, so callers may keep them. data_sample() returns the record vector of the capture, which is
+overwritten by the next sample.
 '''
 
-WFM_STATUS_INACTIVE = 'active'
-WFM_STATUS_ACTIVE = 'inactive'
-WFM_STATUS_COMPLETE = 'complete'
+WFM_STATUS_INACTIVE = 'INACTIVE'
+WFM_STATUS_ACTIVE = 'ACTIVE'
+WFM_STATUS_COMPLETE = 'COMPLETE'
+WFM_STATUS_ERROR = 'ERROR'
+
+# waveform capture status poll interval (secs)
+WFM_POLL_INTERVAL = .1
 
 points_default = {
     'AC': ('VRMS', 'IRMS', 'P', 'S', 'Q', 'PF', 'FREQ'),
@@ -127,7 +159,8 @@ def das_init(ts, id=None, points=None, sc_points=None, group_name=None):
         else:
             raise DASError('Unknown data acquisition system mode: %s' % mode)
 
-    return sim
+    instrument.wrap(sim, group_name)
+    return timeline.wrap(sim, group_name)
 
 
 class DASError(Exception):
@@ -137,6 +170,171 @@ class DASError(Exception):
     pass
 
 
+def _coerce(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return value
+
+
+class RecordSchema(object):
+    """
+    Compiled record layout: point name -> slot index and slot conversion.
+
+    Device points occupy the first device_count slots followed by the soft channel points.
+    """
+
+    def __init__(self, points, sc_points=None):
+        if sc_points is None:
+            sc_points = []
+        self.device_points = list(points)
+        self.sc_points = list(sc_points)
+        self.points = self.device_points + self.sc_points
+        self.device_count = len(self.device_points)
+        self.index = dict((p, i) for i, p in enumerate(self.points))
+        if len(self.index) != len(self.points):
+            raise DASError('Duplicate data point names: %s' % (self.points))
+
+    def __len__(self):
+        return len(self.points)
+
+    def record(self):
+        """
+        Return a new record vector with a slot for each point.
+        """
+        return [None] * len(self.points)
+
+    def expand(self, rec):
+        """
+        Return a dictionary of a record vector keyed by point name.
+        """
+        if len(rec) != len(self.points):
+            raise DASError('Data/data point mismatch: %s %s' % (self.points, rec))
+        return dict(zip(self.points, rec))
+
+
+class SoftChannels(collections.MutableMapping):
+    """
+    Soft channel values stored by slot index in schema order. Values are converted to float when possible as they
+    are written rather than each time a record is sampled.
+    """
+
+    def __init__(self, schema, value=0):
+        self.schema = schema
+        self.index = dict((p, i) for i, p in enumerate(schema.sc_points))
+        self.values = [_coerce(value)] * len(schema.sc_points)
+
+    def __getitem__(self, name):
+        return self.values[self.index[name]]
+
+    def __setitem__(self, name, value):
+        index = self.index.get(name)
+        if index is None:
+            raise DASError('Unknown soft channel point: %s' % (name))
+        self.values[index] = _coerce(value)
+
+    def __delitem__(self, name):
+        raise DASError('Soft channel points can not be removed: %s' % (name))
+
+    def __iter__(self):
+        return iter(self.schema.sc_points)
+
+    def __len__(self):
+        return len(self.schema.sc_points)
+
+
+class WaveformCapture(object):
+    """
+    Handle for an asynchronous waveform capture returned by DAS.waveform_capture_arm().
+
+    The status is one of WFM_STATUS_ACTIVE, WFM_STATUS_COMPLETE or WFM_STATUS_ERROR. The capture is advanced by
+    poll(), which is called from an SVP timer when a poll interval is given, or can be called directly by the script.
+    """
+
+    def __init__(self, das, timeout=None):
+        self.das = das
+        self.timeout = timeout
+        self.status = WFM_STATUS_ACTIVE
+        self.dataset = None
+        self.error = None
+        self.start_time = vclock.time()
+        self.end_time = None
+        self._callbacks = []
+        self._timer = None
+
+    def _timer_timeout(self, arg=None):
+        self.poll()
+
+    def _complete(self, status):
+        self.status = status
+        self.end_time = vclock.time()
+        if self._timer is not None:
+            self.das.ts.timer_cancel(self._timer)
+            self._timer = None
+        for callback in self._callbacks:
+            callback(self)
+        self._callbacks = []
+
+    def done(self):
+        """
+        Return True if the capture has completed or failed.
+        """
+        return self.status != WFM_STATUS_ACTIVE
+
+    def add_done_callback(self, callback):
+        """
+        Call callback(capture) on completion. If the capture is already done, it is called immediately.
+        """
+        if self.done():
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def poll(self):
+        """
+        Check the device capture status, fetching the dataset on completion. Returns the capture status.
+        """
+        if self.done():
+            return self.status
+        try:
+            if self.das.device.waveform_status() == WFM_STATUS_COMPLETE:
+                self.dataset = self.das.device.waveform_capture_dataset()
+                self._complete(WFM_STATUS_COMPLETE)
+            elif self.timeout is not None and vclock.time() - self.start_time > self.timeout:
+                self.error = DASError('Waveform capture timeout')
+                self._complete(WFM_STATUS_ERROR)
+        except Exception, e:
+            self.error = e
+            self._complete(WFM_STATUS_ERROR)
+        return self.status
+
+    def cancel(self):
+        """
+        Stop polling the capture. Registered callbacks are called with an error status.
+        """
+        if not self.done():
+            self.error = DASError('Waveform capture cancelled')
+            self._complete(WFM_STATUS_ERROR)
+
+    def result(self, sleep=None, interval=WFM_POLL_INTERVAL):
+        """
+        Wait for the capture to complete and return the capture dataset (Dataset).
+        """
+        if sleep is None:
+            sleep = self.das.ts.sleep
+        while not self.done():
+            # when polled from the SVP timer, only wait for it to complete the capture
+            if self._timer is None:
+                self.poll()
+            if not self.done():
+                sleep(interval)
+        if self.error is not None:
+            if isinstance(self.error, DASError):
+                raise self.error
+            raise DASError('Waveform capture error: %s' % (str(self.error)))
+        return self.dataset
+
+
 class DAS(object):
     """
     Template for grid simulator implementations. This class can be used as a base class or
@@ -153,10 +351,17 @@ class DAS(object):
         self.device = None
         self.sample_interval = 1000
         self.sc = {}
+        self.schema = None
         self._capture = False
         self._timer = None
         self._ds = None
+        self._rec = None
+        self._read_rec = None
         self._last_datarec = []
+        # clock time (vclock) of the first sample of the last data capture
+        self.first_sample_time = None
+        self._wfm_params = {}
+        self._wfm_capture = None
 
         if self.points is None:
             self.points = dict(points_default)
@@ -173,17 +378,42 @@ class DAS(object):
         if self.sc_data_points is None:
             self.sc_data_points = sc_points_default
 
-        if len(self.sc_data_points) > 0:
-            for p in self.sc_data_points:
-                self.data_points.append(p)
-                self.sc[p] = 0
+        # the device point list is not extended, device records are sized from their own points
+        device_points = list(self.data_points)
+        self.data_points = device_points + list(self.sc_data_points)
+
+        # compile the record layout once, records are then filled by slot index
+        self.schema = RecordSchema(device_points, self.sc_data_points)
+        self.sc = SoftChannels(self.schema)
+        self._rec = self.schema.record()
+        self._read_rec = self.schema.record()
 
         self._ds = dataset.Dataset(self.data_points)
 
     def _data_expand(self, data):
-        if len(self.data_points) != len(data):
-            raise DASError('Data/data point mismatch: %s %s' % (self.data_points, data))
-        return dict(zip(self.data_points, data))
+        return self.schema.expand(data)
+
+    def _device_read(self, rec):
+        """
+        Read the current device data and soft channel values into the record vector in place. Devices implementing
+        data_read_into() write converted values, the values returned by data_read() are converted to float when
+        possible. Soft channel values are converted when they are written.
+        """
+        schema = self.schema
+        if schema is None:
+            raise DASError('DAS data points not initialized')
+        count = schema.device_count
+        read_into = getattr(self.device, 'data_read_into', None)
+        if read_into is not None:
+            read_into(rec)
+        else:
+            data = self.device.data_read()
+            if len(data) != count:
+                raise DASError('Data/data point mismatch: %s %s' % (schema.device_points, data))
+            for slot in xrange(count):
+                rec[slot] = _coerce(data[slot])
+        rec[count:] = self.sc.values
+        return rec
 
     def _timer_timeout(self, arg=None):
         self.data_sample()
@@ -223,6 +453,7 @@ class DAS(object):
             if self._capture is False:
                 self._ds = dataset.Dataset(self.data_points)
                 self._last_datarec = []
+                self.first_sample_time = None
                 if self.sample_interval > 0:
                     if self.sample_interval < MINIMUM_SAMPLE_PERIOD:
                         raise DASError('Sample period too small: %s' % (self.sample_interval))
@@ -259,27 +490,28 @@ class DAS(object):
         Read the current data values directly from the DAS. It does not create a new data sample in the
         data capture, if active.
         """
-        data = self.device.data_read()
-        # add soft channel points
-        for p in self.sc_data_points:
-            data.append(self.sc[p])
-
-        return data
+        return self._device_read(self.schema.record())
 
     def data_read(self):
         """
         Read the current data values directly from the DAS. It does not create a new data sample in the
         data capture, if active.
         """
-        return self._data_expand(self.device_data_read())
+        # the read record is reused, the returned dictionary holds the values
+        return self._data_expand(self._device_read(self._read_rec))
 
     def data_sample(self):
         """
-        Read the current data values directly from the DAS and place in the current dataset.
+        Read the current data values directly from the DAS and place in the current dataset. Returns the sampled
+        record, which is reused for the next sample. The clock time of the first sample of a capture is kept in
+        first_sample_time, so times measured with vclock can be aligned with the captured samples.
         """
         if self._capture is True:
-            self._last_datarec = self.device_data_read()
-            self._ds.append(self._last_datarec)
+            if self.first_sample_time is None:
+                self.first_sample_time = vclock.time()
+            # the record vector is reused for each sample, the dataset stores the converted values
+            self._last_datarec = self._device_read(self._rec)
+            self._ds.append(self._last_datarec, convert=False)
         return self._last_datarec
 
     def waveform_config(self, params):
@@ -296,6 +528,7 @@ class DAS(object):
             'timeout' - Timeout (sec)
             'channels' - Channels to capture - ['AC_V_1', 'AC_V_2', 'AC_V_3', 'AC_I_1', 'AC_I_2', 'AC_I_3', 'EXT']
         """
+        self._wfm_params = dict(params)
         return self.device.waveform_config(params=params)
 
     def waveform_capture(self, enable=True, sleep=None):
@@ -306,6 +539,44 @@ class DAS(object):
             sleep = self.ts.sleep
         return self.device.waveform_capture(enable=enable, sleep=sleep)
 
+    def waveform_capture_arm(self, callback=None, poll_interval=WFM_POLL_INTERVAL, timeout=None):
+        """
+        Arm a waveform capture without waiting for it to complete and return a WaveformCapture handle.
+
+        callback - Called as callback(capture) when the capture completes or fails.
+        poll_interval - Status poll interval (secs) of the SVP timer. If 0, the script must call capture.poll().
+        timeout - Capture timeout (secs). Defaults to the configured timeout plus the pre and post trigger times.
+
+        Raises DASError if the DAS device can not arm a capture without blocking (no waveform_arm() method), use
+        waveform_capture() with those devices.
+        """
+        arm = getattr(self.device, 'waveform_arm', None)
+        if arm is None:
+            raise DASError('DAS device does not support arming a waveform capture without blocking')
+        if self._wfm_capture is not None:
+            self._wfm_capture.cancel()
+        if timeout is None:
+            timeout = self._wfm_params.get('timeout')
+            if timeout is not None:
+                timeout = float(timeout) + float(self._wfm_params.get('pre_trigger', 0)) + \
+                    float(self._wfm_params.get('post_trigger', 0))
+        arm()
+        capture = WaveformCapture(self, timeout=timeout)
+        if callback is not None:
+            capture.add_done_callback(callback)
+        if poll_interval > 0:
+            capture._timer = self.ts.timer_start(float(poll_interval), capture._timer_timeout, repeating=True)
+        self._wfm_capture = capture
+        return capture
+
+    def waveform_capture_fetch(self):
+        """
+        Wait for the last armed waveform capture to complete and return its dataset (Dataset).
+        """
+        if self._wfm_capture is None:
+            raise DASError('No waveform capture armed')
+        return self._wfm_capture.result()
+
     def waveform_status(self):
         """
         Get waveform capture status.
@@ -76,6 +76,10 @@ class DAS(das.DAS):
         self.params['channels'] = channels
 
         self.device = device_pz4000.Device(self.params)
+        self.data_points = self.device.data_points
+
+        # initialize soft channel points
+        self._init_sc_points()
 
         #config here
 
@@ -71,6 +71,10 @@ class DAS(das.DAS):
         self.params['n_cycles'] = self._param_value('n_cycles')
 
         self.device = device_das_sandia_ni_pcie.Device(self.params, ts)
+        self.data_points = self.device.data_points
+
+        # initialize soft channel points
+        self._init_sc_points()
 
 
     def _param_value(self, name):
@@ -50,7 +50,12 @@ def params(info, group_name=None):
     info.param_add_value(gname('mode'), mode)
     info.param_group(gname(GROUP_NAME), label='%s Parameters' % mode,
                      active=gname('mode'),  active_value=mode)
-    info.param(pname('data_file'), label='Data File (in SVP Files directory)', default='data.csv')
+    info.param(pname('source'), label='Data Source', default='Data File', values=['Data File', 'EUT Model'],
+               desc='EUT Model measures the closed-loop EUT simulation driven by the grid, PV and DER simulators.')
+    info.param(pname('wfm_sample_rate'), label='Waveform Sample Rate (samples/sec)', default=10000.,
+               active=pname('source'), active_value=['EUT Model'])
+    info.param(pname('data_file'), label='Data File (in SVP Files directory)', default='data.csv',
+               active=pname('source'), active_value=['Data File'])
     info.param(pname('use_timestamp'), label='Use Data File Timestamp', default='Enabled', values=['Enabled',
                                                                                                    'Disabled'])
     info.param(pname('at_end'), label='At End of Data', default='Repeat last record', values=['Loop to start',
@@ -74,7 +79,11 @@ class DAS(das.DAS):
 
         self.ts.log('results_dir = %s' % (ts._results_dir))
 
-        self.device = device_das_sim.Device(self.params)
+        if self._param_value('source') == 'EUT Model':
+            self.params['wfm_sample_rate'] = self._param_value('wfm_sample_rate')
+            self.device = device_das_sim.ModelDevice(self.params)
+        else:
+            self.device = device_das_sim.Device(self.params)
         self.data_points = self.device.data_points
 
         # initialize soft channel points
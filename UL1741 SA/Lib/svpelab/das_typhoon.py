@@ -51,6 +51,10 @@ def params(info, group_name=None):
     info.param_group(gname(GROUP_NAME), label='%s Parameters' % mode,
                      active=gname('mode'),  active_value=mode, glob=True)
     info.param(pname('sample_interval'), label='Sample Interval (ms)', default=1000)
+    info.param(pname('signals'), label='Signal Map (POINT=signal[*scale]; ...)', default='None',
+               desc='Map of data points to HIL analog signals. All signals are read in a single request. '
+                    'None uses the default ASGC model signal map. AC_FREQ_<phase> points are recorded as None '
+                    'unless mapped to a signal.')
 
 GROUP_NAME = 'typhoon'
 
@@ -59,9 +63,15 @@ class DAS(das.DAS):
 
     def __init__(self, ts, group_name, points=None, sc_points=None):
         das.DAS.__init__(self, ts, group_name, points=points, sc_points=sc_points)
-        self.device = device_das_typhoon.Device()
+        self.params['ts'] = ts
+        self.params['signals'] = self._param_value('signals')
+        self.device = device_das_typhoon.Device(self.params)
+        self.data_points = self.device.data_points
         self.sample_interval = self._param_value('sample_interval')
 
+        # initialize soft channel points
+        self._init_sc_points()
+
         if self.sample_interval < 50:
             raise das.DASError('Parameter error: sample interval must be at least 50 ms')
 
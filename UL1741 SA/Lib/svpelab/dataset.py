@@ -30,6 +30,12 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 Questions can be directed to support@sunspec.org
 """
 
+import re
+
+try:
+    import numpy as np
+except Exception, e:
+    print('Error: numpy python package not found!')  # This will appear in the SVP log file.
 
 class DatasetError(Exception):
     """
@@ -72,16 +78,29 @@ class Dataset(object):
         self.points = points                      # point names
         self.data = data                          # data
 
+        self._arrays = {}                         # column index: (column, length, array) of array()
+
         if points is None:
             self.points = []
+        else:
+            # copy so the dataset does not share the points list of the caller (for example the DAS data points)
+            self.points = list(points)
         if data is None:
             self.clear()
 
-    def append(self, data):
+    def append(self, data, convert=True):
+        """
+        Append a record. Values are converted to float when possible unless convert is False, in which case the
+        record values are appended as is.
+        """
         dlen = len(data)
         if len(data) != len(self.data):
             raise DatasetError('Append record point mismatch, dataset contains %s points,'
                                ' appended data contains %s points' % (len(self.data), dlen))
+        if not convert:
+            for column, v in zip(self.data, data):
+                column.append(v)
+            return
         for i in range(dlen):
             try:
                 v = float(data[i])
@@ -102,6 +121,123 @@ class Dataset(object):
         for i in range(len(self.points)):
             self.data.append([])
 
+    def array(self, point):
+        """
+        Return the column of a point as a float numpy array. The array is cached until the column is replaced or its
+        length changes, so it must not be used after values of the column are changed in place.
+        """
+        index = self.points.index(point)
+        column = self.data[index]
+        cached = self._arrays.get(index)
+        if cached is not None and cached[0] is column and cached[1] == len(column):
+            return cached[2]
+        array = np.asarray(column, dtype=float)
+        self._arrays[index] = (column, len(column), array)
+        return array
+
+    def times(self):
+        """
+        Return the sample times as a numpy array, the 'TIME' point or, if there is no 'TIME' point, the start time
+        (0 if not set) plus the sample index over the sample rate.
+        """
+        if 'TIME' in self.points:
+            return self.array('TIME')
+        if not self.sample_rate:
+            raise DatasetError('No TIME point and no sample rate in dataset')
+        rows = len(self.data[0]) if self.data else 0
+        cached = self._arrays.get(None)
+        if cached is not None and cached[1] == (rows, self.start_time, self.sample_rate):
+            return cached[2]
+        t = (self.start_time or 0.) + np.arange(rows)/float(self.sample_rate)
+        self._arrays[None] = (None, (rows, self.start_time, self.sample_rate), t)
+        return t
+
+    def time_monotonic(self):
+        """
+        Return True if the sample times do not decrease, as the time lookups require.
+        """
+        t = self.times()
+        return len(t) < 2 or bool(np.all(t[1:] >= t[:-1]))
+
+    def time_index(self, t, side='left'):
+        """
+        Return the index of the first sample at or after time t ('left') or after time t ('right'). t may be an
+        array of times. O(log n) per time by binary search, the sample times must not decrease.
+        """
+        return np.searchsorted(self.times(), t, side=side)
+
+    def index_range(self, t0=None, t1=None):
+        """
+        Return the (start, end) index range of the samples with times within [t0, t1].
+        """
+        start = 0 if t0 is None else int(self.time_index(t0, side='left'))
+        end = len(self.times()) if t1 is None else int(self.time_index(t1, side='right'))
+        return start, max(start, end)
+
+    def slice_time(self, t0=None, t1=None, points=None):
+        """
+        Return a Dataset of the samples with times within [t0, t1] of the points (all if None). The columns of the
+        returned dataset are numpy array views of the columns of this dataset, no values are copied.
+        """
+        if points is None:
+            points = self.points
+        start, end = self.index_range(t0, t1)
+        data = [self.array(p)[start:end] for p in points]
+        start_time = self.start_time
+        if self.sample_rate:
+            # the slice keeps the time base of this dataset, which starts at 0 if the start time is not set
+            start_time = (start_time or 0.) + start/float(self.sample_rate)
+        trigger_sample = self.trigger_sample
+        if trigger_sample is not None:
+            trigger_sample -= start
+        return Dataset(points=list(points), data=data, start_time=start_time, sample_rate=self.sample_rate,
+                       trigger_sample=trigger_sample)
+
+    def nearest(self, t):
+        """
+        Return the index of the sample nearest to time t. t may be an array of times.
+        """
+        times = self.times()
+        if len(times) == 0:
+            raise DatasetError('Empty dataset')
+        t = np.asarray(t, dtype=float)
+        i = np.clip(np.searchsorted(times, t), 1, max(len(times) - 1, 1))
+        before = times[i - 1]
+        after = times[np.minimum(i, len(times) - 1)]
+        index = np.where(np.abs(t - before) <= np.abs(after - t), i - 1, np.minimum(i, len(times) - 1))
+        if index.ndim == 0:
+            return int(index)
+        return index
+
+    def resample(self, sample_rate, t0=None, t1=None, points=None, method='linear'):
+        """
+        Return a Dataset with the points (all if None) sampled on a uniform time grid of sample_rate from t0 to t1
+        (the first and last sample times if None), with a 'TIME' point. method is 'linear' interpolation, 'previous'
+        (the last sample at or before each time) or 'nearest'.
+        """
+        times = self.times()
+        if len(times) == 0:
+            raise DatasetError('Empty dataset')
+        if t0 is None:
+            t0 = times[0]
+        if t1 is None:
+            t1 = times[-1]
+        grid = t0 + np.arange(int(np.floor((t1 - t0)*sample_rate + 1e-9)) + 1)/float(sample_rate)
+        if points is None:
+            points = [p for p in self.points if p != 'TIME']
+        if method == 'linear':
+            columns = [np.interp(grid, times, self.array(p)) for p in points]
+        elif method in ('previous', 'nearest'):
+            if method == 'previous':
+                index = np.clip(np.searchsorted(times, grid, side='right') - 1, 0, len(times) - 1)
+            else:
+                index = self.nearest(grid)
+            columns = [self.array(p)[index] for p in points]
+        else:
+            raise DatasetError('Unknown resample method: %s' % (method))
+        return Dataset(points=['TIME'] + list(points), data=[grid.tolist()] + [c.tolist() for c in columns],
+                       start_time=float(t0), sample_rate=sample_rate)
+
     def to_csv(self, filename):
         cols = range(len(self.data))
         if len(cols) > 0:
@@ -114,21 +250,142 @@ class Dataset(object):
                 f.write('%s\n' % ', '.join(map(str, d)))
             f.close()
 
-    def from_csv(self, filename, sep=','):
-        self.clear()
+    def to_store(self, filename, **kwargs):
+        """
+        Save the dataset to a chunked, compressed dataset file. See dataset_store.save() for the options.
+        """
+        import dataset_store
+        dataset_store.save(self, filename, **kwargs)
+
+    def from_store(self, filename, t0=None, t1=None, points=None):
+        """
+        Load the dataset, or the time range [t0, t1] of the points, from a dataset file.
+        """
+        import dataset_store
+        ds = dataset_store.load(filename, t0=t0, t1=t1, points=points)
+        self.points = ds.points
+        self.data = ds.data
+        self.start_time = ds.start_time
+        self.sample_rate = ds.sample_rate
+        self.trigger_sample = ds.trigger_sample
+
+    def from_csv(self, filename, sep=',', chunk_size=None):
+        """
+        Load the dataset from a CSV file. Blank and '#' comment lines before the point names line are skipped, every
+        following line is a record of numbers. The records are parsed in blocks of chunk_size bytes (see csv_chunks()).
+        """
         f = open(filename, 'r')
-        ids = None
-        while ids is None:
-            line = f.readline().strip()
-            if len(line) > 0 and line[0] != '#':
-                ids = [e.strip() for e in line.split(sep)]
-        self.points = ids
-        for i in range(len(self.points)):
-            self.data.append([])
-        for line in f:
-            data = [float(e.strip()) for e in line.split(sep)]
-            if len(data) > 0:
-                self.append(data)
+        try:
+            self.points = csv_header(f, sep=sep)
+            self.clear()
+            for columns in csv_records(f, len(self.points), sep=sep, chunk_size=chunk_size):
+                for column, values in zip(self.data, columns):
+                    column.extend(values)
+        finally:
+            f.close()
+
+
+CSV_CHUNK_SIZE = 1 << 24        # bytes of CSV records parsed at a time
+
+
+def csv_header(f, sep=','):
+    """
+    Read the point names line of an open CSV file, skipping blank and '#' comment lines before it.
+    """
+    while True:
+        line = f.readline()
+        if not line:
+            raise DatasetError('No point names in CSV file')
+        line = line.strip()
+        if len(line) > 0 and line[0] != '#':
+            return [e.strip() for e in line.split(sep)]
+
+
+def csv_blocks(f, chunk_size=CSV_CHUNK_SIZE):
+    """
+    Yield the rest of an open file as blocks of whole lines of about chunk_size bytes, each ending in a newline.
+    """
+    rest = ''
+    while True:
+        s = f.read(chunk_size)
+        if not s:
+            break
+        s = rest + s
+        end = s.rfind('\n') + 1
+        rest = s[end:]
+        if end > 0:
+            yield s[:end]
+    if rest:
+        yield rest + '\n'
+
+
+# a decimal number in a form float() accepts, with at least one mantissa digit
+CSV_NUMBER_RE = r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+_csv_block_re = {}
+
+
+def csv_block_re(count, sep=','):
+    """
+    Compiled expression matching a block of lines of count numbers separated by sep, each line ending in a newline.
+    """
+    key = (count, sep)
+    block_re = _csv_block_re.get(key)
+    if block_re is None:
+        blank = '[%s]*' % (''.join(c for c in ' \t\r' if c != sep))
+        field = blank + CSV_NUMBER_RE + blank
+        line = field + ('(?:%s%s)' % (re.escape(sep), field)) * (count - 1) + '\n'
+        block_re = _csv_block_re[key] = re.compile('(?:%s)+\\Z' % (line))
+    return block_re
+
+
+def csv_parse_block(block, count, sep=','):
+    """
+    Parse a block of lines of count numbers each into a (lines, count) float array with a single call to the numpy
+    number parser. Returns None if the block is not only lines of count numbers, for the caller to parse it value by
+    value.
+    """
+    if len(sep) != 1 or sep in '0123456789+-.eE\n' or count < 1:
+        return None
+    # only plain decimal numbers, the numpy parser accepts some other forms float() does not
+    if csv_block_re(count, sep).match(block) is None:
+        return None
+    values = np.fromstring(block.replace('\n', sep), dtype=float, sep=sep)
+    lines = block.count('\n')
+    if values.size != lines * count:
+        return None
+    return values.reshape(lines, count)
+
+
+def csv_records(f, count, sep=',', chunk_size=None):
+    """
+    Yield the records of count values of an open CSV file, from the current position, in blocks of about chunk_size
+    bytes as a list of a list of float values per point. Each block is parsed in bulk, blocks that are not only
+    records of numbers are parsed value by value so the values and errors are those of per-value parsing with float().
+    """
+    if chunk_size is None:
+        chunk_size = CSV_CHUNK_SIZE
+    for block in csv_blocks(f, chunk_size):
+        values = csv_parse_block(block, count, sep=sep)
+        if values is not None:
+            yield [values[:, i].tolist() for i in range(count)]
+            continue
+        ds = Dataset(points=range(count))
+        for line in block[:-1].split('\n'):
+            ds.append([float(e.strip()) for e in line.split(sep)])
+        yield ds.data
+
+
+def csv_chunks(filename, sep=',', chunk_size=None):
+    """
+    Yield (points, columns) for the blocks of records of a CSV file (see csv_records()). Only one block is held at a
+    time, so files larger than memory can be processed block by block.
+    """
+    f = open(filename, 'r')
+    try:
+        points = csv_header(f, sep=sep)
+        for columns in csv_records(f, len(points), sep=sep, chunk_size=chunk_size):
+            yield points, columns
+    finally:
         f.close()
 
 
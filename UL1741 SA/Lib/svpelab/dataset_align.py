@@ -0,0 +1,264 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import dataset
+import vclock
+
+try:
+    import numpy as np
+except Exception, e:
+    print('Error: numpy python package not found!')  # This will appear in the SVP log file.
+
+'''
+Alignment of datasets sampled on different clocks and at different rates.
+
+asof_join() merges datasets onto the sample times of a base dataset. For each base sample, each other dataset
+contributes the values of its sample at or before (backward), at or after (forward) or nearest to the base time, all
+found with one vectorized binary search per dataset. Samples further than the tolerance from the base time are NaN.
+
+Datasets from separate instruments have unrelated or drifting time bases. estimate_offset() estimates the clock offset
+of a dataset from a reference dataset by cross-correlating a point common to both (e.g. the AC power measured by the
+meter and reported by the EUT), and the offsets are applied by asof_join():
+
+    offset, score = dataset_align.estimate_offset(daq_ds, 'AC_P', eut_ds, 'W', max_offset=2.)
+    ds = dataset_align.asof_join(daq_ds, [eut_ds], offsets=[offset], prefixes=['EUT_'], tolerance=1.)
+
+MeasurementRecorder records der.measurements() with their times as a dataset, so EUT reported values can be joined
+with the DAS data.
+'''
+
+DIRECTION_BACKWARD = 'backward'
+DIRECTION_FORWARD = 'forward'
+DIRECTION_NEAREST = 'nearest'
+
+
+class AlignError(Exception):
+    """
+    Exception to wrap all dataset alignment generated exceptions.
+    """
+    pass
+
+
+def _sorted_times(ds):
+    # sample times in order, with the sample order if the times decrease anywhere
+    t = ds.times()
+    if ds.time_monotonic():
+        return t, None
+    order = np.argsort(t, kind='mergesort')
+    return t[order], order
+
+
+def asof_index(times, t, direction=DIRECTION_BACKWARD, tolerance=None):
+    """
+    Return the index into the sorted sample times of the sample matched to each time in t, -1 where there is no
+    sample within the tolerance.
+    """
+    t = np.asarray(t, dtype=float)
+    n = len(times)
+    if n == 0:
+        return np.full(t.shape, -1, dtype=int)
+    if direction == DIRECTION_BACKWARD:
+        index = np.searchsorted(times, t, side='right') - 1
+    elif direction == DIRECTION_FORWARD:
+        index = np.searchsorted(times, t, side='left')
+    elif direction == DIRECTION_NEAREST:
+        after = np.clip(np.searchsorted(times, t, side='left'), 0, n - 1)
+        before = np.clip(after - 1, 0, n - 1)
+        index = np.where(np.abs(t - times[before]) <= np.abs(times[after] - t), before, after)
+    else:
+        raise AlignError('Unknown direction: %s' % (direction))
+    valid = (index >= 0) & (index < n)
+    index = np.where(valid, index, -1)
+    if tolerance is not None:
+        gap = np.abs(times[np.clip(index, 0, n - 1)] - t)
+        index = np.where(valid & (gap <= tolerance), index, -1)
+    return index
+
+
+def asof_join(base, others, tolerance=None, direction=DIRECTION_BACKWARD, offsets=None, prefixes=None, points=None):
+    """
+    Return a Dataset of the base dataset with the points of the other datasets matched to each base sample time.
+
+    base - Dataset defining the sample times ('TIME' point, or start time and sample rate).
+    others - list of Datasets to join.
+    tolerance - maximum time (secs) between a base sample and a matched sample, unmatched values are NaN.
+    direction - 'backward', 'forward' or 'nearest' sample of the other dataset.
+    offsets - clock offset (secs) of each other dataset, added to its times to give base times.
+    prefixes - prefix of the joined point names of each other dataset. Without prefixes, names already in the joined
+        dataset are given the suffix '_<n>', n the position of the dataset in others, starting at 1.
+    points - list of the points to join of each other dataset, None for all points except 'TIME'.
+    """
+    t = base.times()
+    out_points = ['TIME'] + [p for p in base.points if p != 'TIME']
+    out_data = [t.tolist()] + [list(base.data[base.points.index(p)]) for p in out_points[1:]]
+    for k, ds in enumerate(others):
+        times, order = _sorted_times(ds)
+        if offsets is not None and offsets[k]:
+            times = times + offsets[k]
+        index = asof_index(times, t, direction=direction, tolerance=tolerance)
+        missing = index < 0
+        if order is not None:
+            index = np.where(missing, -1, order[np.clip(index, 0, len(order) - 1)])
+        join_points = points[k] if points is not None and points[k] is not None else \
+            [p for p in ds.points if p != 'TIME']
+        for p in join_points:
+            values = ds.array(p)
+            column = values[np.clip(index, 0, max(len(values) - 1, 0))] if len(values) else \
+                np.zeros(len(t))
+            column = np.where(missing, np.nan, column)
+            name = p
+            if prefixes is not None:
+                name = prefixes[k] + p
+            elif name in out_points:
+                name = '%s_%s' % (p, k + 1)
+            out_points.append(name)
+            out_data.append(column.tolist())
+    return dataset.Dataset(points=out_points, data=out_data, start_time=base.start_time,
+                           sample_rate=base.sample_rate, trigger_sample=base.trigger_sample)
+
+
+def estimate_offset(ref, ref_point, ds, point, max_offset=1., resolution=None):
+    """
+    Estimate the clock offset of a dataset from a reference dataset by cross-correlating a point of each over the time
+    they have in common. Returns (offset, score): offset (secs) is to be added to the dataset times to give reference
+    times and score is the correlation coefficient over the time in common at the offset (1 for identical shapes).
+    Each point is zero outside its own time span, so only the samples in common at each offset are correlated.
+
+    max_offset - largest offset (secs) searched.
+    resolution - time step (secs) of the correlation, the smaller median sample interval of the datasets if None. The
+        offset is refined to a fraction of the step by parabolic interpolation of the correlation peak.
+    """
+    t_ref, order = _sorted_times(ref)
+    y_ref = ref.array(ref_point) if order is None else ref.array(ref_point)[order]
+    t_ds, order = _sorted_times(ds)
+    y_ds = ds.array(point) if order is None else ds.array(point)[order]
+    if len(t_ref) < 2 or len(t_ds) < 2:
+        raise AlignError('Not enough samples to estimate the clock offset')
+    if resolution is None:
+        resolution = min(np.median(np.diff(t_ref)), np.median(np.diff(t_ds)))
+    if resolution <= 0:
+        raise AlignError('Invalid correlation resolution: %s' % (resolution))
+    # common grid covering both datasets, each signal is zero outside its own time span
+    t0 = min(t_ref[0], t_ds[0])
+    t1 = max(t_ref[-1], t_ds[-1])
+    grid = t0 + np.arange(int((t1 - t0)/resolution) + 1) * resolution
+    ma = ((grid >= t_ref[0]) & (grid <= t_ref[-1])).astype(float)
+    mb = ((grid >= t_ds[0]) & (grid <= t_ds[-1])).astype(float)
+    a = np.interp(grid, t_ref, np.nan_to_num(y_ref)) * ma
+    b = np.interp(grid, t_ds, np.nan_to_num(y_ds)) * mb
+    # remove the means so the correlation sums are not dominated by the signal levels
+    a -= (a.sum()/ma.sum()) * ma
+    b -= (b.sum()/mb.sum()) * mb
+    n = len(grid)
+    size = 1
+    while size < 2 * n:
+        size *= 2
+    max_lag = min(int(np.ceil(max_offset/resolution)), n - 1)
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    def xcorr(x, y):
+        # circular cross-correlation c[k] = sum x[i + k] y[i] at the lags, negative lags wrap to the end
+        return np.fft.irfft(np.fft.rfft(x, size) * np.conj(np.fft.rfft(y, size)), size)[lags % size]
+
+    # correlation coefficient over the samples the datasets have in common at each lag
+    count = np.round(xcorr(ma, mb))
+    sa = xcorr(a, mb)
+    sb = xcorr(ma, b)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = xcorr(a, b) - sa * sb / count
+        var = (xcorr(a * a, mb) - sa * sa / count) * (xcorr(ma, b * b) - sb * sb / count)
+        values = cov / np.sqrt(var)
+    # lags with less than half the largest time in common are not used, so a short overlap cannot score highly
+    values[~(count >= max(0.5 * count.max(), 3)) | ~(var > 0)] = -np.inf
+    if not np.isfinite(values).any():
+        raise AlignError('Points do not vary in the time in common, unable to estimate the clock offset')
+    i = int(np.argmax(values))
+    lag = float(lags[i])
+    if 0 < i < len(values) - 1 and np.isfinite(values[i - 1]) and np.isfinite(values[i + 1]):
+        y0, y1, y2 = values[i - 1], values[i], values[i + 1]
+        denom = y0 - 2*y1 + y2
+        if denom != 0:
+            lag += 0.5*(y0 - y2)/denom
+    return lag * resolution, float(values[i])
+
+
+class MeasurementRecorder(object):
+    """
+    Record EUT measurements (der.measurements()) with their time (vclock.time()) as a dataset.
+
+    eut - DER instance.
+    names - measurement names to record, all of the first measurements if None.
+    """
+
+    def __init__(self, eut, names=None):
+        self.eut = eut
+        self.names = names
+        self.ds = None
+        self.timer = None
+        self.ts = None
+
+    def record(self, arg=None):
+        t = vclock.time()
+        m = self.eut.measurements()
+        if self.ds is None:
+            if self.names is None:
+                self.names = sorted(m.keys())
+            self.ds = dataset.Dataset(points=['TIME'] + list(self.names))
+        rec = [t]
+        for name in self.names:
+            value = m.get(name)
+            try:
+                rec.append(float(value))
+            except (TypeError, ValueError):
+                rec.append(float('nan'))
+        self.ds.append(rec, convert=False)
+
+    def start(self, ts, interval):
+        """
+        Record every interval secs from an SVP timer until stop().
+        """
+        self.stop()
+        self.ts = ts
+        self.timer = ts.timer_start(float(interval), self.record, repeating=True)
+
+    def stop(self):
+        if self.timer is not None:
+            self.ts.timer_cancel(self.timer)
+            self.timer = None
+
+    def dataset(self):
+        """
+        Return the recorded measurements as a Dataset with a 'TIME' point.
+        """
+        if self.ds is None:
+            return dataset.Dataset(points=['TIME'])
+        return self.ds
@@ -0,0 +1,409 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import os
+import json
+import struct
+import zlib
+import bz2
+
+import dataset
+
+try:
+    import numpy as np
+except Exception, e:
+    print('Error: numpy python package not found!')  # This will appear in the SVP log file.
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+'''
+Chunked, compressed columnar storage of datasets.
+
+A dataset file holds the dataset columns in chunks of rows. Each column of each chunk is stored as a separately
+compressed block, so a read decompresses only the chunks and columns it needs. The file ends with an index of the
+chunks recording, for every column block, its location, encoding and the minimum and maximum value of the block. The
+index of the 'TIME' column (or the sample times from the dataset start time and sample rate) gives random access by
+time range, and the column statistics let reads skip chunks that cannot hold values of interest.
+
+Numeric columns are stored as float64 with an optional filter and a compressor:
+
+    delta - the difference of each value's bits from the previous value's bits, small for slowly changing signals.
+    shuffle - the bytes of the values are regrouped by byte position, so the slowly changing high order bytes of
+              consecutive values are adjacent.
+
+The compressor is zlib, bz2 or, when available, lzma. With the codec 'auto' the writer compresses each block with each
+filter and keeps the smallest, so each chunk and column uses the encoding that suits it. Both filters are exact, the
+values read are identical to the values written. Column blocks with any value that is not a float or an integer,
+such as None, a bool or a numeric string, are stored as JSON so the values read back unchanged.
+
+    dataset_store.save(ds, 'capture.sds')
+    ds = dataset_store.load('capture.sds', t0=1.0, t1=1.5, points=['TIME', 'AC_V_1'])
+'''
+
+MAGIC = 'SVPDS\x01'
+FOOTER = struct.Struct('<Q6s')
+
+COMPRESS_ZLIB = 'zlib'
+COMPRESS_BZ2 = 'bz2'
+COMPRESS_LZMA = 'lzma'
+compressors = {COMPRESS_ZLIB: (lambda s: zlib.compress(s, 6), zlib.decompress),
+               COMPRESS_BZ2: (lambda s: bz2.compress(s, 9), bz2.decompress)}
+if lzma is not None:
+    compressors[COMPRESS_LZMA] = (lzma.compress, lzma.decompress)
+
+FILTER_NONE = 'none'
+FILTER_SHUFFLE = 'shuffle'
+FILTER_DELTA = 'delta'
+FILTER_DELTA_SHUFFLE = 'delta+shuffle'
+filters = [FILTER_NONE, FILTER_SHUFFLE, FILTER_DELTA, FILTER_DELTA_SHUFFLE]
+
+ENCODING_JSON = 'json'
+
+CODEC_AUTO = 'auto'
+
+CHUNK_SIZE = 65536
+
+
+class DatasetStoreError(Exception):
+    """
+    Exception to wrap all dataset store generated exceptions.
+    """
+    pass
+
+
+def _filter(values, name):
+    data = values.view('<i8')
+    if name in (FILTER_DELTA, FILTER_DELTA_SHUFFLE):
+        # integer difference of the value bits, wraps on overflow so it is exactly reversible
+        data = np.concatenate((data[:1], np.diff(data)))
+    data = data.view(np.uint8)
+    if name in (FILTER_SHUFFLE, FILTER_DELTA_SHUFFLE):
+        data = data.reshape(-1, 8).T
+    return np.ascontiguousarray(data).tostring()
+
+
+def _unfilter(s, name, count):
+    data = np.frombuffer(s, dtype=np.uint8)
+    if name in (FILTER_SHUFFLE, FILTER_DELTA_SHUFFLE):
+        data = data.reshape(8, count).T
+    data = np.ascontiguousarray(data).view('<i8').reshape(count)
+    if name in (FILTER_DELTA, FILTER_DELTA_SHUFFLE):
+        data = np.cumsum(data, dtype='<i8')
+    return data.view('<f8')
+
+
+def _numeric(values):
+    """
+    Return True if every value is a float or an integer other than bool.
+    """
+    if isinstance(values, np.ndarray):
+        return values.ndim == 1 and values.dtype.kind in 'fiu'
+    for t in set(map(type, values)):
+        if t is bool or not issubclass(t, (float, int, long, np.floating, np.integer)):
+            return False
+    return True
+
+
+def encode(values, codec=CODEC_AUTO):
+    """
+    Encode a column block. Returns (encoding, compressor, bytes, min, max). codec is 'auto' or a
+    'filter:compressor' pair, e.g. 'delta+shuffle:zlib'. Blocks of floats and integers are stored as float64, any
+    other block as JSON.
+    """
+    array = None
+    if _numeric(values):
+        array = np.asarray(values, dtype='<f8')
+    if array is None:
+        compressor = COMPRESS_ZLIB if codec == CODEC_AUTO else codec.split(':')[-1]
+        s = compressors[compressor][0](json.dumps(list(values)))
+        return ENCODING_JSON, compressor, s, None, None
+    if codec == CODEC_AUTO:
+        candidates = [(f, COMPRESS_ZLIB) for f in filters]
+    else:
+        name, compressor = codec.split(':')
+        if name not in filters or compressor not in compressors:
+            raise DatasetStoreError('Unknown codec: %s' % (codec))
+        candidates = [(name, compressor)]
+    best = None
+    for name, compressor in candidates:
+        s = compressors[compressor][0](_filter(array, name))
+        if best is None or len(s) < len(best[2]):
+            best = (name, compressor, s)
+    finite = array[np.isfinite(array)]
+    v_min = v_max = None
+    if len(finite) > 0:
+        v_min = float(finite.min())
+        v_max = float(finite.max())
+    return best[0], best[1], best[2], v_min, v_max
+
+
+def decode(s, encoding, compressor, count):
+    """
+    Decode a column block of count values to a numpy array, or a list for JSON encoded blocks.
+    """
+    s = compressors[compressor][1](s)
+    if encoding == ENCODING_JSON:
+        return json.loads(s)
+    return _unfilter(s, encoding, count)
+
+
+class DatasetWriter(object):
+    """
+    Write a dataset file in chunks. Columns of rows are passed to write() as they are available, full chunks are
+    compressed and written as they fill and close() writes the final chunk and the index.
+
+    filename - dataset file.
+    points - point names.
+    chunk_size - rows per chunk.
+    codec - 'auto' or a 'filter:compressor' codec for all blocks.
+    """
+
+    def __init__(self, filename, points, start_time=None, sample_rate=None, trigger_sample=None,
+                 chunk_size=CHUNK_SIZE, codec=CODEC_AUTO):
+        self.filename = filename
+        self.points = list(points)
+        self.start_time = start_time
+        self.sample_rate = sample_rate
+        self.trigger_sample = trigger_sample
+        self.chunk_size = int(chunk_size)
+        self.codec = codec
+        self.chunks = []
+        self.rows = 0
+        self.buffer = [[] for p in self.points]
+        self.f = open(filename, 'wb')
+        self.f.write(MAGIC)
+
+    def write(self, data):
+        """
+        Append rows, as a list of columns in points order.
+        """
+        if len(data) != len(self.points):
+            raise DatasetStoreError('Write point mismatch, dataset contains %s points, data contains %s points' %
+                                    (len(self.points), len(data)))
+        for column, values in zip(self.buffer, data):
+            column.extend(values)
+        while len(self.buffer[0]) >= self.chunk_size:
+            self._write_chunk(self.chunk_size)
+
+    def _write_chunk(self, count):
+        chunk = {'row': self.rows, 'rows': count, 'columns': []}
+        for i, column in enumerate(self.buffer):
+            encoding, compressor, s, v_min, v_max = encode(column[:count], self.codec)
+            chunk['columns'].append([self.f.tell(), len(s), encoding, compressor, v_min, v_max])
+            self.f.write(s)
+            self.buffer[i] = column[count:]
+        self.chunks.append(chunk)
+        self.rows += count
+
+    def close(self):
+        if self.f is None:
+            return
+        if self.buffer and len(self.buffer[0]) > 0:
+            self._write_chunk(len(self.buffer[0]))
+        index = {'points': self.points, 'rows': self.rows, 'start_time': self.start_time,
+                 'sample_rate': self.sample_rate, 'trigger_sample': self.trigger_sample, 'chunks': self.chunks}
+        s = zlib.compress(json.dumps(index))
+        self.f.write(s)
+        self.f.write(FOOTER.pack(len(s), MAGIC))
+        self.f.close()
+        self.f = None
+
+
+class DatasetReader(object):
+    """
+    Read a dataset file. Only the index is read when opened, read() loads the chunks and columns requested.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.f = open(filename, 'rb')
+        if self.f.read(len(MAGIC)) != MAGIC:
+            self.f.close()
+            raise DatasetStoreError('Not a dataset file: %s' % (filename))
+        self.f.seek(-FOOTER.size, os.SEEK_END)
+        length, magic = FOOTER.unpack(self.f.read(FOOTER.size))
+        if magic != MAGIC:
+            self.f.close()
+            raise DatasetStoreError('Incomplete dataset file: %s' % (filename))
+        self.f.seek(-FOOTER.size - length, os.SEEK_END)
+        index = json.loads(zlib.decompress(self.f.read(length)))
+        self.points = [str(p) for p in index['points']]
+        self.rows = index['rows']
+        self.start_time = index['start_time']
+        self.sample_rate = index['sample_rate']
+        self.trigger_sample = index['trigger_sample']
+        self.chunks = index['chunks']
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def _column(self, chunk, index):
+        offset, length, encoding, compressor, v_min, v_max = chunk['columns'][index]
+        self.f.seek(offset)
+        return decode(self.f.read(length), encoding, compressor, chunk['rows'])
+
+    def chunk_range(self, point, chunk):
+        """
+        Return the (min, max) of a point in a chunk, None if the point has no numeric values in the chunk.
+        """
+        column = chunk['columns'][self.points.index(point)]
+        if column[4] is None:
+            return None
+        return column[4], column[5]
+
+    def select_chunks(self, point, lo=None, hi=None):
+        """
+        Return the indexes of the chunks with values of the point that may be within [lo, hi], from the chunk
+        statistics.
+        """
+        selected = []
+        for i, chunk in enumerate(self.chunks):
+            r = self.chunk_range(point, chunk)
+            if r is None:
+                continue
+            if (lo is None or r[1] >= lo) and (hi is None or r[0] <= hi):
+                selected.append(i)
+        return selected
+
+    def _time_chunks(self, t0, t1):
+        if 'TIME' in self.points:
+            return self.select_chunks('TIME', t0, t1)
+        if self.sample_rate and self.start_time is not None:
+            selected = []
+            for i, chunk in enumerate(self.chunks):
+                c0 = self.start_time + chunk['row']/float(self.sample_rate)
+                c1 = self.start_time + (chunk['row'] + chunk['rows'] - 1)/float(self.sample_rate)
+                if (t0 is None or c1 >= t0) and (t1 is None or c0 <= t1):
+                    selected.append(i)
+            return selected
+        raise DatasetStoreError('No TIME point and no start time and sample rate for time range read')
+
+    def read(self, t0=None, t1=None, points=None, chunks=None):
+        """
+        Return a Dataset of the rows with times within [t0, t1] (all rows if both are None) of the points (all if
+        None). chunks limits the read to chunk indexes, e.g. from select_chunks().
+        """
+        if points is None:
+            points = self.points
+        indexes = []
+        for p in points:
+            if p not in self.points:
+                raise DatasetStoreError('Point not in dataset: %s' % (p))
+            indexes.append(self.points.index(p))
+        selected = range(len(self.chunks)) if chunks is None else sorted(chunks)
+        if t0 is not None or t1 is not None:
+            in_time = set(self._time_chunks(t0, t1))
+            selected = [i for i in selected if i in in_time]
+
+        data = [[] for p in points]
+        first_row = None
+        for i in selected:
+            chunk = self.chunks[i]
+            mask = None
+            if t0 is not None or t1 is not None:
+                if 'TIME' in self.points:
+                    t = np.asarray(self._column(chunk, self.points.index('TIME')), dtype=float)
+                else:
+                    t = self.start_time + (chunk['row'] + np.arange(chunk['rows']))/float(self.sample_rate)
+                mask = np.ones(chunk['rows'], dtype=bool)
+                if t0 is not None:
+                    mask &= t >= t0
+                if t1 is not None:
+                    mask &= t <= t1
+                if not mask.any():
+                    continue
+            if first_row is None:
+                first_row = chunk['row'] + (int(np.argmax(mask)) if mask is not None else 0)
+            for column, index in zip(data, indexes):
+                values = self._column(chunk, index)
+                if mask is not None:
+                    values = np.asarray(values, dtype=object)[mask] if isinstance(values, list) else values[mask]
+                column.extend(values.tolist() if hasattr(values, 'tolist') else values)
+
+        start_time = self.start_time
+        trigger_sample = self.trigger_sample
+        if first_row:
+            if start_time is not None and self.sample_rate:
+                start_time += first_row/float(self.sample_rate)
+            if trigger_sample is not None:
+                trigger_sample -= first_row
+        return dataset.Dataset(points=list(points), data=data, start_time=start_time, sample_rate=self.sample_rate,
+                               trigger_sample=trigger_sample)
+
+
+def save(ds, filename, chunk_size=CHUNK_SIZE, codec=CODEC_AUTO):
+    """
+    Save a Dataset to a dataset file.
+    """
+    writer = DatasetWriter(filename, ds.points, start_time=ds.start_time, sample_rate=ds.sample_rate,
+                           trigger_sample=ds.trigger_sample, chunk_size=chunk_size, codec=codec)
+    try:
+        rows = len(ds.data[0]) if ds.data else 0
+        for i in xrange(0, rows, writer.chunk_size):
+            writer.write([column[i:i + writer.chunk_size] for column in ds.data])
+    finally:
+        writer.close()
+
+
+def save_csv(csv_filename, filename, sep=',', chunk_size=CHUNK_SIZE, codec=CODEC_AUTO):
+    """
+    Save a CSV data file to a dataset file, reading the CSV file a block at a time so files larger than memory can be
+    converted.
+    """
+    writer = None
+    try:
+        for points, columns in dataset.csv_chunks(csv_filename, sep=sep):
+            if writer is None:
+                writer = DatasetWriter(filename, points, chunk_size=chunk_size, codec=codec)
+            writer.write(columns)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def load(filename, t0=None, t1=None, points=None):
+    """
+    Load a Dataset, or the time range [t0, t1] of the points of a Dataset, from a dataset file.
+    """
+    reader = DatasetReader(filename)
+    try:
+        return reader.read(t0=t0, t1=t1, points=points)
+    finally:
+        reader.close()
@@ -35,6 +35,9 @@ import os
 import glob
 import importlib
 
+import instrument
+import timeline
+
 # Import all dcsim extensions in current directory.
 # A dcsim extension has a file name of dcsim_*.py and contains a function dcsim_params(info) that contains
 # a dict with the following entries: name, init_func.
@@ -83,7 +86,8 @@ def dcsim_init(ts, id=None, group_name=None):
         else:
             raise DCSimError('Unknown dc simulation mode: %s' % mode)
 
-    return sim
+    instrument.wrap(sim, group_name)
+    return timeline.wrap(sim, group_name)
 
 RELAY_OPEN = 'open'
 RELAY_CLOSED = 'closed'
@@ -34,6 +34,9 @@ import os
 import glob
 import importlib
 
+import instrument
+import timeline
+
 der_modules = {}
 
 def params(info, id=None, label='DER', group_name=None, active=None, active_value=None):
@@ -72,7 +75,8 @@ def der_init(ts, id=None, group_name=None):
         else:
             raise DERError('Unknown DER system mode: %s' % mode)
 
-    return sim
+    instrument.wrap(sim, group_name)
+    return timeline.wrap(sim, group_name)
 
 
 class DERError(Exception):
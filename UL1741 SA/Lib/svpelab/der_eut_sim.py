@@ -0,0 +1,211 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import os
+
+import der
+import eut_sim
+
+sim_info = {
+    'name': os.path.splitext(os.path.basename(__file__))[0],
+    'mode': 'EUT Simulation'
+}
+
+def der_info():
+    return sim_info
+
+def params(info, group_name):
+    gname = lambda name: group_name + '.' + name
+    pname = lambda name: group_name + '.' + GROUP_NAME + '.' + name
+    mode = sim_info['mode']
+    info.param_add_value(gname('mode'), mode)
+    info.param_group(gname(GROUP_NAME), label='%s Parameters' % mode,
+                     active=gname('mode'),  active_value=mode, glob=True)
+    d = eut_sim.model_defaults
+    info.param(pname('phases'), label='Phases', default=d['phases'], values=[1, 2, 3])
+    info.param(pname('p_rated'), label='Active power rating (W)', default=d['p_rated'])
+    info.param(pname('s_rated'), label='Apparent power rating (VA)', default=d['s_rated'])
+    info.param(pname('q_max'), label='Reactive power rating (var)', default=d['q_max'])
+    info.param(pname('v_nom'), label='Nominal AC voltage (V)', default=d['v_nom'])
+    info.param(pname('f_nom'), label='Nominal frequency (Hz)', default=d['f_nom'])
+    info.param(pname('v_dc'), label='DC voltage (V)', default=d['v_dc'])
+    info.param(pname('tau'), label='Response time constant (secs)', default=d['tau'])
+    info.param(pname('rr_normal'), label='Normal ramp rate (%/sec)', default=d['rr_normal'])
+    info.param(pname('rr_soft_start'), label='Soft-start ramp rate (%/sec)', default=d['rr_soft_start'])
+    info.param(pname('t_reconnect'), label='Reconnect time (secs)', default=d['t_reconnect'])
+    info.param(pname('dt'), label='Simulation time step (secs)', default=d['dt'])
+
+GROUP_NAME = 'eut_sim'
+
+
+class DER(der.DER):
+    """
+    DER interface to the closed-loop EUT model (eut_sim). Settings take effect in the model immediately and are
+    returned as the current settings when read.
+    """
+
+    def __init__(self, ts, group_name):
+        der.DER.__init__(self, ts, group_name)
+        self.model = eut_sim.model_init(ts)
+
+    def info(self):
+        return {'Manufacturer': 'SVP', 'Model': 'EUT Simulation', 'Options': '', 'Version': '1.0',
+                'SerialNumber': '0'}
+
+    def nameplate(self):
+        m = self.model
+        return {'WRtg': m.p_rated, 'VARtg': m.s_rated, 'VArRtgQ1': m.q_max, 'VArRtgQ2': m.q_max,
+                'VArRtgQ3': -m.q_max, 'VArRtgQ4': -m.q_max, 'ARtg': m.s_rated/m.v_nom}
+
+    def measurements(self):
+        m = self.model
+        rec = dict(zip(m.data_points(), m.data_record()))
+        params = {'W': m.p, 'VAr': m.q, 'VA': (m.p*m.p + m.q*m.q) ** .5, 'Hz': rec['AC_FREQ_1'],
+                  'PF': rec['AC_PF_1'], 'A': sum([rec['AC_IRMS_%s' % (i)] for i in range(1, m.phases + 1)]),
+                  'DCV': rec['DC_V'], 'DCA': rec['DC_I'], 'DCW': rec['DC_P']}
+        for i, phase in zip(range(1, m.phases + 1), ('A', 'B', 'C')):
+            params['PhVph%s' % (phase)] = rec['AC_VRMS_%s' % (i)]
+            params['Aph%s' % (phase)] = rec['AC_IRMS_%s' % (i)]
+        return params
+
+    def conn_status(self, params=None):
+        self.model.advance()
+        return {'Conn': self.model.connected}
+
+    def connect(self, params=None):
+        if params is not None:
+            self.model.settings(conn=bool(params.get('Conn', True)))
+        return {'Conn': self.model.conn}
+
+    def fixed_pf(self, params=None):
+        if params is not None:
+            settings = dict(self.model.fixed_pf)
+            settings.update(params)
+            self.model.settings(fixed_pf=settings)
+        return dict(self.model.fixed_pf)
+
+    def limit_max_power(self, params=None):
+        if params is not None:
+            wmax_pct = 100.
+            if params.get('ModEna', True):
+                wmax_pct = float(params.get('WMaxPct', 100.))
+            self.model.settings(wmax_pct=wmax_pct)
+        return {'ModEna': self.model.wmax_pct < 100., 'WMaxPct': self.model.wmax_pct}
+
+    def volt_var(self, params=None):
+        if params is not None:
+            settings = dict(self.model.volt_var)
+            settings.update(params)
+            self.model.settings(volt_var=settings)
+        return dict(self.model.volt_var)
+
+    def volt_var_curve(self, id, params=None):
+        if params is not None:
+            curves = dict(self.model.volt_var_curves)
+            curve = dict(curves.get(id, {}))
+            curve.update(params)
+            curves[id] = curve
+            self.model.settings(volt_var_curves=curves)
+        return dict(self.model.volt_var_curves.get(id, {}))
+
+    def freq_watt(self, params=None):
+        if params is not None:
+            settings = dict(self.model.freq_watt)
+            settings.update(params)
+            self.model.settings(freq_watt=settings)
+        return dict(self.model.freq_watt)
+
+    def freq_watt_curve(self, id, params=None):
+        if params is not None:
+            curves = dict(self.model.freq_watt_curves)
+            curve = dict(curves.get(id, {}))
+            curve.update(params)
+            curves[id] = curve
+            self.model.settings(freq_watt_curves=curves)
+        return dict(self.model.freq_watt_curves.get(id, {}))
+
+    def freq_watt_param(self, params=None):
+        if params is not None:
+            settings = dict(self.model.freq_watt_param)
+            settings.update(params)
+            self.model.settings(freq_watt_param=settings)
+        return dict(self.model.freq_watt_param)
+
+    def reactive_power(self, params=None):
+        if params is not None:
+            q_pct = None
+            if params.get('Ena', True):
+                q_pct = float(params.get('Q', 0.))
+            self.model.settings(q_pct=q_pct)
+        return {'Ena': self.model.q_pct is not None, 'Q': self.model.q_pct}
+
+    def ramp_rate(self, params=None):
+        """ Get/set the normal ramp rate (%/sec of rated power). """
+        if params is not None:
+            self.model.config({'rr_normal': float(params)})
+        return self.model.rr_normal
+
+    def soft_start_ramp_rate(self, params=None):
+        """ Get/set the soft-start ramp rate (%/sec of rated power). """
+        if params is not None:
+            self.model.config({'rr_soft_start': float(params)})
+        return self.model.rr_soft_start
+
+    def _trip(self, params, value_key, setting, t_setting):
+        if params is not None:
+            settings = {}
+            if value_key in params:
+                settings[setting] = float(params[value_key])
+            if 'Tms' in params:
+                settings[t_setting] = float(params['Tms'])
+            self.model.config(settings)
+        return {value_key: getattr(self.model, setting), 'Tms': getattr(self.model, t_setting)}
+
+    def vrt_trip_high(self, params=None):
+        """ Get/set the high voltage trip: 'V' (% of nominal voltage), 'Tms' (secs). """
+        return self._trip(params, 'V', 'v_trip_high', 't_trip_v_high')
+
+    def vrt_trip_low(self, params=None):
+        """ Get/set the low voltage trip: 'V' (% of nominal voltage), 'Tms' (secs). """
+        return self._trip(params, 'V', 'v_trip_low', 't_trip_v_low')
+
+    def frt_trip_high(self, params=None):
+        """ Get/set the high frequency trip: 'Hz', 'Tms' (secs). """
+        return self._trip(params, 'Hz', 'f_trip_high', 't_trip_f_high')
+
+    def frt_trip_low(self, params=None):
+        """ Get/set the low frequency trip: 'Hz', 'Tms' (secs). """
+        return self._trip(params, 'Hz', 'f_trip_low', 't_trip_f_low')
+
+
+if __name__ == "__main__":
+    pass
@@ -42,6 +42,22 @@ except Exception, e:
     print('SunSpec or binascii packages did not import!')
 
 
+# record points in data_read() order
+data_points = [
+    'TIME',
+    'AC_VRMS_1', 'AC_IRMS_1', 'AC_P_1', 'AC_S_1', 'AC_Q_1', 'AC_PF_1', 'AC_FREQ_1',
+    'AC_VRMS_2', 'AC_IRMS_2', 'AC_P_2', 'AC_S_2', 'AC_Q_2', 'AC_PF_2', 'AC_FREQ_2',
+    'AC_VRMS_3', 'AC_IRMS_3', 'AC_P_3', 'AC_S_3', 'AC_Q_3', 'AC_PF_3', 'AC_FREQ_3'
+]
+
+# float registers for the points following TIME
+data_regs = [
+    11720, 11700, 11730, 11746, 11738, 11754, 11762,  # Phase A: V A-N, I, W, VA, VAr, PF, Hz
+    11722, 11702, 11732, 11748, 11740, 11756, 11762,  # Phase B: V B-N, I, W, VA, VAr, PF, Hz
+    11724, 11704, 11734, 11750, 11742, 11758, 11762   # Phase C: V C-N, I, W, VA, VAr, PF, Hz
+]
+
+
 class DeviceError(Exception):
     pass
 
@@ -51,6 +67,9 @@ class Device(object):
     def __init__(self, params=None, ts=None):
         self.ts = ts
         self.device = None
+        self.data_points = list(data_points)
+        # record size of the device points, the DAS adds its soft channel points after them
+        self.point_count = len(self.data_points)
 
         self.comm = params.get('comm')
         if self.comm == 'Modbus TCP':
@@ -125,47 +144,33 @@ class Device(object):
         """
         return self.bulk_float_read()
 
+    def data_read_into(self, rec):
+        return self.bulk_float_read(rec=rec)
+
     def generic_float_read(self, reg_in_lit):
         data = self.device.read(reg_in_lit-1, 2)  # the register is one less than reported in the literature
         data_num = util.data_to_float(data)
         return data_num
 
-    def bulk_float_read(self, start=11700, end=11762):
+    def bulk_float_read(self, start=11700, end=11762, rec=None):
         actual_start = start - 1  # the register is one less than reported in the literature
         actual_length = (end - start) + 2
         data = self.device.read(actual_start, actual_length)
 
-        datarec = {'time': time.time(),
-                   'ac_1': (util.data_to_float(data[reg_shift(11720)[0]:reg_shift(11720)[1]]),  # Voltage, A-N
-                            util.data_to_float(data[reg_shift(11700)[0]:reg_shift(11700)[1]]),  # Current, Phase A
-                            util.data_to_float(data[reg_shift(11730)[0]:reg_shift(11730)[1]]),  # Real Power, Phase A
-                            util.data_to_float(data[reg_shift(11746)[0]:reg_shift(11746)[1]]),  # Apparent Power, Phase A
-                            util.data_to_float(data[reg_shift(11738)[0]:reg_shift(11738)[1]]),  # Reactive Power, Phase A
-                            util.data_to_float(data[reg_shift(11754)[0]:reg_shift(11754)[1]]),  # True Power Factor, Phase A
-                            util.data_to_float(data[reg_shift(11762)[0]:reg_shift(11762)[1]])), # Frequency
-                   'ac_2': (util.data_to_float(data[reg_shift(11722)[0]:reg_shift(11722)[1]]),  # Voltage, B-N
-                            util.data_to_float(data[reg_shift(11702)[0]:reg_shift(11702)[1]]),  # Current, Phase B
-                            util.data_to_float(data[reg_shift(11732)[0]:reg_shift(11732)[1]]),  # Real Power, Phase B
-                            util.data_to_float(data[reg_shift(11748)[0]:reg_shift(11748)[1]]),  # Apparent Power, Phase B
-                            util.data_to_float(data[reg_shift(11740)[0]:reg_shift(11740)[1]]),  # Reactive Power, Phase B
-                            util.data_to_float(data[reg_shift(11756)[0]:reg_shift(11756)[1]]),  # True Power Factor, Phase B
-                            util.data_to_float(data[reg_shift(11762)[0]:reg_shift(11762)[1]])), # Frequency
-                   'ac_3': (util.data_to_float(data[reg_shift(11724)[0]:reg_shift(11724)[1]]),  # Voltage, C-N
-                            util.data_to_float(data[reg_shift(11704)[0]:reg_shift(11704)[1]]),  # Current, Phase C
-                            util.data_to_float(data[reg_shift(11734)[0]:reg_shift(11734)[1]]),  # Real Power, Phase C
-                            util.data_to_float(data[reg_shift(11750)[0]:reg_shift(11750)[1]]),  # Apparent Power, Phase C
-                            util.data_to_float(data[reg_shift(11742)[0]:reg_shift(11742)[1]]),  # Reactive Power, Phase C
-                            util.data_to_float(data[reg_shift(11758)[0]:reg_shift(11758)[1]]),  # True Power Factor, Phase C
-                            util.data_to_float(data[reg_shift(11762)[0]:reg_shift(11762)[1]])), # Frequency
-                   'dc': (None,
-                          None,
-                          None)}
+        if rec is None:
+            rec = [None] * self.point_count
+        rec[0] = time.time()
+        index = 1
+        for reg in data_regs:
+            r1, r2 = reg_shift(reg, start)
+            rec[index] = util.data_to_float(data[r1:r2])
+            index += 1
 
-        return datarec
+        return rec
 
 
-def reg_shift(reg):
-    r1 = (reg - 11700)*2
+def reg_shift(reg, start=11700):
+    r1 = (reg - start)*2
     r2 = r1 + 4
     return r1, r2
 
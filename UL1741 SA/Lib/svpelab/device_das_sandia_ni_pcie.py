@@ -54,20 +54,13 @@ except Exception, e:
     # raise  # programmers can raise this error to expose the error to the SVP user
 
 
+# record points in data_read() order
 data_points = [
     'TIME',
-    'DC_V',
-    'DC_I',
-    'AC_VRMS',
-    'AC_IRMS',
-    'DC_P',
-    'AC_S',
-    'AC_P',
-    'AC_Q',
-    'AC_FREQ',
-    'AC_PF',
-    'TRIG',
-    'TRIG_GRID'
+    'AC_VRMS_1', 'AC_IRMS_1', 'AC_P_1', 'AC_S_1', 'AC_Q_1', 'AC_PF_1', 'AC_FREQ_1',
+    'AC_VRMS_2', 'AC_IRMS_2', 'AC_P_2', 'AC_S_2', 'AC_Q_2', 'AC_PF_2', 'AC_FREQ_2',
+    'AC_VRMS_3', 'AC_IRMS_3', 'AC_P_3', 'AC_S_3', 'AC_Q_3', 'AC_PF_3', 'AC_FREQ_3',
+    'DC_V', 'DC_I', 'DC_P'
 ]
 
 # data_points = [
@@ -256,6 +249,10 @@ DSM_CHANNELS = {
 'trigger_1_5': {'physChan': 'Dev3/ai23', 'v_max': 10, 'v_min': -10, 'expression': 'x'}}
 
 
+# waveform capture status poll interval (secs) for blocking captures
+WFM_POLL_INTERVAL = .1
+
+
 class DeviceError(Exception):
     pass
 
@@ -265,6 +262,9 @@ class Device(object):
     def __init__(self, params=None, ts=None):
         self.ts = ts
         self.device = None
+        self.data_points = list(data_points)
+        # record size of the device points, the DAS adds its soft channel points after them
+        self.point_count = len(self.data_points)
 
         self.node = params.get('node')
         self.sample_rate = params.get('sample_rate')
@@ -342,6 +342,8 @@ class Device(object):
         self.wfm_timeout = None
         self.wfm_channels = None
         self.wfm_capture_name = None
+        self.wfm_armed = False
+        self.wfm_complete = False
 
     def info(self):
         return 'DAS Hardware: Sandia NI PCIe Cards'
@@ -353,6 +355,13 @@ class Device(object):
         pass
 
     def data_read(self):
+        return self.data_read_into([None] * self.point_count)
+
+    def data_read_into(self, rec):
+        """
+        Acquire the analog channels and write the computed values into the record slots in data_points order.
+        """
+        nan = float('NaN')
         # Virtual channels are created. Each one of the virtual channels in question here is used to acquire
         # from an analog voltage signal(s).
         for k in range(len(self.sorted_unique)):
@@ -432,26 +441,9 @@ class Device(object):
                 self.analog_input[k].StopTask()
                 self.analog_input[k].TaskControl(DAQmx_Val_Task_Unreserve)
         except Exception, e:
-            self.ts.log_error('Error with DAQmx in StopTask. Returning nones... %s' % e)
-            datarec = {'time': time.time(),
-                       'ac_1': (None,        # voltage
-                                None,        # current
-                                None,        # power
-                                None,        # VA
-                                None,        # vars
-                                None,        # PF
-                                None),       # freq
-                       'ac_2': (None,        # voltage
-                                None,        # current
-                                None,        # power
-                                None,        # VA
-                                None,        # vars (Nonactive Power)
-                                None,        # PF
-                                None),       # freq
-                       'dc': (None,
-                              None,
-                              None)}
-            return datarec
+            self.ts.log_error('Error with DAQmx in StopTask. Returning NaNs... %s' % e)
+            rec[:self.point_count] = [time.time()] + [nan] * (self.point_count - 1)
+            return rec
 
         dev_idx = -1
         data = {}
@@ -496,33 +488,17 @@ class Device(object):
         avg_P, S, Q1, N, PF1 = waveform_analysis.harmonic_analysis(self.time_vector, self.ac_voltage_vector,
                                                                    self.ac_current_vector,
                                                                    self.sample_rate, self.ts)
-        datarec = {'TIME': time.time(),
-                   'AC_VRMS_1': ac_voltage,
-                   'AC_IRMS_1': ac_current,
-                   'AC_P_1': avg_P,
-                   'AC_S_1': S,
-                   'AC_Q_1': Q1,
-                   'AC_PF_1': PF1,
-                   'AC_FREQ_1': freq,
-                   'AC_VRMS_2': None,
-                   'AC_IRMS_2': None,
-                   'AC_P_2': None,
-                   'AC_S_2': None,
-                   'AC_Q_2': None,
-                   'AC_PF_2': None,
-                   'AC_FREQ_2': None,
-                   'AC_VRMS_3': None,
-                   'AC_IRMS_3': None,
-                   'AC_P_3': None,
-                   'AC_S_3': None,
-                   'AC_Q_3': None,
-                   'AC_PF_3': None,
-                   'AC_FREQ_3': None,
-                   'DC_V': dc_voltage,
-                   'DC_I': dc_current,
-                   'DC_P': dc_voltage*dc_current}
-
-        return datarec
+        values = [ac_voltage, ac_current, avg_P, S, Q1, PF1, freq, dc_voltage, dc_current]
+        for k in range(len(values)):
+            if values[k] is None:
+                values[k] = nan
+        ac_voltage, ac_current, avg_P, S, Q1, PF1, freq, dc_voltage, dc_current = values
+        rec[:self.point_count] = (time.time(),
+                                  ac_voltage, ac_current, avg_P, S, Q1, PF1, freq,
+                                  nan, nan, nan, nan, nan, nan, nan,
+                                  nan, nan, nan, nan, nan, nan, nan,
+                                  dc_voltage, dc_current, dc_voltage*dc_current)
+        return rec
 
 
     def waveform_config(self, params):
@@ -548,113 +524,136 @@ class Device(object):
         self.wfm_timeout = params.get('timeout')
         self.wfm_channels = params.get('channels')
 
+    def waveform_arm(self):
+        """
+        Configure and start the acquisition tasks without waiting for the capture to complete.
+        """
+        for k in range(len(self.sorted_unique)):
+            self.analog_input[k].CreateAIVoltageChan(self.physical_channels[k],  # The physical name of the channel
+                                                     "",  # The name to associate with this channel
+                                                     DAQmx_Val_Cfg_Default,  # Differential wiring
+                                                     -10.0,  # Min voltage
+                                                     10.0,  # Max voltage
+                                                     DAQmx_Val_Volts,  # Units
+                                                     None)  # reserved
+
+        try:
+            status = DAQmxConnectTerms('/Dev%s/20MHzTimebase' % self.dev_numbers[0],
+                                       '/Dev%s/RTSI7' % self.dev_numbers[len(self.sorted_unique)-1],
+                                       DAQmx_Val_DoNotInvertPolarity)
+        except Exception, e:
+            print('Error: Task does not support DAQmxConnectTerms: %s' % e)
+
+        for k in range(len(sorted_unique)):
+            if k == 0:  # Master
+                self.analog_input[k].CfgSampClkTiming('',  # const char source[],
+                                                 self.sample_rate,   # float64 rate,
+                                                 DAQmx_Val_Rising,   #  int32 activeEdge,
+                                                 DAQmx_Val_FiniteSamps,   # int32 sampleMode,
+                                                 self.n_points)  # uInt64 sampsPerChanToAcquire
+
+                trig_chan = DSM_CHANNELS[self.wfm_trigger_channel]['physChan']
+
+                # approximate scaling/calibration using linear approximation with zero crossing
+                # (Shouldn't matter for analog triggers)
+                linear_slope_approx = dsm_expression(channel_name=trig_chan, dsm_value=100)/100.
+                trig_level = self.wfm_trigger_level/linear_slope_approx
+
+                if self.wfm_trigger_cond == 'Rising_Edge':
+                    self.analog_input[i].CfgAnlgEdgeStartTrig(trig_chan,  # name of analog signal channel
+                                                         DAQmx_Val_RisingSlope,  # or DAQmx_Val_FallingSlope
+                                                         trig_level)  # threshold at which to start acquiring
+                elif self.wfm_trigger_cond == 'Falling_Edge':
+                    self.analog_input[i].CfgAnlgEdgeStartTrig(trig_chan,  # name of analog signal channel
+                                                         DAQmx_Val_FallingSlope,  # or DAQmx_Val_RisingSlope
+                                                         trig_level)  # threshold at which to start acquiring
+                else:
+                    # use this case for the force trigger
+                    pass
+
+            else:  # Slave
+                print('Configuring Slave %s Sample Clock Timing.' % k)
+                # DAQmxCfgSampClkTiming(taskHandle,"",rate,DAQmx_Val_Rising,DAQmx_Val_ContSamps,sampsPerChan)
+                self.analog_input[k].CfgSampClkTiming('',   # const char source[], The source terminal of the Sample Clock.
+                                                 self.sample_rate,   # float64 rate, The sampling rate in samples per second per channel.
+                                                 DAQmx_Val_Rising,   #  int32 activeEdge,
+                                                 DAQmx_Val_FiniteSamps,   # int32 sampleMode,
+                                                 self.n_points)  # uInt64 sampsPerChanToAcquire
+
+                try:
+                    print('Configuring Slave %s Clock Time Base.' % k)
+                    self.analog_input[k].SetSampClkTimebaseSrc('/Dev3/RTSI7')
+                except Exception, e:
+                    print('Task does not support SetSampClkTimebaseSrc: %s' % e)
+
+                try:
+                    print('Configuring Slave %s Clock Time Rate.' % k)
+                    self.analog_input[k].SetSampClkTimebaseRate(20e6)
+                except Exception, e:
+                    print('Task does not support SetSampClkTimebaseRate: %s' % e)
+
+                print('Configuring Slave %s Trigger.' % k)
+                self.analog_input[k].CfgDigEdgeStartTrig('/Dev%s/ai/StartTrigger' % self.dev_numbers[0],
+                                                         DAQmx_Val_Rising)
+
+        for k in range(len(sorted_unique)-1, -1, -1):
+            # Start Master last so slave(s) will wait for trigger from master over RSTI bus
+            print('Starting Task: %s.' % k)
+            self.analog_input[k].StartTask()
+        self.wfm_armed = True
+        self.wfm_complete = False
+
+    def _waveform_done(self):
+        done = bool32()
+        for k in range(len(self.sorted_unique)):
+            self.analog_input[k].IsTaskDone(byref(done))
+            if not done.value:
+                return False
+        return True
+
+    def _waveform_fetch(self):
+        """
+        Read the acquired samples from the completed tasks and release them.
+        """
+        for k in range(len(self.sorted_unique)):
+            self.analog_input[k].ReadAnalogF64(self.n_points,  # int32 numSampsPerChan,
+                                          5.0,   # float64 timeout,
+                                          DAQmx_Val_GroupByChannel,    # bool32 fillMode,
+                                          self.raw_data[k],    # float64 readArray[],
+                                          self.n_points*self.n_channels[k],    # uInt32 arraySizeInSamps,
+                                          byref(self.read),    # int32 *sampsPerChanRead,
+                                          None)   # bool32 *reserved);
+
+        try:
+            for k in range(len(self.sorted_unique)-1, -1, -1):
+                self.analog_input[k].StopTask()
+                self.analog_input[k].TaskControl(DAQmx_Val_Task_Unreserve)
+        except Exception, e:
+            self.ts.log_error('Error with DAQmx in StopTask. Returning nones... %s' % e)
+        self.wfm_armed = False
+        self.wfm_complete = True
+
     def waveform_capture(self, enable=True, sleep=None):
         """
         Enable/disable waveform capture.
         """
         if enable:
-            for k in range(len(self.sorted_unique)):
-                self.analog_input[k].CreateAIVoltageChan(self.physical_channels[k],  # The physical name of the channel
-                                                         "",  # The name to associate with this channel
-                                                         DAQmx_Val_Cfg_Default,  # Differential wiring
-                                                         -10.0,  # Min voltage
-                                                         10.0,  # Max voltage
-                                                         DAQmx_Val_Volts,  # Units
-                                                         None)  # reserved
-
-            try:
-                status = DAQmxConnectTerms('/Dev%s/20MHzTimebase' % self.dev_numbers[0],
-                                           '/Dev%s/RTSI7' % self.dev_numbers[len(self.sorted_unique)-1],
-                                           DAQmx_Val_DoNotInvertPolarity)
-            except Exception, e:
-                print('Error: Task does not support DAQmxConnectTerms: %s' % e)
-
-            for k in range(len(sorted_unique)):
-                if k == 0:  # Master
-                    self.analog_input[k].CfgSampClkTiming('',  # const char source[],
-                                                     self.sample_rate,   # float64 rate,
-                                                     DAQmx_Val_Rising,   #  int32 activeEdge,
-                                                     DAQmx_Val_FiniteSamps,   # int32 sampleMode,
-                                                     self.n_points)  # uInt64 sampsPerChanToAcquire
-
-                    trig_chan = DSM_CHANNELS[self.wfm_trigger_channel]['physChan']
-
-                    # approximate scaling/calibration using linear approximation with zero crossing
-                    # (Shouldn't matter for analog triggers)
-                    linear_slope_approx = dsm_expression(channel_name=trig_chan, dsm_value=100)/100.
-                    trig_level = self.wfm_trigger_level/linear_slope_approx
-
-                    if self.wfm_trigger_cond == 'Rising_Edge':
-                        self.analog_input[i].CfgAnlgEdgeStartTrig(trig_chan,  # name of analog signal channel
-                                                             DAQmx_Val_RisingSlope,  # or DAQmx_Val_FallingSlope
-                                                             trig_level)  # threshold at which to start acquiring
-                    elif self.wfm_trigger_cond == 'Falling_Edge':
-                        self.analog_input[i].CfgAnlgEdgeStartTrig(trig_chan,  # name of analog signal channel
-                                                             DAQmx_Val_FallingSlope,  # or DAQmx_Val_RisingSlope
-                                                             trig_level)  # threshold at which to start acquiring
-                    else:
-                        # use this case for the force trigger
-                        pass
-
-                else:  # Slave
-                    print('Configuring Slave %s Sample Clock Timing.' % k)
-                    # DAQmxCfgSampClkTiming(taskHandle,"",rate,DAQmx_Val_Rising,DAQmx_Val_ContSamps,sampsPerChan)
-                    self.analog_input[k].CfgSampClkTiming('',   # const char source[], The source terminal of the Sample Clock.
-                                                     self.sample_rate,   # float64 rate, The sampling rate in samples per second per channel.
-                                                     DAQmx_Val_Rising,   #  int32 activeEdge,
-                                                     DAQmx_Val_FiniteSamps,   # int32 sampleMode,
-                                                     self.n_points)  # uInt64 sampsPerChanToAcquire
-
-                    try:
-                        print('Configuring Slave %s Clock Time Base.' % k)
-                        self.analog_input[k].SetSampClkTimebaseSrc('/Dev3/RTSI7')
-                    except Exception, e:
-                        print('Task does not support SetSampClkTimebaseSrc: %s' % e)
-
-                    try:
-                        print('Configuring Slave %s Clock Time Rate.' % k)
-                        self.analog_input[k].SetSampClkTimebaseRate(20e6)
-                    except Exception, e:
-                        print('Task does not support SetSampClkTimebaseRate: %s' % e)
-
-                    print('Configuring Slave %s Trigger.' % k)
-                    self.analog_input[k].CfgDigEdgeStartTrig('/Dev%s/ai/StartTrigger' % self.dev_numbers[0],
-                                                             DAQmx_Val_Rising)
-
-            for k in range(len(sorted_unique)-1, -1, -1):
-                # Start Master last so slave(s) will wait for trigger from master over RSTI bus
-                print('Starting Task: %s.' % k)
-                self.analog_input[k].StartTask()
-
-            for k in range(len(self.sorted_unique)):
-                self.analog_input[k].ReadAnalogF64(self.n_points,  # int32 numSampsPerChan,
-                                              5.0,   # float64 timeout,
-                                              DAQmx_Val_GroupByChannel,    # bool32 fillMode,
-                                              self.raw_data[k],    # float64 readArray[],
-                                              self.n_points*self.n_channels[k],    # uInt32 arraySizeInSamps,
-                                              byref(self.read),    # int32 *sampsPerChanRead,
-                                              None)   # bool32 *reserved);
-
-            try:
-                for k in range(len(self.sorted_unique)-1, -1, -1):
-                    self.analog_input[k].StopTask()
-                    self.analog_input[k].TaskControl(DAQmx_Val_Task_Unreserve)
-            except Exception, e:
-                self.ts.log_error('Error with DAQmx in StopTask. Returning nones... %s' % e)
+            if sleep is None:
+                sleep = time.sleep
+            self.waveform_arm()
+            while not self._waveform_done():
+                sleep(WFM_POLL_INTERVAL)
+            self._waveform_fetch()
 
     def waveform_status(self):
         # return INACTIVE, ACTIVE, COMPLETE
-
-        trig_type = self.analog_input[k].GetStartTrigType()
-
-        if int(trig_type) == 10099 and self.raw_data is None:
-            # DAQmx_Val_AnlgEdge 	10099 	Trigger when an analog signal signal crosses a threshold.
-            # DAQmx_Val_DigEdge 	10150 	Trigger on the rising or falling edge of a digital signal.
-            # DAQmx_Val_DigPattern 	10398 	Trigger when digital physical channels match a digital pattern.
-            # DAQmx_Val_AnlgWin 	10103 	Trigger when an analog signal enters or leaves a range of values.
-            # DAQmx_Val_None 	10230 	Disable triggering for the task.
-            stat = 'ACTIVE'
-        elif self.raw_data is not None:
+        if self.wfm_armed:
+            if self._waveform_done():
+                self._waveform_fetch()
+                stat = 'COMPLETE'
+            else:
+                stat = 'ACTIVE'
+        elif self.wfm_complete:
             stat = 'COMPLETE'
         else:
             stat = 'INACTIVE'
@@ -33,6 +33,8 @@ Questions can be directed to support@sunspec.org
 import os
 import time
 import dataset
+import eut_sim
+import vclock
 
 
 class DeviceError(Exception):
@@ -89,6 +91,10 @@ class Device(object):
             for i in range(len(self.ds.points)):
                 data.append(self.ds.data[i][self.index])
 
+            # time stamp from the bound clock, so replayed records follow virtual time
+            if self.use_timestamp != 'Enabled' and 'TIME' in self.ds.points:
+                data[self.ds.points.index('TIME')] = vclock.time()
+
         return data
 
     def waveform_config(self, params):
@@ -112,6 +118,88 @@ class Device(object):
     def waveform_capture_dataset(self):
         return self.ds
 
+
+class ModelDevice(object):
+    """
+    DAS simulator device that measures the closed-loop EUT model (eut_sim) instead of replaying a data file.
+
+    RMS records are read from the model state at the DAS sample interval. Waveform captures are synthesized from the
+    model state at each status poll from the arm time until the pre-trigger plus post-trigger time has elapsed.
+    """
+
+    def __init__(self, params=None):
+        self.ts = params['ts']
+        self.points = params['points']
+        self.model = eut_sim.model_init(self.ts)
+        self.data_points = self.model.data_points()
+        self.wfm_sample_rate = float(params.get('wfm_sample_rate', 10000.))
+        self.wfm_duration = 1.
+        self.wfm_ds = None
+        self.wfm_t_start = None
+        self.wfm_t = None
+
+    def info(self):
+        return 'DAS Simulator (EUT Model) - 1.0'
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def data_capture(self, enable=True):
+        pass
+
+    def data_read(self):
+        return self.model.data_record()
+
+    def waveform_config(self, params):
+        self.wfm_sample_rate = float(params.get('sample_rate', self.wfm_sample_rate))
+        self.wfm_duration = float(params.get('pre_trigger', 0)) + float(params.get('post_trigger', 1.))
+
+    def waveform_arm(self):
+        self.model.advance()
+        self.wfm_t_start = self.wfm_t = self.model.t
+        self.wfm_ds = dataset.Dataset(self.model.waveform_points())
+
+    def waveform_capture(self, enable=True, sleep=None):
+        """
+        Enable/disable waveform capture.
+        """
+        if enable:
+            self.waveform_arm()
+            if sleep is not None:
+                while self.waveform_status() != 'COMPLETE':
+                    sleep(.1)
+
+    def _waveform_update(self):
+        self.model.advance()
+        t_end = min(self.model.t, self.wfm_t_start + self.wfm_duration)
+        # whole samples only, so the chunks join without gaps
+        count = int((t_end - self.wfm_t) * self.wfm_sample_rate)
+        if count > 0:
+            duration = count/self.wfm_sample_rate
+            ds = self.model.waveform(duration, self.wfm_sample_rate, t_start=self.wfm_t)
+            self.wfm_ds.extend([col.tolist() for col in ds.data])
+            self.wfm_t += duration
+
+    def waveform_status(self):
+        if self.wfm_ds is None:
+            return 'INACTIVE'
+        self._waveform_update()
+        if self.wfm_t + 1./self.wfm_sample_rate > self.wfm_t_start + self.wfm_duration:
+            return 'COMPLETE'
+        return 'ACTIVE'
+
+    def waveform_force_trigger(self):
+        pass
+
+    def waveform_capture_dataset(self):
+        if self.wfm_ds is not None:
+            self.wfm_ds.start_time = self.wfm_t_start
+            self.wfm_ds.sample_rate = self.wfm_sample_rate
+        return self.wfm_ds
+
 if __name__ == "__main__":
 
     pass
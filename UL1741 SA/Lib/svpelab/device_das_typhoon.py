@@ -32,29 +32,65 @@ Questions can be directed to support@sunspec.org
 
 import time
 
+import dataset
+
 try:
     import typhoon.api.hil_control_panel as cp
     from typhoon.api.schematic_editor import model
     import typhoon.api.pv_generator as pv
 except Exception, e:
+    cp = None
     print('Typhoon HIL API not installed. %s' % e)
 
-data_points = [
-    'TIME',
-    'DC_V',
-    'DC_I',
-    'AC_VRMS',
-    'AC_IRMS',
-    'DC_P',
-    'AC_S',
-    'AC_P',
-    'AC_Q',
-    'AC_FREQ',
-    'AC_PF',
-    'TRIG',
-    'TRIG_GRID'
+# Default map of record points to HIL analog signals as (point, signal, scale). The data points are 'TIME' followed
+# by the mapped points in map order and 'DC_P', which is calculated from 'DC_V' and 'DC_I' when it is not mapped.
+# 'Pdc', 'S' and 'Qdc' are the 3 phase totals of the AC power (fundamental), apparent power and reactive power.
+# Points with no signal are recorded as None. The models have no frequency measurement, so 'AC_FREQ_<phase>' is
+# recorded as None for each phase with a voltage point unless it is mapped to a signal.
+signals_default = [
+    ('AC_VRMS_1', 'V( Vrms1 )', 1.),
+    ('AC_IRMS_1', 'I( Irms1 )', 1.),
+    ('AC_P_1', 'Pdc', 1/3.),
+    ('AC_S_1', 'S', 1/3.),
+    ('AC_Q_1', 'Qdc', 1/3.),
+    ('AC_PF_1', 'k', 1.),
+    ('AC_VRMS_2', 'V( Vrms2 )', 1.),
+    ('AC_IRMS_2', 'I( Irms2 )', 1.),
+    ('AC_P_2', 'Pdc', 1/3.),
+    ('AC_S_2', 'S', 1/3.),
+    ('AC_Q_2', 'Qdc', 1/3.),
+    ('AC_PF_2', 'k', 1.),
+    ('AC_VRMS_3', 'V( Vrms3 )', 1.),
+    ('AC_IRMS_3', 'I( Irms3 )', 1.),
+    ('AC_P_3', 'Pdc', 1/3.),
+    ('AC_S_3', 'S', 1/3.),
+    ('AC_Q_3', 'Qdc', 1/3.),
+    ('AC_PF_3', 'k', 1.),
+    ('DC_V', 'V( V_DC3 )', 1.),
+    ('DC_I', 'I( Ipv )', 1.)
 ]
 
+
+def signals_parse(signals_str):
+    """
+    Parse a signal map string of the form 'POINT=signal[*scale]; ...' into a list of (point, signal, scale) entries.
+    """
+    signals = []
+    for entry in signals_str.split(';'):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            point, signal = entry.split('=', 1)
+            scale = 1.
+            if '*' in signal:
+                signal, scale = signal.rsplit('*', 1)
+                scale = float(scale)
+            signals.append((point.strip(), signal.strip(), scale))
+        except ValueError:
+            raise DeviceError('Invalid signal map entry: %s' % (entry))
+    return signals
+
 # To be implemented later
 # typhoon_points_asgc_1 = [
 #     'time',
@@ -118,25 +154,54 @@ wfm_typhoon_channels = {'AC_V_1': 'V( Vrms1 )',
 
 event_map = {'Rising_Edge': 'Rising edge', 'Falling_Edge': 'Falling edge'}
 
+# waveform capture status poll interval (secs) for blocking captures
+WFM_POLL_INTERVAL = .1
+
+
+class DeviceError(Exception):
+    pass
+
+
 class Device(object):
 
     def __init__(self, params=None):
+        if params is None:
+            params = {}
         self.params = params
-        self.dsm_method = self.params.get('dsm_method')
-        self.dsm_id = self.params.get('dsm_id')
-        self.comp = self.params.get('comp')
-        self.file_path = self.params.get('file_path')
-        self.data_file = os.path.join(self.file_path, DATA_FILE)
-        self.points_file = os.path.join(self.file_path, POINTS_FILE)
-        self.wfm_trigger_file = os.path.join(self.file_path, WFM_TRIGGER_FILE)
-
-        self.data_points = data_points
-        self.points_map = typhoon_points_map.get(str(self.dsm_id))
-        self.points = None
-        self.point_indexes = []
-
-        self.rec = {}
-        self.recs = []
+
+        signals = self.params.get('signals')
+        if not signals or signals == 'None':
+            signals = signals_default
+        elif isinstance(signals, basestring):
+            signals = signals_parse(signals)
+
+        # compile the signal map: unique signals in batch read order and the record slot each one is scaled into
+        self.signals = []
+        self.signal_slots = []
+        self.null_slots = []
+        self.data_points = ['TIME']
+        for point, signal, scale in signals:
+            self.data_points.append(point)
+            if not signal:
+                self.null_slots.append(len(self.data_points) - 1)
+                continue
+            if signal not in self.signals:
+                self.signals.append(signal)
+            self.signal_slots.append((len(self.data_points) - 1, self.signals.index(signal), float(scale)))
+        for phase in ('1', '2', '3'):
+            if 'AC_VRMS_' + phase in self.data_points and 'AC_FREQ_' + phase not in self.data_points:
+                self.data_points.append('AC_FREQ_' + phase)
+                self.null_slots.append(len(self.data_points) - 1)
+        self.dc_p_slots = None
+        if 'DC_P' not in self.data_points and 'DC_V' in self.data_points and 'DC_I' in self.data_points:
+            self.data_points.append('DC_P')
+            self.dc_p_slots = (len(self.data_points) - 1, self.data_points.index('DC_V'),
+                               self.data_points.index('DC_I'))
+        # record size of the device points, the DAS adds its soft channel points after them
+        self.point_count = len(self.data_points)
+
+        # read all signals in a single API call when supported by the installed HIL API
+        self.batch_read = cp is not None and hasattr(cp, 'read_analog_signals')
 
         self.read_error_count = 0
         self.read_last_error = ''
@@ -155,10 +220,10 @@ class Device(object):
 
         self.ts = self.params.get('ts')
 
-        self.numberOfSamples = self.sample_rate*(self.pre_trigger+self.post_trigger)
+        self.numberOfSamples = None
         self.decimation = 1
         self.captureSettings = None
-        self.triggerOffset = (self.pre_trigger/(self.pre_trigger+self.post_trigger))*100.
+        self.triggerOffset = None
         self.triggerSettings = None
         self.channelSettings = None
 
@@ -180,49 +245,36 @@ class Device(object):
         pass
 
     def data_read(self):
+        return self.data_read_into([None] * self.point_count)
 
-        v1 = float(cp.read_analog_signal(name='V( Vrms1 )'))
-        v2 = float(cp.read_analog_signal(name='V( Vrms2 )'))
-        v3 = float(cp.read_analog_signal(name='V( Vrms3 )'))
-        i1 = float(cp.read_analog_signal(name='I( Irms1 )'))
-        i2 = float(cp.read_analog_signal(name='I( Irms2 )'))
-        i3 = float(cp.read_analog_signal(name='I( Irms3 )'))
-        p = float(cp.read_analog_signal(name='Pdc'))  # Note this is the AC power (fundamental)
-        va = float(cp.read_analog_signal(name='S'))
-        q = float(cp.read_analog_signal(name='Qdc'))
-        pf = float(cp.read_analog_signal(name='k'))
-        # f = cp.frequency
-
-        dc_v = float(cp.read_analog_signal(name='V( V_DC3 )'))
-        dc_i = float(cp.read_analog_signal(name='I( Ipv )'))
-
-        datarec = {'TIME': time.time(),
-                   'AC_VRMS_1': v1,
-                   'AC_IRMS_1': i1,
-                   'AC_P_1': p/3.,
-                   'AC_S_1': va/3.,
-                   'AC_Q_1': q/3.,
-                   'AC_PF_1': pf,
-                   'AC_FREQ_1': None,
-                   'AC_VRMS_2': v2,
-                   'AC_IRMS_2': i2,
-                   'AC_P_2': p/3.,
-                   'AC_S_2': va/3.,
-                   'AC_Q_2': q/3.,
-                   'AC_PF_2': pf,
-                   'AC_FREQ_2': None,
-                   'AC_VRMS_3': v3,
-                   'AC_IRMS_3': i3,
-                   'AC_P_3': p/3.,
-                   'AC_S_3': va/3.,
-                   'AC_Q_3': q/3.,
-                   'AC_PF_3': pf,
-                   'AC_FREQ_3': None,
-                   'DC_V': dc_v,
-                   'DC_I': dc_i,
-                   'DC_P': dc_i*dc_v}
-
-        return datarec
+    def signals_read(self):
+        """
+        Read the current values of all mapped signals in signal order.
+        """
+        if self.batch_read:
+            return cp.read_analog_signals(signals=self.signals)
+        return [cp.read_analog_signal(name=signal) for signal in self.signals]
+
+    def data_read_into(self, rec):
+        """
+        Read the current values into the record slots in data_points order.
+        """
+        values = self.signals_read()
+        if len(values) != len(self.signals):
+            raise DeviceError('Signal read mismatch: %s %s' % (self.signals, values))
+        rec[0] = time.time()
+        for slot, index, scale in self.signal_slots:
+            rec[slot] = float(values[index]) * scale
+        for slot in self.null_slots:
+            rec[slot] = None
+        if self.dc_p_slots is not None:
+            slot, v, i = self.dc_p_slots
+            # DC power is only available when both the DC voltage and current are mapped
+            if rec[v] is not None and rec[i] is not None:
+                rec[slot] = rec[v] * rec[i]
+            else:
+                rec[slot] = None
+        return rec
 
     def waveform_config(self, params):
         """
@@ -247,51 +299,63 @@ class Device(object):
         self.wfm_timeout = params.get('timeout')
         self.wfm_channels = params.get('channels')
 
-        self.captureSettings = [self.decimation, len(self.channels), self.numberOfSamples]
+        self.numberOfSamples = int(self.wfm_sample_rate*(self.wfm_pre_trigger+self.wfm_post_trigger))
+        self.triggerOffset = (float(self.wfm_pre_trigger)/(self.wfm_pre_trigger+self.wfm_post_trigger))*100.
+        self.captureSettings = [self.decimation, len(self.wfm_channels), self.numberOfSamples]
 
         # triggerType,triggerSource,threshold,edge,triggerOffset
-        self.triggerSettings = ["Analog", self.trigger_channel, self.trigger_level,
+        self.triggerSettings = ["Analog", wfm_typhoon_channels.get(self.wfm_trigger_channel), self.wfm_trigger_level,
                                 event_map[self.wfm_trigger_cond], self.triggerOffset]
         # triggerType - type of trigger ("Analog" , "Digital" or "Forced")
 
         # signals for capturing
         # self.channelSettings = ['V( Vrms1 )', 'V( Vrms2 )', 'V( Vrms3 )', 'I( Irms1 )', 'I( Irms2 )', 'I( Irms3 )']
         self.channelSettings = []
-        for i in range(self.wfm_channels):
+        for i in range(len(self.wfm_channels)):
             self.channelSettings.append(wfm_typhoon_channels.get(self.wfm_channels[i]))
 
         # regular python list is used for data buffer
         self.capturedDataBuffer = None  # reset the data buffer
 
+    def waveform_arm(self):
+        """
+        Start the HIL capture without waiting for it to complete.
+        """
+        self.capturedDataBuffer = []
+        self.signalsNames = self.wfm_data = self.time_vector = None
+        if not cp.start_capture(self.captureSettings,
+                                self.triggerSettings,
+                                self.channelSettings,
+                                dataBuffer=self.capturedDataBuffer,
+                                fileName=self.wfm_capture_name_path):
+            self.capturedDataBuffer = None
+            raise DeviceError('HIL waveform capture failed to start')
+
     def waveform_capture(self, enable=True, sleep=None):
         """
         Enable/disable waveform capture.
         """
         if enable:
-            # start capture process and if everything ok continue...
-            if hil.start_capture(self.captureSettings,
-                                 self.triggerSettings,
-                                 self.channelSettings,
-                                 dataBuffer=self.capturedDataBuffer,
-                                 fileName=self.wfm_capture_name_path):
-
-                # when capturing is finished...
-                while waveform_status == 'ACTIVE':
-                    pass
-
-                # unpack data from data buffer
-                # signalsNames - list with names
-                # wfm_data  - 'numpy.ndarray' matrix with data values,
-                # time_vector - 'numpy.array' with time data
-                self.signalsNames, self.wfm_data, self.time_vector = capturedDataBuffer[0]
+            if sleep is None:
+                sleep = time.sleep
+            self.waveform_arm()
+            # when capturing is finished...
+            while self.waveform_status() == 'ACTIVE':
+                sleep(WFM_POLL_INTERVAL)
 
     def waveform_status(self):
         # return INACTIVE, ACTIVE, COMPLETE
-        if hil.capture_in_progress():
-            stat = 'ACTIVE'
-        elif self.capturedDataBuffer is None:
+        if self.capturedDataBuffer is None:
             stat = 'INACTIVE'
+        elif cp.capture_in_progress() or len(self.capturedDataBuffer) == 0:
+            stat = 'ACTIVE'
         else:
+            if self.signalsNames is None:
+                # unpack data from data buffer
+                # signalsNames - list with names
+                # wfm_data  - 'numpy.ndarray' matrix with data values,
+                # time_vector - 'numpy.array' with time data
+                self.signalsNames, self.wfm_data, self.time_vector = self.capturedDataBuffer[0]
             stat = 'COMPLETE'
         return stat
 
@@ -302,12 +366,14 @@ class Device(object):
         self.triggerSettings = ["Forced"]
 
     def waveform_capture_dataset(self):
+        if self.waveform_status() != 'COMPLETE':
+            raise DeviceError('Waveform capture not complete')
         ds = dataset.Dataset()
 
         if len(self.signalsNames) == len(self.channelSettings):
             ds.points.append('TIME')
             ds.data.append(self.time_vector)
-            for i in range(self.channelSettings):
+            for i in range(len(self.channelSettings)):
                 ds.points.append(wfm_typhoon_channels.get(self.signalsNames[i]))
                 # unpack data for appropriate captured signals
                 ds.data.append(self.wfm_data[i])  # first row for first signal and so on
@@ -37,6 +37,11 @@ import glob
 import waveform
 import dataset
 
+try:
+    import numpy as np
+except Exception, e:
+    np = None
+
 data_points = [
     'TIME',
     'DC_V',
@@ -264,10 +269,247 @@ WFM_TRIGGER_FILE = 'waveform trigger.txt'
 
 event_map = {'Rising_Edge': 'Rising Edge', 'Falling_Edge': 'Falling Edge'}
 
+# time (secs) the waveform capture file must remain unchanged before the capture is considered complete
+WFM_SETTLE_TIME = .5
+
+# bounded retry with exponential backoff (secs) while LabVIEW holds the data file
+DATA_READ_RETRIES = 10
+DATA_READ_BACKOFF = .005
+DATA_READ_BACKOFF_MAX = .1
+
 class DeviceError(Exception):
     pass
 
 
+class FileStability(object):
+    """
+    Non-blocking file completion detector.
+
+    Each call to poll() stats the file and records when its size or modification time last changed. The file is
+    considered stable once it has been unchanged for settle_time seconds. No sleeping is done, so the caller's
+    polling loop determines the detection latency.
+    """
+
+    def __init__(self, filename, settle_time=WFM_SETTLE_TIME, clock=time.time):
+        self.filename = filename
+        self.settle_time = settle_time
+        self.clock = clock
+        self.state = None
+        self.changed = None
+
+    def poll(self):
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            self.state = None
+            return False
+        state = (st.st_size, st.st_mtime)
+        now = self.clock()
+        if state != self.state:
+            self.state = state
+            self.changed = now
+            return False
+        return (now - self.changed) >= self.settle_time
+
+
+class DataFileReader(object):
+    """
+    Reader for the DSM RMS data file.
+
+    The data file is opened for each read and closed again, so it is never held open while LabVIEW rewrites it. The
+    file is only read and parsed when its size, modification time or inode have changed since the last read,
+    otherwise the parsed values are reused. The values of the last complete '[...]' record are returned as a list of
+    floats, or the previous values if there is no complete record. Read errors, such as LabVIEW holding the file, are
+    retried a bounded number of times with exponential backoff.
+    """
+
+    def __init__(self, filename, retries=DATA_READ_RETRIES, backoff=DATA_READ_BACKOFF, sleep=time.sleep):
+        self.filename = filename
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.values = None
+        self.state = None
+
+    def _parse(self, data):
+        end = data.rfind(']')
+        if end < 0:
+            return False
+        start = data.rfind('[', 0, end)
+        if start < 0:
+            return False
+        try:
+            self.values = [float(v) for v in data[start+1:end].split(',')]
+        except ValueError:
+            # partially written record, the last values are repeated
+            return False
+        return True
+
+    def _read(self):
+        st = os.stat(self.filename)
+        state = (st.st_size, st.st_mtime, st.st_ino)
+        if state == self.state:
+            return self.values
+        f = open(self.filename, 'rb')
+        try:
+            data = f.read()
+        finally:
+            f.close()
+        if self._parse(data):
+            # a partially written record is parsed again on the next read
+            self.state = state
+        return self.values
+
+    def read(self):
+        attempt = 0
+        while True:
+            try:
+                return self._read()
+            except (IOError, OSError), e:
+                if attempt >= self.retries:
+                    raise DeviceError('Unable to read DSM data file %s: %s' % (self.filename, str(e)))
+                self.sleep(min(self.backoff * (2 ** attempt), DATA_READ_BACKOFF_MAX))
+                attempt += 1
+
+
+class WfmReader(object):
+    """
+    Incremental bulk parser for DSM .wfm waveform capture files.
+
+    Each read() opens the file, consumes only the complete lines appended since the previous read and closes it, so
+    parsing can proceed while the LabVIEW writer is still appending to the file. Each block of lines is parsed in a
+    single call (numpy.fromstring when numpy is available) rather than one float() per value, and the field count of
+    each line is checked against the header.
+    """
+
+    def __init__(self, filename, dsm_id):
+        self.filename = filename
+        self.dsm_id = dsm_id
+        self.points = None
+        self.point_count = 0
+        self.offset = 0
+        self.lines = 0
+        self._partial = ''
+        self._chunks = []
+
+    def _header(self, line):
+        ids = line.strip().split('\t')
+        if ids[0] != 'Time':
+            raise DeviceError('Unexpected time point name in waveform capture: %s' % ids[0])
+        points = ['TIME']
+        for i in range(1, len(ids)):
+            if ids[i]:
+                id = ids[i].strip().lower()
+                index = id.rfind('_')
+                if id[index+1:] == str(self.dsm_id):
+                    id = id[:index]
+                label = wfm_points_label.get(id)
+                if label is None:
+                    raise DeviceError('Unknown DSM point name in waveform capture: %s' % id)
+                points.append(label)
+        self.points = points
+        self.point_count = len(points)
+
+    def _check_lines(self, text):
+        """
+        Raise an error for the first line of text that does not have a field for each point.
+        """
+        if np is not None:
+            # count the fields of each line from the field start positions
+            b = np.frombuffer(text, dtype=np.uint8)
+            space = (b == 9) | (b == 10) | (b == 13) | (b == 32)
+            starts = ~space
+            starts[1:] &= space[:-1]
+            ends = np.flatnonzero(b == 10)
+            fields = np.diff(np.concatenate(([0], np.cumsum(starts)[ends])))
+            bad = np.flatnonzero(fields != self.point_count)
+            if len(bad) > 0:
+                raise DeviceError('Point data error in waveform capture line %s' % (self.lines + bad[0] + 1))
+        else:
+            for i, line in enumerate(text.splitlines()):
+                if len(line.split()) != self.point_count:
+                    raise DeviceError('Point data error in waveform capture line %s' % (self.lines + i + 1))
+
+    def _parse(self, text):
+        if not text:
+            return 0
+        if not text.endswith('\n'):
+            text += '\n'
+        self._check_lines(text)
+        if np is not None:
+            values = np.fromstring(text, dtype=float, sep=' ')
+        else:
+            values = [float(v) for v in text.split()]
+        count = len(values)
+        if count % self.point_count != 0:
+            raise DeviceError('Point data error in waveform capture after line %s' % (self.lines))
+        rows = count // self.point_count
+        if np is not None:
+            self._chunks.append(values.reshape(rows, self.point_count))
+        else:
+            self._chunks.append([values[i::self.point_count] for i in range(self.point_count)])
+        self.lines += rows
+        return rows
+
+    def read(self, final=False):
+        """
+        Parse any complete records appended to the file since the last read. If final is True, a trailing record
+        without a line terminator is also parsed. Returns the number of records parsed.
+        """
+        # the file is not held open between reads so the LabVIEW writer is never blocked
+        f = open(self.filename, 'rb')
+        try:
+            f.seek(self.offset)
+            data = f.read()
+        finally:
+            f.close()
+        self.offset += len(data)
+        data = self._partial + data
+        if final:
+            self._partial = ''
+        else:
+            end = data.rfind('\n') + 1
+            self._partial = data[end:]
+            data = data[:end]
+        if self.points is None:
+            end = data.find('\n')
+            if end < 0:
+                if final and data.strip():
+                    self._header(data)
+                else:
+                    self._partial = data + self._partial
+                return 0
+            self._header(data[:end])
+            data = data[end + 1:]
+        return self._parse(data)
+
+    def columns(self):
+        """
+        Return the parsed data as a list of columns in point order.
+        """
+        if np is not None:
+            if self._chunks:
+                data = np.concatenate(self._chunks).T
+            else:
+                data = np.empty((self.point_count, 0))
+            return [data[i].tolist() for i in range(self.point_count)]
+        columns = [[] for i in range(self.point_count)]
+        for chunk in self._chunks:
+            for i in range(self.point_count):
+                columns[i].extend(chunk[i])
+        return columns
+
+    def dataset(self):
+        """
+        Complete the read of the capture file and return the contents as a Dataset.
+        """
+        self.read(final=True)
+        self.close()
+        if self.points is None:
+            raise DeviceError('No header in waveform capture: %s' % self.filename)
+        return dataset.Dataset(list(self.points), self.columns())
+
+
 class Device(object):
 
     def extract_points(self, points_str, op):
@@ -291,6 +533,7 @@ class Device(object):
 
         self.rec = {}
         self.recs = []
+        self.data_reader = DataFileReader(self.data_file)
 
         self.read_error_count = 0
         self.read_last_error = ''
@@ -308,6 +551,10 @@ class Device(object):
         self.wfm_dsm_channels = None
         self.wfm_capture_name = None
         self.wfm_capture_name_path = None
+        self.wfm_settle_time = self.params.get('wfm_settle_time', WFM_SETTLE_TIME)
+        self.wfm_reader = None
+        self.wfm_stability = None
+        self.wfm_armed = False
 
         self.ts = self.params.get('ts')
 
@@ -359,35 +606,17 @@ class Device(object):
         pass
 
     def data_read(self):
-        retries = 10
+        points = self.data_reader.read()
+        if points is None:
+            return []
+        if len(points) != len(self.points):
+            raise DeviceError('Error reading points: point count mismatch %d %d' % (len(points), len(self.points)))
         rec = []
-        data = None
-        try:
-            while data is None and retries > 0:
-                try:
-                    f = open(self.data_file)
-                    data = f.read()
-                    f.close()
-                except Exception, e:
-                    retries -= 1
-
-            if data is not None:
-                points = self.extract_points(data, float)
-                print zip(self.points, points)
-                if points is not None:
-                    if len(points) == len(self.points):
-                        for index in self.point_indexes:
-                            if index >= 0:
-                                p = points[index]
-                            else:
-                                p = float('NaN')
-                            rec.append(p)
-                    else:
-                        raise Exception('Error reading points: point count mismatch %d %d' % (len(points),
-                                                                                              len(self.points)))
-        except Exception, e:
-            raise Exception(traceback.format_exc())
-
+        for index in self.point_indexes:
+            if index >= 0:
+                rec.append(points[index])
+            else:
+                rec.append(float('NaN'))
         return rec
 
     def waveform_config(self, params):
@@ -422,6 +651,68 @@ class Device(object):
         print('Channels to record: %s' % str(self.wfm_channels))
 
 
+    def waveform_arm(self):
+        """
+        Start a waveform capture by writing the capture trigger file. Does not wait for the DSM to accept it.
+        """
+        self.wfm_capture_name = None
+        self.wfm_reader = None
+        self.wfm_stability = None
+        # remove old trigger file results
+        files = glob.glob(os.path.join(self.file_path, '* %s' % WFM_TRIGGER_FILE))
+        # self.params['ts'].log(str(self.params))
+        # self.params['ts'].log(files)
+        for f in files:
+            os.remove(f)
+
+        # if self.waveform_status() is True:
+         #    raise DeviceError('Waveform capture already in progress')
+        '''
+        File format:
+            sample rate
+            pre-trigger time in seconds
+            post-trigger time in seconds
+            level
+            window
+            timeout in seconds
+            condition ['Rising Edge', 'Falling Edge']
+            trigger channel
+            channel
+            channel
+            ...
+        '''
+        config_str = '%0.1fe3\n%f\n%f\n%f\n10e-3\n%d\n%s\n%s\n' % (
+            self.wfm_sample_rate/1000, self.wfm_pre_trigger, self.wfm_post_trigger, self.wfm_trigger_level,
+            self.wfm_timeout, event_map[self.wfm_trigger_cond], self.wfm_dsm_trigger_channel)
+        for c in self.wfm_dsm_channels:
+            config_str += '%s\n' % c
+
+        # create capture file
+        f = open(self.wfm_trigger_file, 'w')
+        f.write(config_str)
+        f.close()
+        self.wfm_armed = True
+
+    def _waveform_accepted(self):
+        """
+        Return True once the DSM has consumed the trigger file and created the trigger result file.
+        """
+        if os.path.exists(self.wfm_trigger_file):
+            return False
+        filename = os.path.join(self.file_path, '* %s' % WFM_TRIGGER_FILE)
+        files = glob.glob(filename)
+        if len(files) == 0:
+            raise DeviceError('No waveform trigger result file')
+        elif len(files) > 1:
+            raise DeviceError('Unexpected multiple waveform trigger result files')
+        self.wfm_capture_name = '%s.wfm' % (os.path.basename(files[0])[:19])
+        self.wfm_capture_name_path = os.path.join(self.file_path, self.wfm_capture_name)
+        self.wfm_reader = WfmReader(self.wfm_capture_name_path, self.dsm_id)
+        self.wfm_stability = FileStability(self.wfm_capture_name_path, settle_time=self.wfm_settle_time)
+        self.wfm_armed = False
+        # self.params['ts'].log(self.wfm_capture_name)
+        return True
+
     def waveform_capture(self, enable=True, sleep=None):
         """
         Enable/disable waveform capture.
@@ -429,72 +720,30 @@ class Device(object):
         if enable:
             if sleep is None:
                 raise DeviceError('Must supply a sleep function on waveform capture enable')
-            self.wfm_capture_name = None
-            # remove old trigger file results
-            files = glob.glob(os.path.join(self.file_path, '* %s' % WFM_TRIGGER_FILE))
-            # self.params['ts'].log(str(self.params))
-            # self.params['ts'].log(files)
-            for f in files:
-                os.remove(f)
-
-            # if self.waveform_status() is True:
-             #    raise DeviceError('Waveform capture already in progress')
-            '''
-            File format:
-                sample rate
-                pre-trigger time in seconds
-                post-trigger time in seconds
-                level
-                window
-                timeout in seconds
-                condition ['Rising Edge', 'Falling Edge']
-                trigger channel
-                channel
-                channel
-                ...
-            '''
-            config_str = '%0.1fe3\n%f\n%f\n%f\n10e-3\n%d\n%s\n%s\n' % (
-                self.wfm_sample_rate/1000, self.wfm_pre_trigger, self.wfm_post_trigger, self.wfm_trigger_level,
-                self.wfm_timeout, event_map[self.wfm_trigger_cond], self.wfm_dsm_trigger_channel)
-            for c in self.wfm_dsm_channels:
-                config_str += '%s\n' % c
-
-            # create capture file
-            f = open(self.wfm_trigger_file, 'w')
-            f.write(config_str)
-            f.close()
+            self.waveform_arm()
 
             wait_time = self.wfm_timeout
             for i in range(int(wait_time) + 1):
-                print ('looking for %s' % self.wfm_trigger_file)
-                if not os.path.exists(self.wfm_trigger_file):
+                if self._waveform_accepted():
                     break
                 if i >= wait_time:
                     raise DeviceError('Waveform start capture timeout')
                 sleep(1)
 
-            filename = os.path.join(self.file_path, '* %s' % WFM_TRIGGER_FILE)
-            print ('looking for %s' % filename)
-            files = glob.glob(filename)
-            if len(files) == 0:
-                raise DeviceError('No waveform trigger result file')
-            elif len(files) > 1:
-                raise DeviceError('Unexpected multiple waveform trigger result files')
-            self.wfm_capture_name = '%s.wfm' % (os.path.basename(files[0])[:19])
-            self.wfm_capture_name_path = os.path.join(self.file_path, self.wfm_capture_name)
-            # self.params['ts'].log(self.wfm_capture_name)
-
     def waveform_status(self):
         # mm-dd-yyyy hh_mm_ss waveform trigger.txt
         # mm-dd-yyyy hh_mm_ss.wfm
         # return INACTIVE, ACTIVE, COMPLETE
+        # The capture file is parsed as it is written and is complete once it has stopped changing for the settle
+        # time. Each call is non-blocking, so completion is reported on a later poll once the file has settled.
         stat = 'ACTIVE'
-        if self.wfm_capture_name is not None:
+        if self.wfm_armed and not self._waveform_accepted():
+            pass
+        elif self.wfm_capture_name is not None:
             # self.params['ts'].log('Searching for %s' % self.wfm_capture_name_path)
             if os.path.exists(self.wfm_capture_name_path):
-                size = os.path.getsize(self.wfm_capture_name_path)
-                time.sleep(.1)
-                if size == os.path.getsize(self.wfm_capture_name_path):
+                self.wfm_reader.read()
+                if self.wfm_stability.poll():
                     stat = 'COMPLETE'
         else:
             stat = 'INACTIVE'
@@ -504,42 +753,10 @@ class Device(object):
         pass
 
     def waveform_capture_dataset(self):
-        ds = dataset.Dataset()
-        f = open(self.wfm_capture_name_path, 'r')
-        ids = f.readline().strip().split('\t')
-        print (str(ids))
-        if ids[0] != 'Time':
-            raise DeviceError('Unexpected time point name in waveform capture: %s' % ids[0])
-        ds.points.append('TIME')
-        count = len(ids)
-        points = []
-        point_count = 1
-        points.append([])  # for time
-        for i in range(1, count):
-            if ids[i]:
-                id = ids[i].strip().lower()
-                i = id.rfind('_')
-                if id[i+1:] == str(self.dsm_id):
-                    id = id[:i]
-                label = wfm_points_label.get(id)
-                if label is None:
-                    raise DeviceError('Unknown DSM point name in waveform capture: %s', id)
-                ds.points.append(label)
-                points.append([])
-                point_count += 1
-
-        line = 0
-        for data in f:
-            line += 1
-            values = data.strip().split('\t')
-            if len(values) != point_count:
-                raise DeviceError('Point data error in waveform capture line %s' % (line))
-            for i in range(point_count):
-                points[i].append(float(values[i]))
-
-        for i in range(point_count):
-            ds.data.append(points[i])
-
+        if self.wfm_reader is None:
+            self.wfm_reader = WfmReader(self.wfm_capture_name_path, self.dsm_id)
+        ds = self.wfm_reader.dataset()
+        self.wfm_reader = None
         return ds
 
 if __name__ == "__main__":
@@ -0,0 +1,459 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import math
+
+import dataset
+import vclock
+
+try:
+    import numpy as np
+except Exception, e:
+    print('Error: numpy python package not found!')  # This will appear in the SVP log file.
+
+'''
+Closed-loop EUT (inverter) model shared by the simulator drivers.
+
+The grid simulator (gridsim_sim), PV simulator (pvsim_sim), DER (der_eut_sim) and DAS (das_sim with the 'EUT Model'
+source) simulation drivers all operate on one EUTModel instance per test script run, obtained with model_init(ts):
+
+    gridsim_sim - voltage(), freq() and grid profiles set the EPS voltage and frequency at the EUT terminals.
+    pvsim_sim - power_set(), irradiance_set() and power_on() set the available DC power.
+    der_eut_sim - the der API settings (fixed power factor, volt-var, freq-watt, ramp rates, maximum power, trip
+                  settings and connect) configure the EUT functions.
+    das_sim - RMS data records and waveform captures are synthesized from the model state.
+
+The model is advanced to the current time of the bound clock (vclock) whenever it is read or changed, so it runs
+against both real and virtual time. Between inputs the EUT state is integrated in fixed time steps:
+
+    - The active power target is the available power limited by the maximum power setting and freq-watt. Increases
+      are limited by the normal ramp rate, or the soft-start ramp rate after a reconnect.
+    - The reactive power target is set by volt-var, fixed power factor or the reactive power setting and limited to
+      the apparent power rating.
+    - P and Q settle to their targets with a first order response.
+    - The EUT trips when the voltage or frequency is beyond a trip setting for longer than the trip time and
+      reconnects after the reconnect time once the voltage and frequency are back within the trip settings.
+
+RMS records and waveforms are computed for all phases and samples with array operations.
+'''
+
+MODEL_DEFAULT_ID = 'der.eut_sim'
+
+model_defaults = {
+    'phases': 1,
+    'p_rated': 3000.,
+    's_rated': 3000.,
+    'q_max': 1320.,
+    'v_nom': 240.,
+    'f_nom': 60.,
+    'v_dc': 400.,
+    'efficiency': 97.,
+    'tau': .5,
+    'rr_normal': 100.,
+    'rr_soft_start': 2.,
+    'v_trip_low': 50.,
+    't_trip_v_low': 1.,
+    'v_trip_high': 120.,
+    't_trip_v_high': .16,
+    'f_trip_low': 57.,
+    't_trip_f_low': .16,
+    'f_trip_high': 62.,
+    't_trip_f_high': .16,
+    't_reconnect': 300.,
+    'dt': .02
+}
+
+# phase angle of each phase voltage
+phase_angles = [0., -2*math.pi/3, 2*math.pi/3]
+
+
+class EUTModelError(Exception):
+    """
+    Exception to wrap all EUT model generated exceptions.
+    """
+    pass
+
+
+class EUTModel(object):
+    """
+    Inverter model. Ratings and settings are in the units of the model_defaults entries; ramp rates are in percent of
+    rated power per second and trip voltages in percent of nominal voltage.
+    """
+
+    def __init__(self, params=None, clock=None):
+        self.params = dict(model_defaults)
+        if params is not None:
+            self.params.update(params)
+        for name, value in self.params.iteritems():
+            setattr(self, name, value)
+        self.phases = int(self.phases)
+        self.clock = clock
+        self.t = self.time()
+
+        # inputs
+        self.v = [float(self.v_nom)] * self.phases
+        self.f = float(self.f_nom)
+        self.grid_profile = None
+        self.grid_profile_start = None
+        self.p_avail = 0.
+        self.dc_on = False
+        # waveform phase (radians) at the end of the last synthesized waveform
+        self.wfm_phase = 0.
+        self.wfm_phase_t = None
+
+        # settings
+        self.conn = True
+        self.fixed_pf = {'Ena': False, 'PF': 1.}
+        self.volt_var = {'Ena': False, 'ActCrv': 1}
+        self.volt_var_curves = {}
+        self.freq_watt = {'Ena': False, 'ActCrv': 1}
+        self.freq_watt_curves = {}
+        self.freq_watt_param = {'Ena': False, 'HzStr': 0.2, 'WGra': 40.}
+        self.wmax_pct = 100.
+        self.q_pct = None
+
+        # state
+        self.p = 0.
+        self.q = 0.
+        self.connected = True
+        self.soft_start = False
+        self.trip_timers = {}
+        self.reconnect_timer = 0.
+        self.trip_count = 0
+
+    def time(self):
+        if self.clock is not None:
+            return self.clock.time()
+        return vclock.time()
+
+    def config(self, params):
+        """
+        Update model ratings and settings from a dictionary of model_defaults entries.
+        """
+        self.advance()
+        for name, value in params.iteritems():
+            if name not in model_defaults:
+                raise EUTModelError('Unknown model parameter: %s' % (name))
+            self.params[name] = value
+            setattr(self, name, value)
+
+    # inputs
+
+    def grid_voltage(self, v):
+        self.advance()
+        self.grid_profile = None
+        if not isinstance(v, (list, tuple)):
+            v = [v] * self.phases
+        self.v = [float(x) for x in v[:self.phases]]
+
+    def grid_freq(self, f):
+        self.advance()
+        self.grid_profile = None
+        self.f = float(f)
+
+    def grid_profile_run(self, profile):
+        """
+        Run a grid profile of (time offset, v1 %, v2 %, v3 %, freq %) entries from the current time.
+        """
+        self.advance()
+        self.grid_profile = [[float(x) for x in entry] for entry in profile]
+        self.grid_profile_start = self.t
+
+    def grid(self):
+        """
+        Return the present voltage of each phase and frequency at the EUT terminals.
+        """
+        self.advance()
+        return self._grid(self.t)
+
+    def grid_hold(self):
+        """
+        Stop a running grid profile, holding the present voltage and frequency.
+        """
+        self.advance()
+        self.v, self.f = self._grid(self.t)
+        self.grid_profile = None
+
+    def pv_power(self, power):
+        self.advance()
+        self.p_avail = float(power)
+
+    def pv_on(self, on=True):
+        self.advance()
+        self.dc_on = on
+
+    def settings(self, **kwargs):
+        """
+        Change EUT function settings (attributes of the model such as fixed_pf, volt_var, wmax_pct).
+        """
+        self.advance()
+        for name, value in kwargs.iteritems():
+            if not hasattr(self, name):
+                raise EUTModelError('Unknown model setting: %s' % (name))
+            setattr(self, name, value)
+        if not self.conn and self.connected:
+            self.connected = False
+            self.p = self.q = 0.
+
+    # model
+
+    def _grid(self, t):
+        if self.grid_profile is None:
+            return self.v, self.f
+        profile = self.grid_profile
+        offset = t - self.grid_profile_start
+        entry = profile[-1]
+        for i in range(1, len(profile)):
+            if offset < profile[i][0]:
+                p0 = profile[i - 1]
+                p1 = profile[i]
+                span = p1[0] - p0[0]
+                k = (offset - p0[0])/span if span > 0 else 1.
+                entry = [a + (b - a)*k for a, b in zip(p0, p1)]
+                break
+        if offset >= profile[-1][0]:
+            # hold the final values
+            self.v = [entry[i + 1]*self.v_nom/100 for i in range(self.phases)]
+            self.f = entry[4]*self.f_nom/100
+            self.grid_profile = None
+        return [entry[i + 1]*self.v_nom/100 for i in range(self.phases)], entry[4]*self.f_nom/100
+
+    def _targets(self, v, f):
+        if not self.connected or not self.dc_on:
+            return 0., 0.
+        p = min(self.p_avail, self.p_rated * self.wmax_pct/100.)
+        if self.freq_watt.get('Ena'):
+            curve = self.freq_watt_curves.get(self.freq_watt.get('ActCrv', 1))
+            if curve is not None:
+                p = min(p, interp(f, curve['hz'], curve['w']) * self.p_rated/100.)
+        elif self.freq_watt_param.get('Ena'):
+            df = f - self.f_nom - self.freq_watt_param.get('HzStr', 0.)
+            if df > 0:
+                p = min(p, p * max(1. - self.freq_watt_param.get('WGra', 0.)/100. * df, 0.))
+        p = max(p, 0.)
+
+        q = 0.
+        s = self.s_rated
+        if self.volt_var.get('Ena'):
+            curve = self.volt_var_curves.get(self.volt_var.get('ActCrv', 1))
+            if curve is not None:
+                v_pct = sum(v)/len(v)/self.v_nom*100.
+                q_pct = interp(v_pct, curve['v'], curve['var'])
+                if str(curve.get('Dept_Ref', '')).upper() == 'VAR_AVAL_PCT':
+                    q = q_pct/100. * math.sqrt(max(s*s - p*p, 0.))
+                else:
+                    q = q_pct/100. * self.q_max
+                    # reactive power priority, reduce active power
+                    p = min(p, math.sqrt(max(s*s - q*q, 0.)))
+        elif self.fixed_pf.get('Ena'):
+            pf = float(self.fixed_pf.get('PF', 1.))
+            if pf != 0 and abs(pf) < 1:
+                q = p * math.tan(math.acos(abs(pf)))
+                if pf < 0:
+                    q = -q
+                if p*p + q*q > s*s:
+                    scale = s/math.sqrt(p*p + q*q)
+                    p *= scale
+                    q *= scale
+        elif self.q_pct is not None:
+            q = self.q_pct/100. * self.q_max
+        q = max(min(q, self.q_max), -self.q_max)
+        q_lim = math.sqrt(max(s*s - p*p, 0.))
+        q = max(min(q, q_lim), -q_lim)
+        return p, q
+
+    def _trip_check(self, v, f, dt):
+        v_pct = [x/self.v_nom*100. for x in v]
+        limits = (('v_low', min(v_pct) < self.v_trip_low, self.t_trip_v_low),
+                  ('v_high', max(v_pct) > self.v_trip_high, self.t_trip_v_high),
+                  ('f_low', f < self.f_trip_low, self.t_trip_f_low),
+                  ('f_high', f > self.f_trip_high, self.t_trip_f_high))
+        in_range = True
+        for name, beyond, t_trip in limits:
+            if beyond:
+                in_range = False
+                timer = self.trip_timers.get(name, 0.) + dt
+                self.trip_timers[name] = timer
+                if self.connected and timer >= t_trip:
+                    # the output is interrupted at the trip
+                    self.connected = False
+                    self.p = self.q = 0.
+                    self.trip_count += 1
+                    self.reconnect_timer = 0.
+            else:
+                self.trip_timers[name] = 0.
+        if not self.connected and self.conn:
+            if in_range:
+                self.reconnect_timer += dt
+                if self.reconnect_timer >= self.t_reconnect:
+                    self.connected = True
+                    self.soft_start = True
+            else:
+                self.reconnect_timer = 0.
+
+    def _step(self, t, dt):
+        v, f = self._grid(t)
+        self._trip_check(v, f, dt)
+        p_target, q_target = self._targets(v, f)
+        k = 1. - math.exp(-dt/self.tau) if self.tau > 0 else 1.
+        p = self.p + (p_target - self.p)*k
+        if p > self.p:
+            rr = self.rr_soft_start if self.soft_start else self.rr_normal
+            if rr:
+                p = min(p, self.p + rr/100. * self.p_rated * dt)
+        if self.soft_start and p >= p_target - .01 * self.p_rated:
+            self.soft_start = False
+        self.p = p
+        self.q += (q_target - self.q)*k
+
+    def advance(self, t=None):
+        """
+        Integrate the model state up to time t (default: the current clock time).
+        """
+        if t is None:
+            t = self.time()
+        dt = self.dt
+        while self.t + dt <= t:
+            self.t += dt
+            self._step(self.t, dt)
+        if t > self.t:
+            self._step(t, t - self.t)
+            self.t = t
+
+    # measurements
+
+    def data_points(self):
+        points = ['TIME']
+        for name in ('VRMS', 'IRMS', 'P', 'S', 'Q', 'PF', 'FREQ'):
+            for i in range(1, self.phases + 1):
+                points.append('AC_%s_%s' % (name, i))
+        points.extend(['DC_V', 'DC_I', 'DC_P'])
+        return points
+
+    def data_record(self):
+        """
+        Return the RMS data record of the current state in data_points() order.
+        """
+        self.advance()
+        v, f = self._grid(self.t)
+        n = self.phases
+        p = self.p/n
+        q = self.q/n
+        s = math.sqrt(p*p + q*q)
+        pf = p/s if s > 0 else 1.
+        if q < 0:
+            pf = -pf
+        rec = [self.t]
+        rec.extend(v)
+        rec.extend([s/x if x > 0 else 0. for x in v])
+        rec.extend([p] * n)
+        rec.extend([s] * n)
+        rec.extend([q] * n)
+        rec.extend([pf] * n)
+        rec.extend([f] * n)
+        dc_p = self.p/(self.efficiency/100.) if self.dc_on else 0.
+        v_dc = self.v_dc if self.dc_on else 0.
+        rec.extend([v_dc, dc_p/v_dc if v_dc else 0., dc_p])
+        return rec
+
+    def waveform_points(self):
+        return ['TIME'] + ['AC_V_%s' % (i) for i in range(1, self.phases + 1)] + \
+               ['AC_I_%s' % (i) for i in range(1, self.phases + 1)]
+
+    def waveform(self, duration, sample_rate, t_start=None):
+        """
+        Synthesize voltage and current waveforms for duration secs at sample_rate from the current state. Returns a
+        Dataset of the waveform_points() columns.
+        """
+        self.advance()
+        if t_start is None:
+            t_start = self.t
+        v, f = self._grid(self.t)
+        n = self.phases
+        p = self.p/n
+        q = self.q/n
+        t = np.arange(int(duration * sample_rate)) / float(sample_rate)
+        # continue the phase of the last waveform so consecutive waveforms join without a phase step
+        phase = 0.
+        if self.wfm_phase_t is not None:
+            phase = self.wfm_phase + 2*np.pi*f*(t_start - self.wfm_phase_t)
+        self.wfm_phase = (phase + 2*np.pi*f*len(t)/float(sample_rate)) % (2*np.pi)
+        self.wfm_phase_t = t_start + len(t)/float(sample_rate)
+        angles = np.array(phase_angles[:n])[:, np.newaxis]
+        theta = phase + 2*np.pi*f*t[np.newaxis, :] + angles
+        v_rms = np.array(v)[:, np.newaxis]
+        i_rms = np.sqrt(p*p + q*q)/v_rms
+        phi = math.atan2(q, p) if p or q else 0.
+        v_wfm = math.sqrt(2)*v_rms*np.sin(theta)
+        # current lags the voltage when absorbing reactive power
+        i_wfm = math.sqrt(2)*i_rms*np.sin(theta + phi)
+        data = [t + t_start] + list(v_wfm) + list(i_wfm)
+        return dataset.Dataset(self.waveform_points(), data, start_time=t_start, sample_rate=sample_rate)
+
+
+def interp(x, xp, fp):
+    """
+    Piecewise-linear interpolation with the end values held.
+    """
+    if x <= xp[0]:
+        return float(fp[0])
+    for i in range(1, len(xp)):
+        if x <= xp[i]:
+            span = xp[i] - xp[i - 1]
+            if span <= 0:
+                return float(fp[i])
+            return fp[i - 1] + (fp[i] - fp[i - 1])*(x - xp[i - 1])/float(span)
+    return float(fp[-1])
+
+
+_model = None
+_model_ts = None
+
+
+def model_init(ts):
+    """
+    Return the EUT model of the test script run, creating it on first use. The model ratings are taken from the EUT
+    model parameters (der.eut_sim.*) when they are available.
+    """
+    global _model, _model_ts
+    if _model is None or _model_ts is not ts:
+        params = {}
+        for name in model_defaults:
+            try:
+                value = ts.param_value(MODEL_DEFAULT_ID + '.' + name)
+            except Exception:
+                value = None
+            if value is not None:
+                params[name] = value
+        _model = EUTModel(params)
+        _model_ts = ts
+    return _model
@@ -30,6 +30,13 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 Questions can be directed to support@sunspec.org
 """
 
+import dataset
+
+try:
+    import numpy as np
+except Exception, e:
+    print('Error: numpy python package not found!')  # This will appear in the SVP log file.
+
 # (time offset in seconds, % nominal voltage 1, % nominal voltage 2, % nominal voltage 3, % nominal frequency)
 vv_voltage_profile = [
     (0, 100, 100, 100, 100),
@@ -92,6 +99,200 @@ profiles = {
     'VRT Test Profile': vrt_50v_2s
 }
 
+# profile entry columns
+PROFILE_V_1 = 1
+PROFILE_V_2 = 2
+PROFILE_V_3 = 3
+PROFILE_FREQ = 4
+
+PROFILE_POINTS = ['PROFILE_V_1', 'PROFILE_V_2', 'PROFILE_V_3', 'PROFILE_FREQ']
+
+
+class GridProfileError(Exception):
+    """
+    Exception to wrap all grid profile generated exceptions.
+    """
+    pass
+
+
+class GridProfile(object):
+    """
+    Compiled grid profile for evaluating the commanded voltage and frequency at arbitrary times.
+
+    A profile is a list of (time offset, % nominal voltage 1, % nominal voltage 2, % nominal voltage 3, % nominal
+    frequency) breakpoints in time order. Values are linear between breakpoints and held before the first and after
+    the last. Consecutive breakpoints at the same time offset are a step: the value at the offset, and after it, is the
+    value of the last breakpoint at that offset.
+
+    The breakpoints are compiled into arrays once so evaluate(), voltage() and freq() are vectorized over any number of
+    time offsets.
+
+    profile - list of breakpoints, in the format of grid_profiles.
+    v_nom - nominal voltage used to scale voltage values (V). If None, values are % nominal.
+    f_nom - nominal frequency used to scale frequency values (Hz). If None, values are % nominal.
+    """
+
+    def __init__(self, profile, v_nom=None, f_nom=None):
+        if profile is None or len(profile) == 0:
+            raise GridProfileError('Empty grid profile')
+        entries = np.asarray([[float(x) for x in entry] for entry in profile], dtype=float)
+        if entries.ndim != 2 or entries.shape[1] != 5:
+            raise GridProfileError('Grid profile entries must be (t, v1, v2, v3, freq)')
+        t = entries[:, 0]
+        if np.any(np.diff(t) < 0):
+            raise GridProfileError('Grid profile time offsets must not decrease')
+        self.v_nom = v_nom
+        self.f_nom = f_nom
+        self.t = t
+        self.values = entries[:, 1:]
+        if len(t) == 1:
+            # single breakpoint, hold it
+            self.t = np.array([t[0], t[0]])
+            self.values = np.vstack((self.values, self.values))
+        # (start, end) entry index of each non-zero duration segment
+        span = np.diff(self.t)
+        self.seg_index = np.nonzero(span > 0)[0]
+        self.seg_start = self.t[self.seg_index]
+        self.seg_end = self.t[self.seg_index + 1]
+
+    @property
+    def duration(self):
+        return self.t[-1] - self.t[0]
+
+    def boundaries(self):
+        """
+        Return the time offsets of the segment boundaries, the distinct breakpoint times.
+        """
+        return np.unique(self.t)
+
+    def segments(self):
+        """
+        Return a list of (t_start, t_end, start values, end values) of the non-zero duration segments, where the values
+        are the (v1, v2, v3, freq) at the start and end of the segment in profile units.
+        """
+        segments = []
+        for i in self.seg_index:
+            segments.append((self.t[i], self.t[i + 1], tuple(self.values[i]), tuple(self.values[i + 1])))
+        return segments
+
+    def segment(self, t):
+        """
+        Return the index into segments() of the segment containing each time offset in t. Times before the profile
+        are -1 and times at or after the end are len(segments()).
+        """
+        t = np.asarray(t, dtype=float)
+        index = np.searchsorted(self.seg_start, t, side='right') - 1
+        return np.where(t >= self.t[-1], len(self.seg_start), index)
+
+    def segment_slices(self, t):
+        """
+        Return the (start, end) sample index range of each segment in segments() for the sorted sample time offsets
+        t, so t[start:end] are the samples within the segment.
+        """
+        t = np.asarray(t, dtype=float)
+        starts = np.searchsorted(t, self.seg_start, side='left')
+        ends = np.searchsorted(t, self.seg_end, side='left')
+        return zip(starts.tolist(), ends.tolist())
+
+    def evaluate(self, t):
+        """
+        Return an array of the (v1, v2, v3, freq) profile values, in profile units (% nominal), at each time offset in
+        t. The result has shape (len(t), 4), or (4,) for a scalar time.
+        """
+        x = np.asarray(t, dtype=float)
+        # last breakpoint at or before each time, the end entry of any step at that time
+        i = np.clip(np.searchsorted(self.t, x, side='right') - 1, 0, len(self.t) - 2)
+        t0 = self.t[i]
+        span = self.t[i + 1] - t0
+        safe_span = np.where(span > 0, span, 1.)
+        frac = np.clip(np.where(span > 0, (x - t0)/safe_span, 1.), 0., 1.)
+        frac = np.where(x < self.t[0], 0., frac)
+        v0 = self.values[i]
+        v1 = self.values[i + 1]
+        return v0 + (v1 - v0) * frac[..., np.newaxis]
+
+    def voltage(self, t):
+        """
+        Return an array of the commanded (v1, v2, v3) at each time offset in t, shape (len(t), 3). The voltages are in
+        volts if v_nom was supplied, otherwise % nominal.
+        """
+        v = self.evaluate(t)[..., PROFILE_V_1 - 1:PROFILE_V_3]
+        if self.v_nom is not None:
+            v = v * (float(self.v_nom)/100.)
+        return v
+
+    def freq(self, t):
+        """
+        Return an array of the commanded frequency at each time offset in t. The frequency is in Hz if f_nom was
+        supplied, otherwise % nominal.
+        """
+        f = self.evaluate(t)[..., PROFILE_FREQ - 1]
+        if self.f_nom is not None:
+            f = f * (float(self.f_nom)/100.)
+        return f
+
+    def profile_times(self, ds, t_offset=0., sample_interval=None):
+        """
+        Return the profile time of each sample of a captured dataset: the sample time (Dataset.times()) relative to the
+        first sample or, if the dataset has no sample times, the sample index times sample_interval (secs), less
+        t_offset, the time of the profile start from the first sample. With a DAS capture, t_offset is the profile
+        start time less DAS.first_sample_time, both from vclock, rather than less the time the capture was enabled,
+        which is up to a sample interval before the first sample.
+        """
+        try:
+            t = ds.times()
+        except dataset.DatasetError:
+            if sample_interval is None:
+                raise GridProfileError('No TIME point in dataset and no sample interval supplied')
+            t = np.arange(len(ds.data[0]) if ds.data else 0) * float(sample_interval)
+        if len(t) > 0:
+            t = t - t[0]
+        return t - float(t_offset)
+
+    def segment_datasets(self, ds, t_offset=0., sample_interval=None):
+        """
+        Split a captured dataset into the samples of each segment in segments(). Returns a list of datasets, the
+        columns of which are views of the captured dataset columns (see Dataset.slice_time()).
+        """
+        t = self.profile_times(ds, t_offset, sample_interval)
+        datasets = []
+        for start, end in self.segment_slices(t):
+            datasets.append(dataset.Dataset(points=list(ds.points), data=[ds.array(p)[start:end] for p in ds.points],
+                                            sample_rate=ds.sample_rate))
+        return datasets
+
+    def overlay(self, ds, t_offset=0., sample_interval=None):
+        """
+        Add the commanded profile values as the points in PROFILE_POINTS to a captured dataset, at the profile times of
+        profile_times().
+        """
+        t = self.profile_times(ds, t_offset, sample_interval)
+        v = self.voltage(t)
+        f = self.freq(t)
+        columns = [v[:, 0], v[:, 1], v[:, 2], f]
+        # the points list may be shared with the DAS, so it is replaced rather than extended
+        points = list(ds.points)
+        for name, values in zip(PROFILE_POINTS, columns):
+            if name in points:
+                ds.data[points.index(name)] = values.tolist()
+            else:
+                points.append(name)
+                ds.data.append(values.tolist())
+        ds.points = points
+        return ds
+
+
+def profile_compile(profile_name=None, profile=None, v_nom=None, f_nom=None):
+    """
+    Return a GridProfile of a named profile in profiles or of the supplied profile entries.
+    """
+    if profile is None:
+        profile = profiles.get(profile_name)
+        if profile is None:
+            raise GridProfileError('Profile Not Found: %s' % (profile_name))
+    return GridProfile(profile, v_nom=v_nom, f_nom=f_nom)
+
+
 if __name__ == "__main__":
 
     pass
@@ -35,6 +35,9 @@ import os
 import glob
 import importlib
 
+import instrument
+import timeline
+
 # Import all gridsim extensions in current directory.
 # A gridsim extension has a file name of gridsim_*.py and contains a function gridsim_params(info) that contains
 # a dict with the following entries: name, init_func.
@@ -83,7 +86,8 @@ def gridsim_init(ts, id=None, group_name=None):
         else:
             raise GridSimError('Unknown grid simulation mode: %s' % mode)
 
-    return sim
+    instrument.wrap(sim, group_name)
+    return timeline.wrap(sim, group_name)
 
 REGEN_ON = 'on'
 REGEN_OFF = 'off'
@@ -33,6 +33,8 @@ Questions can be directed to support@sunspec.org
 import os
 
 import gridsim
+import grid_profiles
+import eut_sim
 
 sim_info = {
     'name': os.path.splitext(os.path.basename(__file__))[0],
@@ -58,3 +60,37 @@ class GridSim(gridsim.GridSim):
 
     def __init__(self, ts, group_name, params=None):
         gridsim.GridSim.__init__(self, ts, group_name, params)
+        # closed-loop EUT model at the simulated grid terminals
+        self.model = eut_sim.model_init(ts)
+        self.profile = None
+
+    def voltage(self, voltage=None):
+        if voltage is not None:
+            self.model.grid_voltage(voltage)
+        else:
+            v, f = self.model.grid()
+            voltage = tuple(v + [v[-1]] * (3 - len(v)))
+        return voltage
+
+    def freq(self, freq=None):
+        if freq is not None:
+            self.model.grid_freq(freq)
+        else:
+            v, freq = self.model.grid()
+        return freq
+
+    def profile_load(self, profile_name=None, v_step=100, f_step=100, t_step=None, profile=None):
+        if profile is None:
+            if profile_name is None or profile_name == 'None':
+                return
+            profile = grid_profiles.profiles.get(profile_name)
+            if profile is None:
+                raise gridsim.GridSimError('Profile Not Found: %s' % (profile_name))
+        self.profile = profile
+
+    def profile_start(self):
+        if self.profile is not None:
+            self.model.grid_profile_run(self.profile)
+
+    def profile_stop(self):
+        self.model.grid_hold()
@@ -0,0 +1,368 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import time as _time
+import threading
+
+import dataset
+
+'''
+Latency instrumentation of the instrument drivers.
+
+When enabled, the driver created by gridsim_init(), pvsim_init(), loadsim_init(), dcsim_init(), der_init() and
+das_init() is wrapped so each call of its command methods (cmd, query, read, write and the DAS device data_read) is
+timed with the wall clock. The call count, error count and a latency histogram are kept for each device, method and
+command. The command is the header of a SCPI command string ('SOUR:VOLT 120' -> 'SOUR:VOLT') or the register
+address of a Modbus read or write, so the time spent in, for example, 'SYSTem:ERRor?' round trips or in the DER
+Modbus writes can be told apart from DAS sampling.
+
+The methods are wrapped on the driver and on its transport objects ('device', 'dev' and 'inv' attributes, and the
+'device' of those), and the transports are wrapped again after the driver open() or config() as they are often
+created there. Calls made from within an instrumented call, such as the transport write() of a driver cmd(), are not
+recorded so each command is counted once. When disabled nothing is wrapped and the drivers run unchanged.
+
+The histograms are log-linear (HDR style) with a fixed number of buckets, so the memory used does not depend on the
+number of calls and the percentiles are within about 3% of the recorded values. instrument_close() saves the summary
+of the test as instrument.csv with the result files and logs the commands taking the most time:
+
+    instrument.instrument_init(ts)
+    grid = gridsim.gridsim_init(ts)
+    ...
+    instrument.instrument_close(ts)
+'''
+
+INSTRUMENT_DEFAULT_ID = 'instrument'
+INSTRUMENT_FILE = 'instrument.csv'
+
+# driver methods that are timed
+METHODS = ['cmd', 'query', 'read', 'write', 'data_read', 'data_read_into']
+# attributes holding the transport objects of a driver
+TRANSPORT_ATTRS = ['device', 'dev', 'inv']
+# driver methods that (re)create the transport objects
+OPEN_METHODS = ['open', 'config']
+# maximum number of distinct commands per device and method, further commands are recorded as OTHER
+MAX_COMMANDS = 256
+OTHER = '(other)'
+
+summary_points = ['DEVICE', 'METHOD', 'COMMAND', 'COUNT', 'ERRORS', 'TOTAL_S', 'MEAN_MS', 'MIN_MS', 'P50_MS',
+                  'P90_MS', 'P99_MS', 'MAX_MS']
+
+
+class InstrumentError(Exception):
+    """
+    Exception to wrap all instrumentation generated exceptions.
+    """
+    pass
+
+
+class Histogram(object):
+    """
+    Log-linear latency histogram of integer microsecond values.
+
+    Values below 2**sub_bits have a bucket each. Above that, each power of two range is split into 2**(sub_bits - 1)
+    buckets, so a bucket is at most 1/2**(sub_bits - 1) of its value wide. Values above 2**max_bits are recorded in
+    the last bucket.
+    """
+
+    def __init__(self, sub_bits=6, max_bits=40):
+        self.sub_bits = sub_bits
+        self.max_bits = max_bits
+        self.sub_count = 1 << sub_bits
+        self.half_count = self.sub_count >> 1
+        self.buckets = [0] * (self.sub_count + (max_bits - sub_bits) * self.half_count)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def index(self, value):
+        if value < self.sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        idx = self.sub_count + (shift - 1) * self.half_count + ((value >> shift) - self.half_count)
+        return min(idx, len(self.buckets) - 1)
+
+    def bucket_range(self, idx):
+        """
+        Return the lowest and highest value of a bucket.
+        """
+        if idx < self.sub_count:
+            return idx, idx
+        shift = (idx - self.sub_count) // self.half_count + 1
+        sub = (idx - self.sub_count) % self.half_count + self.half_count
+        return sub << shift, ((sub + 1) << shift) - 1
+
+    def record(self, value):
+        value = max(int(value), 0)
+        self.buckets[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if len(other.buckets) != len(self.buckets):
+            raise InstrumentError('Histograms have different bucket layouts')
+        for i, n in enumerate(other.buckets):
+            if n:
+                self.buckets[i] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, pct):
+        """
+        Value at or below which pct percent of the recorded values fall. The highest value of the bucket is
+        returned, limited to the recorded range.
+        """
+        if self.count == 0:
+            return None
+        target = max(1, int(round(self.count * float(pct) / 100.)))
+        n = 0
+        for i, c in enumerate(self.buckets):
+            n += c
+            if n >= target:
+                return min(max(self.bucket_range(i)[1], self.min), self.max)
+        return self.max
+
+    def mean(self):
+        if self.count == 0:
+            return None
+        return float(self.total) / self.count
+
+
+class Entry(object):
+    def __init__(self):
+        self.hist = Histogram()
+        self.errors = 0
+
+
+def command_name(method, args):
+    """
+    Command recorded for a call: the header of a command string or the address of a register read or write.
+    """
+    if not args:
+        return ''
+    arg = args[0]
+    if isinstance(arg, basestring):
+        s = arg.strip()
+        if not s:
+            return ''
+        return s.split(None, 1)[0]
+    if isinstance(arg, (int, long)):
+        return str(arg)
+    return ''
+
+
+class Instrumentation(object):
+    """
+    Call counts and latency histograms by device, method and command.
+    """
+
+    def __init__(self, clock=None):
+        if clock is None:
+            clock = _time.time
+        self.clock = clock
+        self.entries = {}
+        self.commands = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, device, method, command, secs, error=False):
+        key = (device, method, command)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                names = self.commands.setdefault((device, method), set())
+                if command not in names and len(names) >= MAX_COMMANDS:
+                    key = (device, method, OTHER)
+                    command = OTHER
+                    entry = self.entries.get(key)
+                if entry is None:
+                    names.add(command)
+                    entry = self.entries[key] = Entry()
+            entry.hist.record(secs * 1e6)
+            if error:
+                entry.errors += 1
+
+    def timed(self, device, method, fn):
+        """
+        Return fn wrapped to record the latency of each call.
+        """
+        clock = self.clock
+        local = self._local
+        record = self.record
+
+        def call(*args, **kwargs):
+            if getattr(local, 'active', False):
+                return fn(*args, **kwargs)
+            local.active = True
+            start = clock()
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                local.active = False
+                record(device, method, command_name(method, args), clock() - start, error)
+        call.instrumented = fn
+        return call
+
+    def wrap(self, obj, device, depth=2):
+        """
+        Wrap the command methods of a driver and its transport objects.
+        """
+        if obj is None:
+            return obj
+        for method in METHODS:
+            fn = getattr(obj, method, None)
+            if fn is None or not callable(fn) or hasattr(fn, 'instrumented'):
+                continue
+            try:
+                setattr(obj, method, self.timed(device, method, fn))
+            except (AttributeError, TypeError):
+                # objects without an instance dict (sockets, extension types) are left unwrapped
+                pass
+        if depth > 0:
+            self.wrap_transports(obj, device, depth)
+            for method in OPEN_METHODS:
+                fn = getattr(obj, method, None)
+                if fn is not None and callable(fn) and not hasattr(fn, 'rewrap'):
+                    try:
+                        setattr(obj, method, self._rewrap(obj, device, depth, fn))
+                    except (AttributeError, TypeError):
+                        pass
+        return obj
+
+    def wrap_transports(self, obj, device, depth):
+        for attr in TRANSPORT_ATTRS:
+            transport = getattr(obj, attr, None)
+            if transport is not None and transport is not obj:
+                self.wrap(transport, device, depth - 1)
+
+    def _rewrap(self, obj, device, depth, fn):
+        def call(*args, **kwargs):
+            result = fn(*args, **kwargs)
+            self.wrap_transports(obj, device, depth)
+            return result
+        call.rewrap = fn
+        return call
+
+    def summary(self):
+        """
+        Return a Dataset with the statistics of each device, method and command, most total time first.
+        """
+        ds = dataset.Dataset(list(summary_points))
+        with self._lock:
+            items = sorted(self.entries.items(), key=lambda item: -item[1].hist.total)
+            for (device, method, command), entry in items:
+                h = entry.hist
+                ms = lambda v: round(v / 1000., 3)
+                ds.append([device, method, command, h.count, entry.errors, round(h.total / 1e6, 6), ms(h.mean()),
+                           ms(h.min), ms(h.percentile(50)), ms(h.percentile(90)), ms(h.percentile(99)), ms(h.max)],
+                          convert=False)
+        return ds
+
+    def log_summary(self, ts, count=10):
+        ds = self.summary()
+        if not ds.data[0]:
+            return
+        ts.log('Instrument command latency (top %s by total time):' % (min(count, len(ds.data[0]))))
+        ts.log('  %-12s %-10s %-24s %8s %10s %9s %9s %9s' %
+               ('Device', 'Method', 'Command', 'Count', 'Total (s)', 'p50 (ms)', 'p99 (ms)', 'Max (ms)'))
+        cols = [ds.points.index(p) for p in ['DEVICE', 'METHOD', 'COMMAND', 'COUNT', 'TOTAL_S', 'P50_MS',
+                                                'P99_MS', 'MAX_MS']]
+        for i in range(min(count, len(ds.data[0]))):
+            ts.log('  %-12s %-10s %-24s %8d %10.3f %9.3f %9.3f %9.3f' % tuple([ds.data[c][i] for c in cols]))
+
+
+recorder = None
+
+
+def wrap(obj, device):
+    """
+    Wrap a driver if instrumentation is enabled. Returns the driver.
+    """
+    if recorder is not None and obj is not None:
+        recorder.wrap(obj, device)
+    return obj
+
+
+def params(info, group_name=None):
+    if group_name is None:
+        group_name = INSTRUMENT_DEFAULT_ID
+    name = lambda name: group_name + '.' + name
+    info.param_group(group_name, label='Instrumentation Parameters', glob=True)
+    info.param(name('mode'), label='Command latency instrumentation', default='Disabled',
+               values=['Disabled', 'Enabled'],
+               desc='Record the count and latency of each instrument command and save a summary with the results.')
+
+
+def instrument_init(ts, group_name=None):
+    """
+    Enable instrumentation of the drivers created after this call if selected. Returns the Instrumentation or None.
+
+    Must be called before the drivers are created.
+    """
+    global recorder
+    if group_name is None:
+        group_name = INSTRUMENT_DEFAULT_ID
+    recorder = None
+    mode = ts.param_value(group_name + '.' + 'mode')
+    if mode == 'Enabled':
+        recorder = Instrumentation()
+        ts.log('Instrument command latency recording enabled')
+    return recorder
+
+
+def instrument_close(ts, filename=INSTRUMENT_FILE):
+    """
+    Save the instrumentation summary of the test with the result files and log the commands taking the most time.
+    """
+    global recorder
+    if recorder is None:
+        return None
+    rec = recorder
+    recorder = None
+    ds = rec.summary()
+    if not ds.data[0]:
+        return None
+    ds.to_csv(ts.result_file_path(filename))
+    ts.result_file(filename)
+    rec.log_summary(ts)
+    return filename
@@ -35,6 +35,9 @@ import os
 import glob
 import importlib
 
+import instrument
+import timeline
+
 loadsim_modules = {}
 
 def params(info, id=None, label='Load Simulator', group_name=None, active=None, active_value=None):
@@ -73,7 +76,8 @@ def loadsim_init(ts, id=None, group_name=None):
         else:
             raise LoadSimError('Unknown loadsim system mode: %s' % mode)
 
-    return sim
+    instrument.wrap(sim, group_name)
+    return timeline.wrap(sim, group_name)
 
 
 class LoadSimError(Exception):
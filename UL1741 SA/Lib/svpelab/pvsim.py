@@ -35,6 +35,9 @@ import os
 import glob
 import importlib
 
+import instrument
+import timeline
+
 pvsim_modules = {}
 
 def params(info, id=None, label='PV Simulator', group_name=None, active=None, active_value=None):
@@ -75,7 +78,8 @@ def pvsim_init(ts, id=None, group_name=None):
         else:
             raise PVSimError('Unknown PV simulation mode: %s' % mode)
 
-    return sim
+    instrument.wrap(sim, group_name)
+    return timeline.wrap(sim, group_name)
 
 
 class PVSimError(Exception):
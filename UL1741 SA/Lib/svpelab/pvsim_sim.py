@@ -33,6 +33,7 @@ Questions can be directed to support@sunspec.org
 import os
 
 import pvsim
+import eut_sim
 
 sim_info = {
     'name': os.path.splitext(os.path.basename(__file__))[0],
@@ -55,15 +56,20 @@ class PVSim(pvsim.PVSim):
 
     def __init__(self, ts, group_name):
         pvsim.PVSim.__init__(self, ts, group_name)
+        # closed-loop EUT model DC input
+        self.model = eut_sim.model_init(ts)
 
     def irradiance_set(self, irradiance=1000):
         self.ts.log('Setting PV irradiance to %0.1f W/m^2.' % irradiance)
+        self.model.pv_power(self.model.p_rated * irradiance/1000.)
 
     def power_set(self, power):
         self.ts.log('Setting PV power to %0.1f W.' % power)
+        self.model.pv_power(power)
 
     def power_on(self):
         self.ts.log('Powering on PV simulator to give EUT DC power.')
+        self.model.pv_on()
 
     def profile_start(self):
         self.ts.log('Starting PV simulator profile.')
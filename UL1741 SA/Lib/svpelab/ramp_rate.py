@@ -0,0 +1,291 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import math
+import collections
+
+import vclock
+
+'''
+Streaming ramp rate estimation for the SA11 normal ramp and soft-start ramp tests.
+
+A RampRateEstimator is fed (time, value) samples of the ramped quantity as they are captured. The value is normalized
+to percent of rated and the estimator tracks the ramp through three states:
+
+    RAMP_WAIT - waiting for the value to leave the starting level by more than the band.
+    RAMP_ACTIVE - ramping. The ramp rate is fitted by least squares over all ramp samples and, for the live rate, over
+                  a rolling window. Both fits are updated in constant time per sample from running sums.
+    RAMP_COMPLETE - the value reached the target level (within the band) and stayed there for the plateau time.
+
+A ramp is non-compliant when the fitted ramp rate differs from the programmed rate by more than the ramp rate accuracy,
+when the live rate exceeds the upper limit, or when the ramp has not completed by the time a ramp at the lower limit
+would have. Non-compliance is flagged as soon as it is detected.
+
+wait_ramp() drives an estimator from the active data capture of a DAS and returns once the ramp and plateau are
+complete, a non-compliant ramp has been detected (optional) or the maximum time has elapsed.
+
+    estimator = ramp_rate.estimator_init(daq, 'AC_P', p_rated, rr, rr_msa, t_plateau=t_dwell)
+    ramp_rate.wait_ramp(ts, daq, estimator, t_max=sample_duration)
+'''
+
+RAMP_WAIT = 'WAIT'
+RAMP_ACTIVE = 'ACTIVE'
+RAMP_COMPLETE = 'COMPLETE'
+
+
+class RampRateError(Exception):
+    """
+    Exception to wrap all ramp rate generated exceptions.
+    """
+    pass
+
+
+class LinearFit(object):
+    """
+    Least-squares line fit with constant time sample add and remove. Abscissas are taken relative to the first
+    sample added to keep the sums well conditioned.
+    """
+
+    def __init__(self):
+        self.t0 = None
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.st = self.sy = self.stt = self.sty = 0.
+
+    def add(self, t, y):
+        if self.t0 is None:
+            self.t0 = t
+        t -= self.t0
+        self.n += 1
+        self.st += t
+        self.sy += y
+        self.stt += t*t
+        self.sty += t*y
+
+    def remove(self, t, y):
+        t -= self.t0
+        self.n -= 1
+        self.st -= t
+        self.sy -= y
+        self.stt -= t*t
+        self.sty -= t*y
+
+    def slope(self):
+        if self.n < 2:
+            return None
+        d = self.n*self.stt - self.st*self.st
+        if d <= 0:
+            return None
+        return (self.n*self.sty - self.st*self.sy)/d
+
+
+class RampRateEstimator(object):
+    """
+    Incremental ramp rate estimator.
+
+    rated - rated value of the ramped quantity, ramp rates are in percent of rated per second.
+    rr - programmed ramp rate (%/sec).
+    rr_msa - ramp rate accuracy (%/sec).
+    target - ramp end level (% of rated).
+    band - level band (% of rated) used to detect the ramp start, ramp end and plateau.
+    t_plateau - time (secs) the value must remain at the target level for the ramp to be complete.
+    t_window - rolling window (secs) for the live ramp rate.
+    """
+
+    def __init__(self, rated, rr, rr_msa, target=100., band=5., t_plateau=5., t_window=1.):
+        if not rated:
+            raise RampRateError('Rated value must be non-zero')
+        self.rated = float(rated)
+        self.rr = float(rr)
+        self.rr_msa = float(rr_msa)
+        self.target = float(target)
+        self.band = float(band)
+        self.t_plateau = float(t_plateau)
+        self.t_window = float(t_window)
+        self.reset()
+
+    def reset(self):
+        self.state = RAMP_WAIT
+        self.level = None
+        self.t_start = None
+        self.t_end = None
+        self.t_last = None
+        self.rate = None
+        self.rate_live = None
+        self.rate_live_max = None
+        self.faults = []
+        self._fit = LinearFit()
+        self._live = LinearFit()
+        self._window = collections.deque()
+
+    @property
+    def compliant(self):
+        return len(self.faults) == 0
+
+    def fault(self, reason):
+        if reason not in self.faults:
+            self.faults.append(reason)
+
+    def update(self, t, value):
+        """
+        Add a sample. Returns the estimator state.
+        """
+        try:
+            y = float(value)/self.rated*100
+        except (ValueError, TypeError):
+            return self.state
+        if math.isnan(y):
+            return self.state
+        t = float(t)
+        self.t_last = t
+
+        if self.state == RAMP_WAIT:
+            if self.level is None:
+                self.level = y
+            elif abs(y - self.level) > self.band:
+                self.state = RAMP_ACTIVE
+                self.t_start = t
+            else:
+                return self.state
+
+        if self.state == RAMP_ACTIVE:
+            if self.t_end is None:
+                self._fit.add(t, y)
+                self.rate = self._fit.slope()
+                self._window.append((t, y))
+                self._live.add(t, y)
+                while self._window and self._window[0][0] < t - self.t_window:
+                    self._live.remove(*self._window.popleft())
+                self.rate_live = self._live.slope()
+                if self.rate_live is not None and self._window[-1][0] - self._window[0][0] >= self.t_window/2:
+                    if self.rate_live_max is None or self.rate_live > self.rate_live_max:
+                        self.rate_live_max = self.rate_live
+                    if self.rate_live > self.rr + self.rr_msa:
+                        self.fault('ramp rate above limit %0.2f %%/sec' % (self.rr + self.rr_msa))
+                if y >= self.target - self.band:
+                    self.t_end = t
+                    if self.rate is not None and abs(self.rate - self.rr) > self.rr_msa:
+                        self.fault('ramp rate %0.2f %%/sec outside %0.2f +/- %0.2f %%/sec' %
+                                   (self.rate, self.rr, self.rr_msa))
+                else:
+                    rr_low = self.rr - self.rr_msa
+                    t_ramp_max = (self.target - self.level)/rr_low if rr_low > 0 else None
+                    if t_ramp_max is not None and t - self.t_start > t_ramp_max:
+                        self.fault('ramp not complete within %0.2f secs' % (t_ramp_max))
+            elif abs(y - self.target) > self.band:
+                # left the plateau, restart the plateau time
+                self.t_end = None if y < self.target - self.band else t
+            if self.t_end is not None and t - self.t_end >= self.t_plateau:
+                self.state = RAMP_COMPLETE
+
+        return self.state
+
+    def ramp_time(self):
+        if self.t_start is None:
+            return None
+        if self.t_end is None:
+            return self.t_last - self.t_start
+        return self.t_end - self.t_start
+
+
+def estimator_init(daq, point, rated, rr, rr_msa, target=100., band=5., t_plateau=5., t_window=None):
+    """
+    Create an estimator for a DAS data point. A point name also matches the phase points of the name ('AC_P' matches
+    'AC_P_1', 'AC_P_2', etc.) when the name itself is not a dataset point, the phase values are summed. The live rate
+    window defaults to ten DAS sample intervals.
+    """
+    if t_window is None:
+        t_window = max(float(daq.sample_interval)/1000 * 10, 1.)
+    estimator = RampRateEstimator(rated, rr, rr_msa, target=target, band=band, t_plateau=t_plateau,
+                                  t_window=t_window)
+    estimator.point = point
+    return estimator
+
+
+def point_indexes(ds_points, point):
+    if point in ds_points:
+        matches = [point]
+    else:
+        matches = [p for p in ds_points if p.startswith(point + '_')]
+    if len(matches) == 0:
+        raise RampRateError('Ramp rate point not in dataset: %s' % (point))
+    return [ds_points.index(p) for p in matches]
+
+
+def wait_ramp(ts, daq, estimator, t_max, stop_on_fault=False, interval=None):
+    """
+    Feed the samples of the active DAS data capture recorded after the call to the estimator until the ramp is
+    complete, for at most t_max seconds. If stop_on_fault is True, also return as soon as the ramp is non-compliant.
+    Returns the estimator state.
+
+    The sample time is the 'TIME' point if present, otherwise the sample index times the DAS sample interval.
+    """
+    ds = daq.data_capture_dataset()
+    if ds is None:
+        raise RampRateError('No active data capture')
+    indexes = point_indexes(ds.points, estimator.point)
+    time_index = None
+    if 'TIME' in ds.points:
+        time_index = ds.points.index('TIME')
+    sample_period = float(daq.sample_interval)/1000
+    if interval is None:
+        interval = sample_period
+        if interval <= 0:
+            interval = .1
+    start = vclock.time()
+    # the last column is the last one appended for each sample
+    start_index = index = len(ds.data[-1])
+    while True:
+        if daq.sample_interval <= 0:
+            daq.data_sample()
+        count = len(ds.data[-1])
+        while index < count:
+            if time_index is not None:
+                t = ds.data[time_index][index]
+            elif sample_period > 0:
+                t = (index - start_index) * sample_period
+            else:
+                t = vclock.time() - start
+            try:
+                value = sum([ds.data[i][index] for i in indexes])
+            except TypeError:
+                value = None
+            estimator.update(t, value)
+            index += 1
+        if estimator.state == RAMP_COMPLETE or (stop_on_fault and not estimator.compliant):
+            return estimator.state
+        elapsed = vclock.time() - start
+        if elapsed >= t_max:
+            return estimator.state
+        ts.sleep(min(interval, max(t_max - elapsed, 0)))
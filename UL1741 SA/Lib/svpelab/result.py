@@ -88,10 +88,7 @@ class Result(object):
             raise ResultError('No xml document element')
         if element.tag != RESULT_TAG:
             raise ResultError('Unexpected result root element: %s' % (element.tag))
-        self.name = element.attrib.get(RESULT_ATTR_NAME)
-        self.type = element.attrib.get(RESULT_ATTR_TYPE)
-        self.status = element.attrib.get(RESULT_ATTR_STATUS)
-        self.filename = element.attrib.get(RESULT_ATTR_FILENAME)
+        self.attr_from_xml(element)
         self.params = {}
         self.results = []
         if self.name is None:
@@ -99,13 +96,7 @@ class Result(object):
 
         for e in element.findall('*'):
             if e.tag == RESULT_PARAMS:
-                for e_param in e.findall('*'):
-                    if e_param.tag == RESULT_PARAM:
-                        name = e_param.attrib.get(RESULT_PARAM_ATTR_NAME)
-                        param_type = e_param.attrib.get(RESULT_PARAM_ATTR_TYPE)
-                        if name:
-                            vtype = param_types.get(param_type, str)
-                            self.params[name] = vtype(e_param.text)
+                self.params_from_xml(e)
             elif e.tag == RESULT_RESULTS:
                 for e_param in e.findall('*'):
                     if e_param.tag == RESULT_TAG:
@@ -113,6 +104,21 @@ class Result(object):
                         self.results.append(result)
                         result.from_xml(e_param)
 
+    def attr_from_xml(self, element):
+        self.name = element.attrib.get(RESULT_ATTR_NAME)
+        self.type = element.attrib.get(RESULT_ATTR_TYPE)
+        self.status = element.attrib.get(RESULT_ATTR_STATUS)
+        self.filename = element.attrib.get(RESULT_ATTR_FILENAME)
+
+    def params_from_xml(self, element):
+        for e_param in element.findall('*'):
+            if e_param.tag == RESULT_PARAM:
+                name = e_param.attrib.get(RESULT_PARAM_ATTR_NAME)
+                param_type = e_param.attrib.get(RESULT_PARAM_ATTR_TYPE)
+                if name:
+                    vtype = param_types.get(param_type, str)
+                    self.params[name] = vtype(e_param.text)
+
     def to_xml(self, parent=None, filename=None):
         attr = {}
         if self.name:
@@ -130,7 +136,7 @@ class Result(object):
 
         e_params = ET.SubElement(e, RESULT_PARAMS)
 
-        params = sorted(self.params, key=self.params.get)
+        params = sorted(self.params)
         for p in params:
             value_type = None
             value_str = None
@@ -193,6 +199,156 @@ def xml_indent(elem, level=0):
         if level and (not elem.tail or not elem.tail.strip()):
             elem.tail = i
 
+
+class ResultWriter(object):
+    """
+    Append-oriented writer of a result file.
+
+    The document is written once, with the attributes and params of result and an empty results element, and each
+    child result is then appended with add() as it completes. The closing tags are rewritten after the new child and
+    the file is synced, so after each add() the file is a complete, valid document of the results added so far and the
+    cost of an add() does not grow with the size of the file. If a run is interrupted during an add(), iter_results()
+    and read_result() with recover=True return the results completed before it.
+
+    close() rewrites the root element start, once, if the root attributes or params have changed (e.g. the final
+    status), by writing a new file and renaming it over the old one.
+
+    filename - result file.
+    result - root result. Its child results are not written or kept, the children are passed to add().
+    pretty_print - indent the document as to_xml_file() does.
+    """
+
+    def __init__(self, filename, result, pretty_print=True):
+        self.filename = filename
+        self.result = result
+        self.pretty_print = pretty_print
+        self.count = 0
+        self.f = open(filename, 'w+b')
+        self.head = self._head()
+        self.f.write(self.head)
+        self.body_pos = self.tail_pos = self.f.tell()
+        self._write_tail()
+
+    def _head(self):
+        # the root element with its params, split at the empty results element
+        e = Result(name=self.result.name, type=self.result.type, status=self.result.status,
+                   filename=self.result.filename, params=dict(self.result.params)).to_xml()
+        if self.pretty_print:
+            xml_indent(e)
+        xml = ET.tostring(e)
+        index = xml.find('<%s />' % (RESULT_RESULTS))
+        if index < 0:
+            raise ResultError('Unable to create result document')
+        if self.pretty_print:
+            self.tail = '  </%s>\n</%s>\n' % (RESULT_RESULTS, RESULT_TAG)
+            return xml[:index] + '<%s>\n' % (RESULT_RESULTS)
+        self.tail = '</%s></%s>' % (RESULT_RESULTS, RESULT_TAG)
+        return xml[:index] + '<%s>' % (RESULT_RESULTS)
+
+    def _write_tail(self):
+        self.f.seek(self.tail_pos)
+        self.f.write(self.tail)
+        self.f.truncate()
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def add(self, result):
+        """
+        Append a child result to the document.
+        """
+        if self.f is None:
+            raise ResultError('Result writer closed')
+        e = result.to_xml()
+        if self.pretty_print:
+            xml_indent(e, level=2)
+            xml = '    %s\n' % (ET.tostring(e).rstrip())
+        else:
+            xml = ET.tostring(e)
+        self.f.seek(self.tail_pos)
+        self.f.write(xml)
+        self.tail_pos = self.f.tell()
+        self._write_tail()
+        self.count += 1
+
+    def close(self):
+        """
+        Close the writer, updating the root element start if the root attributes or params have changed.
+        """
+        if self.f is None:
+            return
+        head = self._head()
+        if head == self.head:
+            self.f.close()
+            self.f = None
+            return
+        tmp_filename = self.filename + '.tmp'
+        tmp = open(tmp_filename, 'wb')
+        tmp.write(head)
+        self.f.seek(self.body_pos)
+        remaining = self.tail_pos - self.body_pos
+        while remaining > 0:
+            data = self.f.read(min(remaining, 1 << 20))
+            tmp.write(data)
+            remaining -= len(data)
+        tmp.write(self.tail)
+        tmp.flush()
+        os.fsync(tmp.fileno())
+        tmp.close()
+        self.f.close()
+        self.f = None
+        try:
+            os.rename(tmp_filename, self.filename)
+        except OSError:
+            # rename does not replace an existing file on Windows
+            os.remove(self.filename)
+            os.rename(tmp_filename, self.filename)
+
+
+def iter_results(filename, root=None, recover=True):
+    """
+    Iterate over the child results of the root result of a result file, parsing the file incrementally so only one
+    child result tree is held in memory at a time. If root (Result) is supplied, its attributes and params are set from
+    the root element as they are read. If recover is True, a document truncated by an interrupted run ends the
+    iteration after the last complete child instead of raising ResultError.
+    """
+    depth = 0
+    try:
+        for event, e in ET.iterparse(filename, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    if e.tag != RESULT_TAG:
+                        raise ResultError('Unexpected result root element: %s' % (e.tag))
+                    if root is not None:
+                        root.attr_from_xml(e)
+                        root.params = {}
+                        root.results = []
+                continue
+            depth -= 1
+            if depth == 1:
+                if e.tag == RESULT_PARAMS and root is not None:
+                    root.params_from_xml(e)
+            elif depth == 2 and e.tag == RESULT_TAG:
+                result = Result()
+                result.from_xml(e)
+                yield result
+                e.clear()
+    except ET.ParseError, e:
+        if not recover:
+            raise ResultError('Result file %s: %s' % (filename, str(e)))
+
+
+def read_result(filename, recover=True):
+    """
+    Return the result tree (Result) of a result file, read with iter_results().
+    """
+    root = Result()
+    results = list(iter_results(filename, root=root, recover=recover))
+    if root.name is None:
+        raise ResultError('Result name missing')
+    root.results = results
+    return root
+
 if __name__ == "__main__":
 
     result = Result(name='Result', type='suite')
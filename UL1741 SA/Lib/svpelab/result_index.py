@@ -0,0 +1,373 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import os
+import sys
+import sqlite3
+
+import result as rslt
+import dataset
+
+try:
+    import numpy as np
+except Exception, e:
+    print('Error: numpy python package not found!')  # This will appear in the SVP log file.
+
+'''
+Queryable index of test results across runs.
+
+Each run result XML (result.Result tree) is ingested into a SQLite database with a row for every result of the tree.
+For every file result, the parameters of the tests and suites above it (nearest first) are stored with the file, and
+CSV data files are summarized when they are indexed: sample count, start and end time, duration and the minimum,
+maximum and mean of each point. Queries then return file paths and summary values without opening the captures.
+
+Indexing is incremental. A run is re-ingested only when its result file modification time has changed, so update()
+can be called on a results directory as new runs complete:
+
+    index = ResultIndex('results.db')
+    index.update(results_dir)
+    files = index.find(name='LVRT_LV2%', params={'vrt.p_20': 'Enabled'},
+                       stats=[('AC_IRMS_1', 'max', '>', 10.)])
+
+A file result's data is looked for in the result file directory, below the directories named by the results above it.
+'''
+
+RESULT_EXTS = ('.rlt', '.xml')
+
+STAT_MIN = 'min'
+STAT_MAX = 'max'
+STAT_MEAN = 'mean'
+stats_names = [STAT_MIN, STAT_MAX, STAT_MEAN]
+
+operators = ['=', '!=', '<', '<=', '>', '>=']
+
+schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    mtime REAL,
+    name TEXT,
+    type TEXT,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER,
+    parent_id INTEGER,
+    name TEXT,
+    type TEXT,
+    status TEXT,
+    filename TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    result_id INTEGER PRIMARY KEY,
+    run_id INTEGER,
+    name TEXT,
+    test TEXT,
+    path TEXT,
+    size INTEGER,
+    samples INTEGER,
+    t_start REAL,
+    t_end REAL,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS params (
+    result_id INTEGER,
+    name TEXT,
+    value TEXT,
+    num REAL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    result_id INTEGER,
+    point TEXT,
+    min REAL,
+    max REAL,
+    mean REAL
+);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+CREATE INDEX IF NOT EXISTS files_run ON files (run_id);
+CREATE INDEX IF NOT EXISTS params_name ON params (name, value);
+CREATE INDEX IF NOT EXISTS params_result ON params (result_id);
+CREATE INDEX IF NOT EXISTS stats_point ON stats (point);
+CREATE INDEX IF NOT EXISTS stats_result ON stats (result_id);
+'''
+
+
+class ResultIndexError(Exception):
+    """
+    Exception to wrap all result index generated exceptions.
+    """
+    pass
+
+
+def number(value):
+    """
+    Return value as a float, or None if it is not a number.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def csv_summary(filename):
+    """
+    Return (samples, t_start, t_end, {point: (min, max, mean)}) of a CSV data file. The times are from the 'TIME' point,
+    None if there is no 'TIME' point.
+    """
+    ds = dataset.Dataset()
+    ds.from_csv(filename)
+    samples = len(ds.data[0]) if ds.data else 0
+    t_start = t_end = None
+    stats = {}
+    for point, values in zip(ds.points, ds.data):
+        values = np.asarray(values, dtype=float)
+        if point == 'TIME':
+            if samples > 0:
+                t_start = float(values[0])
+                t_end = float(values[-1])
+            continue
+        values = values[~np.isnan(values)]
+        if len(values) > 0:
+            stats[point] = (float(values.min()), float(values.max()), float(values.mean()))
+    return samples, t_start, t_end, stats
+
+
+class ResultIndex(object):
+    """
+    filename - SQLite database file, created if it does not exist.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        self.db.executescript(schema)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def _remove_run(self, run_id):
+        c = self.db.cursor()
+        c.execute('DELETE FROM params WHERE result_id IN (SELECT id FROM results WHERE run_id = ?)', (run_id,))
+        c.execute('DELETE FROM stats WHERE result_id IN (SELECT id FROM results WHERE run_id = ?)', (run_id,))
+        c.execute('DELETE FROM files WHERE run_id = ?', (run_id,))
+        c.execute('DELETE FROM results WHERE run_id = ?', (run_id,))
+        c.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+
+    def _data_path(self, base_dir, dirs, filename):
+        # the result file directory, below the directories of the results above the file, nearest first
+        for i in range(len(dirs), -1, -1):
+            path = os.path.join(base_dir, *(dirs[:i] + [filename]))
+            if os.path.exists(path):
+                return path
+        return os.path.join(base_dir, *(dirs + [filename]))
+
+    def _add_result(self, c, run_id, parent_id, result, base_dir, dirs, params, test):
+        c.execute('INSERT INTO results (run_id, parent_id, name, type, status, filename) VALUES (?, ?, ?, ?, ?, ?)',
+                  (run_id, parent_id, result.name, result.type, result.status, result.filename))
+        result_id = c.lastrowid
+        if result.params:
+            # nearer results override the parameters of the results above them
+            params = dict(params)
+            params.update(result.params)
+        if result.type == rslt.RESULT_TYPE_TEST:
+            test = result.name
+
+        if result.type == rslt.RESULT_TYPE_FILE or (result.filename and not result.results and
+                                                   result.type not in rslt.type_ext):
+            self._add_file(c, run_id, result_id, result, base_dir, dirs, params, test)
+
+        if parent_id is not None and result.type in rslt.type_ext:
+            dirs = dirs + [result.name]
+        for r in result.results:
+            self._add_result(c, run_id, result_id, r, base_dir, dirs, params, test)
+        return result_id
+
+    def _add_file(self, c, run_id, result_id, result, base_dir, dirs, params, test):
+        filename = result.filename or result.name
+        path = self._data_path(base_dir, dirs, filename)
+        size = samples = t_start = t_end = duration = None
+        stats = {}
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            if os.path.splitext(path)[1].lower() == '.csv':
+                try:
+                    samples, t_start, t_end, stats = csv_summary(path)
+                except Exception, e:
+                    # index the file without a summary if it is not a numeric data file
+                    pass
+        if t_start is not None and t_end is not None:
+            duration = t_end - t_start
+        c.execute('INSERT INTO files (result_id, run_id, name, test, path, size, samples, t_start, t_end, duration) '
+                  'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                  (result_id, run_id, result.name, test, path, size, samples, t_start, t_end, duration))
+        c.executemany('INSERT INTO params (result_id, name, value, num) VALUES (?, ?, ?, ?)',
+                      [(result_id, name, str(value), number(value)) for name, value in params.iteritems()])
+        c.executemany('INSERT INTO stats (result_id, point, min, max, mean) VALUES (?, ?, ?, ?, ?)',
+                      [(result_id, point, s[0], s[1], s[2]) for point, s in stats.iteritems()])
+
+    def add_run(self, filename, force=False):
+        """
+        Ingest a run result file. The run is skipped if it was indexed with the same modification time, unless force
+        is True. Returns True if the run was ingested.
+        """
+        path = os.path.abspath(filename)
+        mtime = os.path.getmtime(path)
+        c = self.db.cursor()
+        row = c.execute('SELECT id, mtime FROM runs WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[1] == mtime and not force:
+            return False
+        try:
+            # runs still being written are indexed up to their last completed result
+            result = rslt.read_result(path, recover=True)
+        except Exception, e:
+            raise ResultIndexError('Unable to read result file %s: %s' % (path, str(e)))
+        try:
+            if row is not None:
+                self._remove_run(row[0])
+            c.execute('INSERT INTO runs (path, mtime, name, type, status) VALUES (?, ?, ?, ?, ?)',
+                      (path, mtime, result.name, result.type, result.status))
+            self._add_result(c, c.lastrowid, None, result, os.path.dirname(path), [], {}, None)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return True
+
+    def update(self, results_dir, exts=RESULT_EXTS):
+        """
+        Ingest new and changed run result files below results_dir and remove the runs of deleted result files.
+        Returns (ingested, removed) run counts.
+        """
+        ingested = 0
+        found = set()
+        for dirpath, dirnames, filenames in os.walk(results_dir):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if os.path.splitext(name)[1].lower() not in exts:
+                    continue
+                path = os.path.abspath(os.path.join(dirpath, name))
+                try:
+                    if self.add_run(path):
+                        ingested += 1
+                    found.add(path)
+                except ResultIndexError:
+                    # not a result file
+                    pass
+        removed = 0
+        root = os.path.join(os.path.abspath(results_dir), '')
+        for run_id, path in self.db.execute('SELECT id, path FROM runs').fetchall():
+            if path.startswith(root) and path not in found:
+                self._remove_run(run_id)
+                removed += 1
+        self.db.commit()
+        return ingested, removed
+
+    def find(self, name=None, test=None, params=None, stats=None, points=None):
+        """
+        Return the indexed files matching all of the conditions as a list of dicts with the file 'name', 'test',
+        'path', 'run' (run result file), 'samples', 't_start', 't_end' and 'duration' and, for each point in points
+        and in the stats conditions, '<point>.min', '<point>.max' and '<point>.mean'.
+
+        name - file name pattern (SQL LIKE, e.g. 'LVRT_LV2%').
+        test - test name pattern (SQL LIKE).
+        params - dict of parameter name: value, or (operator, value), of the tests and suites above the file.
+        stats - list of (point, 'min'|'max'|'mean', operator, value) conditions on the file summary.
+        """
+        sql = 'SELECT f.result_id, f.name, f.test, f.path, r.path, f.samples, f.t_start, f.t_end, f.duration ' \
+              'FROM files f JOIN runs r ON f.run_id = r.id'
+        where = []
+        args = []
+        if name is not None:
+            where.append('f.name LIKE ?')
+            args.append(name)
+        if test is not None:
+            where.append('f.test LIKE ?')
+            args.append(test)
+        if params:
+            for pname, cond in params.iteritems():
+                op, value = cond if isinstance(cond, tuple) else ('=', cond)
+                if op not in operators:
+                    raise ResultIndexError('Unknown operator: %s' % (op))
+                column = 'num' if number(value) is not None and not isinstance(value, basestring) else 'value'
+                if column == 'value':
+                    value = str(value)
+                where.append('f.result_id IN (SELECT result_id FROM params WHERE name = ? AND %s %s ?)' % (column, op))
+                args.extend([pname, value])
+        stat_points = list(points or [])
+        if stats:
+            for point, stat, op, value in stats:
+                if stat not in stats_names:
+                    raise ResultIndexError('Unknown statistic: %s' % (stat))
+                if op not in operators:
+                    raise ResultIndexError('Unknown operator: %s' % (op))
+                where.append('f.result_id IN (SELECT result_id FROM stats WHERE point = ? AND %s %s ?)' % (stat, op))
+                args.extend([point, value])
+                if point not in stat_points:
+                    stat_points.append(point)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY r.path, f.result_id'
+
+        files = []
+        for row in self.db.execute(sql, args):
+            files.append({'id': row[0], 'name': row[1], 'test': row[2], 'path': row[3], 'run': row[4],
+                          'samples': row[5], 't_start': row[6], 't_end': row[7], 'duration': row[8]})
+        for point in stat_points:
+            for f in files:
+                row = self.db.execute('SELECT min, max, mean FROM stats WHERE result_id = ? AND point = ?',
+                                      (f['id'], point)).fetchone()
+                for stat, value in zip(stats_names, row or (None, None, None)):
+                    f['%s.%s' % (point, stat)] = value
+        return files
+
+    def file_params(self, f):
+        """
+        Return the dict of parameters, as strings, of an indexed file from find().
+        """
+        return dict(self.db.execute('SELECT name, value FROM params WHERE result_id = ?', (f['id'],)).fetchall())
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) < 3:
+        print('usage: result_index.py <index.db> <results dir> ...')
+        sys.exit(1)
+    index = ResultIndex(sys.argv[1])
+    for d in sys.argv[2:]:
+        ingested, removed = index.update(d)
+        print('%s: %s runs indexed, %s runs removed' % (d, ingested, removed))
+    count = index.db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+    print('%s files in index' % (count))
+    index.close()
@@ -0,0 +1,187 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import math
+import collections
+
+import vclock
+
+'''
+Steady-state detection for test steps with a fixed maximum dwell.
+
+A SteadyStateDetector is fed the samples of a set of data points and reports when every point has been in steady state
+over the last window of samples. A point is in steady state when both its spread (two standard deviations) and its
+drift (least-squares slope times the window length) over the window are within the point tolerance.
+
+wait_steady_state() drives a detector from the active data capture of a DAS. It returns as soon as the response has
+settled, or when the maximum dwell time has elapsed, with the measured settling time.
+
+    detector = steady_state.detector_init(daq, ['AC_Q'], [var_msa], t_window=2.)
+    t_settle = steady_state.wait_steady_state(ts, daq, detector, t_max=t_settling)
+'''
+
+
+class SteadyStateError(Exception):
+    """
+    Exception to wrap all steady state generated exceptions.
+    """
+    pass
+
+
+class SteadyStateDetector(object):
+    """
+    Rolling steady-state detector.
+
+    points - data point names. A name also matches the phase points of the name ('AC_Q' matches 'AC_Q_1', 'AC_Q_2',
+             etc.) when the name itself is not a dataset point.
+    tolerances - tolerance band for each point name.
+    window - number of samples in the rolling window.
+    """
+
+    def __init__(self, points, tolerances, window=5):
+        if len(points) != len(tolerances):
+            raise SteadyStateError('Point/tolerance mismatch: %s %s' % (points, tolerances))
+        self.points = list(points)
+        self.tolerances = [float(tol) for tol in tolerances]
+        self.window = max(int(window), 2)
+        self.indexes = None
+        self.point_tolerances = None
+        self.count = 0
+        self._values = None
+
+    def bind(self, ds_points):
+        """
+        Resolve the detector points to dataset point indexes.
+        """
+        self.indexes = []
+        self.point_tolerances = []
+        for point, tol in zip(self.points, self.tolerances):
+            if point in ds_points:
+                matches = [point]
+            else:
+                matches = [p for p in ds_points if p.startswith(point + '_')]
+            if len(matches) == 0:
+                raise SteadyStateError('Steady state point not in dataset: %s' % (point))
+            for p in matches:
+                self.indexes.append(ds_points.index(p))
+                self.point_tolerances.append(tol)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._values = [collections.deque(maxlen=self.window) for i in range(len(self.point_tolerances))]
+
+    def update(self, values):
+        """
+        Add a sample of the bound point values, in the order of the resolved dataset indexes. Returns True if all
+        points are in steady state over the window.
+        """
+        self.count += 1
+        for window_values, v in zip(self._values, values):
+            window_values.append(v)
+        if self.count < self.window:
+            return False
+        return self.steady()
+
+    def steady(self):
+        n = self.window
+        # sample index is the abscissa, centered on the window so the slope is sum(x*y)/sum(x*x)
+        x = [i - (n - 1)/2. for i in range(n)]
+        sxx = sum([v*v for v in x])
+        for values, tol in zip(self._values, self.point_tolerances):
+            try:
+                y = [float(v) for v in values]
+            except (ValueError, TypeError):
+                return False
+            mean = sum(y)/n
+            var = sum([(v - mean)*(v - mean) for v in y])/(n - 1)
+            slope = sum([a*b for a, b in zip(x, y)])/sxx
+            if math.isnan(var) or 2*math.sqrt(var) > tol or abs(slope)*(n - 1) > tol:
+                return False
+        return True
+
+
+def detector_init(daq, points, tolerances, t_window):
+    """
+    Create a detector with a window of t_window seconds of samples at the DAS sample interval.
+    """
+    window = 2
+    if daq.sample_interval > 0:
+        window = int(math.ceil(t_window * 1000. / daq.sample_interval))
+    return SteadyStateDetector(points, tolerances, window=window)
+
+
+def wait_steady_state(ts, daq, detector, t_max, t_min=0, t_response=0, interval=None):
+    """
+    Wait for the points of the detector to settle in the active DAS data capture, for at most t_max seconds.
+
+    Only samples recorded at least t_response seconds after the call are evaluated, so a window still at the values
+    from before a step is not taken as the settled response. t_response should be at least the EUT response time.
+    Returns the settling time in seconds, measured from the call to the first sample of the first steady-state window,
+    or None if the response did not settle within t_max. The wait is never shorter than t_min.
+    """
+    ds = daq.data_capture_dataset()
+    if ds is None:
+        raise SteadyStateError('No active data capture')
+    detector.bind(ds.points)
+    sample_period = float(daq.sample_interval)/1000
+    if interval is None:
+        interval = sample_period
+        if interval <= 0:
+            interval = .1
+    start = vclock.time()
+    # the last column is the last one appended for each sample
+    start_index = index = len(ds.data[-1])
+    settle_time = None
+    while True:
+        if daq.sample_interval <= 0:
+            daq.data_sample()
+        count = len(ds.data[-1])
+        # skip the samples recorded within the response time
+        if sample_period > 0:
+            index = max(index, start_index + int(math.ceil(t_response/sample_period)))
+        elif vclock.time() - start < t_response:
+            index = count
+        while index < count and settle_time is None:
+            if detector.update([ds.data[i][index] for i in detector.indexes]):
+                if sample_period > 0:
+                    settle_time = (index - start_index - (detector.window - 1)) * sample_period
+                else:
+                    settle_time = vclock.time() - start
+                settle_time = max(settle_time, 0.)
+            index += 1
+        elapsed = vclock.time() - start
+        if settle_time is not None and elapsed >= t_min:
+            return settle_time
+        if elapsed >= t_max:
+            return None
+        ts.sleep(min(interval, max(t_max - elapsed, 0)))
@@ -0,0 +1,142 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import vclock
+
+'''
+Absolute deadline scheduling of test steps.
+
+Test sequences that set a value and then sleep for the step duration drift long, as the time taken by each instrument
+command and log message is added to every step. A StepScheduler runs each step action at an absolute deadline,
+measured from the start of the sequence, so command and logging time is taken from the following wait instead of
+accumulating. The actual start time and lateness (actual start - deadline) of each step are recorded.
+
+If a DAS is supplied and its soft channels include the step points, the index and actual start time of the current
+step are written to the 'SC_STEP' and 'SC_STEP_TIME' soft channels so data captures can be aligned with the steps:
+
+    daq = das.das_init(ts, sc_points=list(das.sc_points_default) + step_scheduler.sc_points)
+    scheduler = step_scheduler.StepScheduler(ts, daq=daq)
+    scheduler.add(0, grid.voltage, v_nom)
+    scheduler.add(t_dwell, grid.voltage, v_test)
+    scheduler.add(t_dwell + t_hold, grid.voltage, v_nom)
+    scheduler.run(end=2*t_dwell + t_hold)
+
+The time is taken from vclock so the scheduler also runs in virtual time.
+'''
+
+SC_STEP = 'SC_STEP'
+SC_STEP_TIME = 'SC_STEP_TIME'
+sc_points = [SC_STEP, SC_STEP_TIME]
+
+
+class StepSchedulerError(Exception):
+    """
+    Exception to wrap all step scheduler generated exceptions.
+    """
+    pass
+
+
+class Step(object):
+    def __init__(self, t_offset, action, args, label=None):
+        self.t_offset = float(t_offset)
+        self.action = action
+        self.args = args
+        self.label = label
+        self.t_start = None
+        self.lateness = None
+
+
+class StepScheduler(object):
+    """
+    ts - test script, used for sleeping and logging.
+    daq - optional DAS to receive the step soft channels.
+    log - log each step with its lateness.
+    """
+
+    def __init__(self, ts, daq=None, log=True):
+        self.ts = ts
+        self.daq = daq
+        self.log = log
+        self.steps = []
+        self.t_start = None
+
+    def add(self, t_offset, action, *args, **kwargs):
+        """
+        Add a step that calls action(*args) at t_offset seconds after the start of the sequence. Steps run in offset
+        order, steps with equal offsets in the order added. The 'label' keyword argument names the step in the log.
+        """
+        if t_offset < 0:
+            raise StepSchedulerError('Step offset must not be negative: %s' % (t_offset))
+        self.steps.append(Step(t_offset, action, args, label=kwargs.get('label')))
+
+    def _sc_set(self, name, value):
+        if self.daq is not None and name in self.daq.sc:
+            self.daq.sc[name] = value
+
+    def _wait_until(self, deadline):
+        remaining = deadline - vclock.time()
+        if remaining > 0:
+            self.ts.sleep(remaining)
+
+    def run(self, end=None):
+        """
+        Run the steps at their deadlines. If end is supplied, return at end seconds after the start, otherwise after
+        the last step action. Returns the list of steps with their actual start times and lateness.
+        """
+        steps = sorted(self.steps, key=lambda s: s.t_offset)
+        self.t_start = vclock.time()
+        for index, step in enumerate(steps):
+            deadline = self.t_start + step.t_offset
+            self._wait_until(deadline)
+            step.t_start = vclock.time()
+            step.lateness = step.t_start - deadline
+            self._sc_set(SC_STEP, index)
+            self._sc_set(SC_STEP_TIME, step.t_start)
+            step.action(*step.args)
+            if self.log:
+                label = step.label
+                if label is None:
+                    label = ', '.join([str(a) for a in step.args])
+                self.ts.log('Step %s at %0.3f secs (%s), late %0.1f ms' %
+                            (index, step.t_offset, label, step.lateness * 1000))
+        if end is not None:
+            self._wait_until(self.t_start + float(end))
+        return steps
+
+    def lateness(self):
+        """
+        Return the maximum and mean lateness (secs) of the steps run.
+        """
+        values = [s.lateness for s in self.steps if s.lateness is not None]
+        if not values:
+            return None, None
+        return max(values), sum(values)/len(values)
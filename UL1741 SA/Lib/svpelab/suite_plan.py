@@ -0,0 +1,392 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+'''
+Static duration and instrument command planning for test suites.
+
+The test configurations (.tst) and suites (.ste) are read without running any scripts. For each test, the loop
+structure of its script is expanded from the test parameters into a timeline of steps. Each step has a duration and a
+count of the instrument commands issued in it (gridsim, pvsim, der, das). Durations are the fixed dwell times of the
+scripts, so they are the upper bound when adaptive dwells are enabled and exclude instrument communication time.
+
+Suites are expanded recursively. When a suite has globals enabled, its parameters override those of its members.
+
+The planner also suggests a test order that reduces instrument reconfiguration between tests. The cost of running one
+test after another is the number of differing instrument parameters (gridsim.*, pvsim.*, der.*, das.*) plus the
+number of instrument state differences (grid voltage and frequency, PV power, DER function) between the end of one
+test and the start of the next. The order is built greedily from the first test.
+
+    python suite_plan.py Suites/VV.ste
+'''
+
+# script delays not available as parameters (see the scripts)
+SA9_POWER_DELAY = 5
+SA10_POWER_DELAY = 5
+SA11_TRIP_WAIT_DELAY = 5
+SA11_POWER_WAIT_DELAY = 5
+
+instrument_groups = ('gridsim', 'pvsim', 'der', 'das')
+
+param_types = {
+    'int': int,
+    'float': float,
+    'string': str,
+    'bool': lambda v: v in ('True', 'true', '1')
+}
+
+
+class PlanError(Exception):
+    """
+    Exception to wrap all suite plan generated exceptions.
+    """
+    pass
+
+
+class Step(object):
+    def __init__(self, label, duration=0., **commands):
+        self.label = label
+        self.duration = float(duration)
+        self.commands = commands
+
+
+class TestPlan(object):
+    """
+    Expanded timeline of a test configuration.
+    """
+
+    def __init__(self, name, script, params):
+        self.name = name
+        self.script = script
+        self.params = params
+        self.steps = []
+        self.start_state = {}
+        self.end_state = {}
+
+    def step(self, label, duration=0., **commands):
+        self.steps.append(Step(label, duration, **commands))
+
+    @property
+    def duration(self):
+        return sum([s.duration for s in self.steps])
+
+    def commands(self):
+        counts = dict([(group, 0) for group in instrument_groups])
+        for s in self.steps:
+            for group, count in s.commands.iteritems():
+                counts[group] = counts.get(group, 0) + count
+        return counts
+
+    def timeline(self):
+        """
+        Return a list of (start time, step) tuples.
+        """
+        t = 0.
+        timeline = []
+        for s in self.steps:
+            timeline.append((t, s))
+            t += s.duration
+        return timeline
+
+    def instrument_params(self):
+        return dict([(k, v) for k, v in self.params.iteritems() if k.split('.')[0] in instrument_groups])
+
+
+def param_reader(params):
+    def p(name, default=None):
+        return params.get(name, default)
+    return p
+
+
+def plan_sa9(plan, p):
+    p_levels = [level for level, name in ((100, 'p_100'), (20, 'p_20')) if p('vrt.' + name, 'Enabled') == 'Enabled']
+    phases = p('eut.phases', 'Single Phase')
+    if phases == 'Single Phase':
+        phase_tests = ['p1']
+    else:
+        phase_tests = [t for t in ('phase_all', 'phase_1', 'phase_2', 'phase_3') if p('vrt.' + t, 'Enabled') == 'Enabled']
+        if phases == '3-Phase 4-Wire':
+            phase_tests.extend([t for t in ('phase_1_2', 'phase_2_3', 'phase_1_3')
+                                if p('vrt.' + t, 'Enabled') == 'Enabled'])
+    t_dwell = float(p('eut.vrt_t_dwell', 5))
+    t_hold = float(p('vrt.t_hold', 10.))
+    n_r = int(p('vrt.n_r', 5))
+    v_test = float(p('vrt.v_test', 100.))
+    plan.step('init', pvsim=2, der=1, gridsim=0)
+    for level in p_levels:
+        plan.step('power %s%%' % (level), SA9_POWER_DELAY, pvsim=1)
+        for phase_test in phase_tests:
+            plan.step('%s power %s%% ride-through' % (phase_test, level),
+                      t_hold + n_r * (t_dwell + t_hold) + t_dwell, gridsim=2 * n_r + 1, das=3)
+    plan.start_state = {'v': 100., 'f': 100., 'p': p_levels[0] if p_levels else None, 'der': None}
+    plan.end_state = {'v': 100., 'f': 100., 'p': p_levels[-1] if p_levels else None, 'der': None}
+    plan.start_state['v_test'] = plan.end_state['v_test'] = v_test
+
+
+def plan_sa10(plan, p):
+    p_levels = [level for level, name in ((100, 'p_100'), (20, 'p_20')) if p('frt.' + name, 'Enabled') == 'Enabled']
+    t_dwell = float(p('eut.frt_t_dwell', 5))
+    t_hold = float(p('frt.t_hold', 10.))
+    n_r = int(p('frt.n_r', 5))
+    plan.step('init', pvsim=2, der=1, gridsim=1)
+    for level in p_levels:
+        plan.step('power %s%%' % (level), SA10_POWER_DELAY, pvsim=1)
+        plan.step('power %s%% ride-through' % (level), n_r * (t_dwell + t_hold) + t_dwell, gridsim=2 * n_r + 1,
+                  das=3)
+    plan.start_state = {'v': 100., 'f': 100., 'p': p_levels[0] if p_levels else None, 'der': None}
+    plan.end_state = {'v': 100., 'f': 100., 'p': p_levels[-1] if p_levels else None, 'der': None}
+
+
+def plan_sa11(plan, p):
+    rr_up_min = float(p('eut.rr_up_min', 20.))
+    rr_up_max = float(p('eut.rr_up_max', 100.))
+    t_dwell = float(p('eut.t_dwell', 5.))
+    ramp_rates = []
+    if p('rr.rr_max', 'Enabled') == 'Enabled':
+        ramp_rates.append(rr_up_max)
+    if p('rr.rr_mid', 'Enabled') == 'Enabled':
+        ramp_rates.append((rr_up_min + rr_up_max)/2)
+    if p('rr.rr_min', 'Enabled') == 'Enabled':
+        ramp_rates.append(rr_up_min)
+    soft_start = p('rr.soft_start', 'Disabled') == 'Enabled'
+    n_r = int(p('rr.n_r', 3))
+    t_reconnect = float(p('rr.t_reconnect', 600.))
+    plan.step('init', pvsim=2, der=1)
+    for rr in ramp_rates:
+        duration = 100/rr + (t_dwell * 2)
+        if soft_start:
+            sample_duration = duration + SA11_TRIP_WAIT_DELAY + t_reconnect
+        else:
+            sample_duration = duration + SA11_POWER_WAIT_DELAY
+        plan.step('ramp rate %s%%/sec' % (rr), der=1)
+        for count in range(1, n_r + 1):
+            if soft_start:
+                plan.step('ramp rate %s%%/sec pass %s trip' % (rr, count), SA11_TRIP_WAIT_DELAY, gridsim=3, das=1)
+            else:
+                plan.step('ramp rate %s%%/sec pass %s low power' % (rr, count), SA11_POWER_WAIT_DELAY, pvsim=1,
+                          das=1)
+            plan.step('ramp rate %s%%/sec pass %s ramp' % (rr, count), sample_duration, pvsim=1, das=2)
+    plan.start_state = {'v': 100., 'f': 100., 'p': 'low', 'der': ('rr', ramp_rates[0] if ramp_rates else None)}
+    plan.end_state = {'v': 100., 'f': 100., 'p': 'rated', 'der': ('rr', ramp_rates[-1] if ramp_rates else None)}
+
+
+def plan_sa12(plan, p):
+    pf_settling_time = float(p('eut.pf_settling_time', 1))
+    p_levels = [level for level, name in ((100, 'p_100'), (50, 'p_50'), (20, 'p_20'))
+                if p('spf.' + name, 'Enabled') == 'Enabled']
+    pf_targets = [t for t in ('pf_min_ind', 'pf_mid_ind', 'pf_min_cap', 'pf_mid_cap')
+                  if p('spf.' + t, 'Enabled') == 'Enabled']
+    n_r = int(p('spf.n_r', 3))
+    plan.step('init', pvsim=2, der=1)
+    for pf in pf_targets:
+        for level in p_levels:
+            plan.step('%s power %s%%' % (pf, level), pvsim=1)
+            for count in range(1, n_r + 1):
+                plan.step('%s power %s%% pass %s unity' % (pf, level, count), pf_settling_time * 3, der=2, das=3)
+                plan.step('%s power %s%% pass %s' % (pf, level, count), pf_settling_time * 3, der=2, das=3)
+    plan.start_state = {'v': 100., 'f': 100., 'p': p_levels[0] if p_levels else None,
+                        'der': ('pf', pf_targets[0] if pf_targets else None)}
+    plan.end_state = {'v': 100., 'f': 100., 'p': p_levels[-1] if p_levels else None,
+                      'der': ('pf', pf_targets[-1] if pf_targets else None)}
+
+
+def plan_sa13(plan, p):
+    t_settling = float(p('eut.vv_t_settling', 0.))
+    segment_point_count = int(p('srd.vv_segment_point_count', 3))
+    # voltage_sample_points(): count + 1 points in each of the first four segments, count in the last
+    n_points = 5 * segment_point_count + 4
+    priorities = [pp for pp in ('pp_active', 'pp_reactive') if p('vv.' + pp, 'Enabled') == 'Enabled']
+    tests = [t for t in (1, 2, 3) if p('vv.test_%s' % (t), 'Enabled') == 'Enabled']
+    power_levels = []
+    for name, level in (('n_r_100', 100), ('n_r_66', 66), ('n_r_min', 'min')):
+        count = int(p('vv.' + name, 3))
+        if count > 0:
+            power_levels.append((level, count))
+    plan.step('init', pvsim=2, der=1)
+    for priority in priorities:
+        for test in tests:
+            plan.step('%s test %s curve' % (priority, test), der=2)
+            for level, count in power_levels:
+                plan.step('%s test %s power %s%%' % (priority, test, level), pvsim=1)
+                for i in range(1, count + 1):
+                    for direction in ('high', 'low'):
+                        plan.step('%s test %s power %s%% sweep %s %s' % (priority, test, level, i, direction),
+                                  n_points * t_settling, gridsim=n_points, das=3)
+    plan.start_state = {'v': 'sweep', 'f': 100., 'p': power_levels[0][0] if power_levels else None,
+                        'der': ('vv', tests[0] if tests else None)}
+    plan.end_state = {'v': 'sweep', 'f': 100., 'p': power_levels[-1][0] if power_levels else None,
+                      'der': ('vv', tests[-1] if tests else None)}
+
+
+script_planners = {
+    'SA9_volt_ride_through': plan_sa9,
+    'SA10_freq_ride_through': plan_sa10,
+    'SA11_ramp_rate': plan_sa11,
+    'SA12_power_factor': plan_sa12,
+    'SA13_volt_var': plan_sa13
+}
+
+
+def read_params(element):
+    params = {}
+    if element is not None:
+        for e in element.findall('param'):
+            convert = param_types.get(e.attrib.get('type'), str)
+            value = e.text
+            if value is not None:
+                try:
+                    value = convert(value)
+                except ValueError:
+                    pass
+            params[e.attrib['name']] = value
+    return params
+
+
+def find_member(name, base_dir):
+    for d in (base_dir, os.path.join(base_dir, os.pardir, 'Tests'), os.path.join(base_dir, os.pardir, 'Suites')):
+        path = os.path.normpath(os.path.join(d, name))
+        if os.path.exists(path):
+            return path
+    raise PlanError('Suite member not found: %s' % (name))
+
+
+def plan_test(filename, global_params=None):
+    root = ET.parse(filename).getroot()
+    params = read_params(root.find('params'))
+    if global_params:
+        params.update(global_params)
+    script = root.attrib.get('script')
+    plan = TestPlan(root.attrib.get('name', os.path.splitext(os.path.basename(filename))[0]), script, params)
+    planner = script_planners.get(script)
+    if planner is None:
+        raise PlanError('No planner for script: %s' % (script))
+    planner(plan, param_reader(params))
+    return plan
+
+
+def plan_suite(filename, global_params=None):
+    """
+    Return the list of test plans of a suite (.ste) or test (.tst) file in suite order.
+    """
+    if os.path.splitext(filename)[1] == '.tst':
+        return [plan_test(filename, global_params)]
+    root = ET.parse(filename).getroot()
+    params = {}
+    if root.attrib.get('globals') == 'True':
+        params = read_params(root.find('params'))
+    if global_params:
+        params.update(global_params)
+    plans = []
+    members = root.find('members')
+    if members is not None:
+        for m in members.findall('member'):
+            plans.extend(plan_suite(find_member(m.attrib['name'], os.path.dirname(filename)), params))
+    return plans
+
+
+def transition_cost(a, b):
+    """
+    Instrument reconfiguration cost of running test plan b after test plan a.
+    """
+    pa = a.instrument_params()
+    pb = b.instrument_params()
+    cost = len([k for k in set(pa) | set(pb) if pa.get(k) != pb.get(k)])
+    cost += len([k for k in set(a.end_state) | set(b.start_state) if a.end_state.get(k) != b.start_state.get(k)])
+    if a.script != b.script:
+        cost += 1
+    return cost
+
+
+def suggest_order(plans):
+    """
+    Return the plans in a greedy minimum reconfiguration order starting with the first plan, and the total
+    reconfiguration cost of the suite order and the suggested order.
+    """
+    if not plans:
+        return [], 0, 0
+    remaining = list(plans[1:])
+    order = [plans[0]]
+    while remaining:
+        # ties keep the suite order
+        best = min(remaining, key=lambda b: (transition_cost(order[-1], b), remaining.index(b)))
+        remaining.remove(best)
+        order.append(best)
+    cost = lambda seq: sum([transition_cost(seq[i - 1], seq[i]) for i in range(1, len(seq))])
+    return order, cost(plans), cost(order)
+
+
+def format_duration(secs):
+    secs = int(round(secs))
+    return '%d:%02d:%02d' % (secs // 3600, (secs % 3600) // 60, secs % 60)
+
+
+def report(plans, steps=False):
+    lines = []
+    header = '%-20s %-24s %10s' % ('Test', 'Script', 'Duration') + ''.join([' %8s' % g for g in instrument_groups])
+    lines.append(header)
+    lines.append('-' * len(header))
+    total = 0.
+    totals = dict([(g, 0) for g in instrument_groups])
+    for plan in plans:
+        counts = plan.commands()
+        total += plan.duration
+        for g in instrument_groups:
+            totals[g] += counts.get(g, 0)
+        lines.append('%-20s %-24s %10s' % (plan.name, plan.script, format_duration(plan.duration)) +
+                     ''.join([' %8s' % counts.get(g, 0) for g in instrument_groups]))
+        if steps:
+            for t, s in plan.timeline():
+                if s.duration > 0:
+                    lines.append('    %10s  %s (%0.1f secs)' % (format_duration(t), s.label, s.duration))
+    lines.append('-' * len(header))
+    lines.append('%-20s %-24s %10s' % ('Total', '', format_duration(total)) +
+                 ''.join([' %8s' % totals[g] for g in instrument_groups]))
+    order, cost, cost_order = suggest_order(plans)
+    lines.append('')
+    lines.append('Suggested order: %s' % (', '.join([plan.name for plan in order])))
+    lines.append('Reconfiguration cost: %s (suite order), %s (suggested order)' % (cost, cost_order))
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) < 2:
+        print('usage: suite_plan.py [-s] <suite.ste|test.tst> ...')
+        sys.exit(1)
+    show_steps = '-s' in sys.argv[1:]
+    all_plans = []
+    for f in [a for a in sys.argv[1:] if a != '-s']:
+        all_plans.extend(plan_suite(f))
+    print(report(all_plans, steps=show_steps))
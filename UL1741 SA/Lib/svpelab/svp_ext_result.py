@@ -32,32 +32,19 @@ class ResultMenu(object):
     def plot_wxmplot(self, arg=None):
         frame = wxmplot.PlotFrame()
         filename = os.path.join(self.result_dir, self.result_name, self.result.filename)
-        f = open(filename, 'r')
-        names = f.readline().split(',')
-        columns = len(names)
-        value_arrays = []
-        for i in range(columns):
-            value_arrays.append([])
-
-        base_time = None
-        for line in f:
-            values = line.split(',')
-            if base_time is None:
-                base_time = float(values[0])
-            t = round(float(values[0]) - base_time, 2)
-            value_arrays[0].append(t)
-            for i in range(1, columns):
-                try:
-                    v = float(values[i])
-                    value_arrays[i].append(v)
-                except Exception, e:
-                    value_arrays[i].append('nan')
-                    pass
-
-        time_array = numpy.array(value_arrays[0])
-        for i in range(1, columns):
-            value_array = numpy.array(value_arrays[i])
-            frame.oplot(time_array, value_array, label=names[i])
+        names, data = csv_columns(filename)
+
+        # plot each column as a min/max envelope of about one point per pixel, refined by LODView on zoom
+        time_array = data[0]
+        if len(time_array) > 0:
+            time_array = time_array - time_array[0]
+        envelopes = []
+        for i in range(1, len(names)):
+            envelope = Envelope(time_array, data[i])
+            envelopes.append(envelope)
+            x, y = envelope.points(width=LOD_WIDTH)
+            frame.oplot(x, y, label=names[i])
+        self.lod_view = LODView(frame, envelopes)
 
         '''
         r = numpy.recfromcsv(filename, case_sensitive=True)
@@ -81,3 +68,117 @@ class ResultMenu(object):
         print 'plot_pyplot'
 
 
+# points drawn across the plot width when the width of the plot canvas is not available
+LOD_WIDTH = 2000
+
+
+def csv_columns(filename):
+    """
+    Load a result CSV file in bulk. Returns the column names and a 2D float array with a row of values for each
+    column. Values that are not numbers are NaN.
+    """
+    f = open(filename, 'r')
+    try:
+        names = [name.strip() for name in f.readline().split(',')]
+        text = f.read()
+    finally:
+        f.close()
+    lines = [line for line in text.splitlines() if line.strip()]
+    columns = len(names)
+    # fast path for files of only numbers, all values are parsed in a single call
+    values = numpy.fromstring(','.join(lines), dtype=float, sep=',') if lines else numpy.zeros(0)
+    if values.size != len(lines) * columns:
+        values = numpy.genfromtxt(lines, dtype=float, delimiter=',', invalid_raise=False, usecols=range(columns))
+    return names, values.reshape(-1, columns).T
+
+
+class Envelope(object):
+    """
+    Min/max envelope pyramid of a plot column.
+
+    Level 0 is the samples. Each higher level holds the minimum and maximum of blocks of factor times as many samples
+    as the level below, down to about min_blocks blocks. points() returns the samples of a time range, when there are
+    few enough, or the envelope of the finest level with no more blocks than the plot width, drawn as a vertical min to
+    max line per block. Drawing cost then depends on the plot width rather than the length of the capture.
+
+    x - sample times, non-decreasing.
+    y - sample values, NaN for missing values.
+    """
+
+    def __init__(self, x, y, factor=4, min_blocks=256):
+        self.x = numpy.asarray(x, dtype=float)
+        self.y = numpy.asarray(y, dtype=float)
+        self.factor = factor
+        # (block size, block minimums, block maximums) of each level above the samples
+        self.levels = []
+        size = 1
+        y_min = y_max = self.y
+        while len(y_min) > min_blocks:
+            y_min = self._reduce(y_min, numpy.fmin)
+            y_max = self._reduce(y_max, numpy.fmax)
+            size *= factor
+            self.levels.append((size, y_min, y_max))
+
+    def _reduce(self, values, ufunc):
+        count = -(-len(values) // self.factor)
+        padded = numpy.empty(count * self.factor)
+        padded[:len(values)] = values
+        padded[len(values):] = values[-1]
+        # fmin/fmax ignore NaN unless all values of a block are NaN
+        return ufunc.reduce(padded.reshape(count, self.factor), axis=1)
+
+    def points(self, x0=None, x1=None, width=LOD_WIDTH):
+        """
+        Return (x, y) arrays to draw the column between x0 and x1 with about width points.
+        """
+        n = len(self.x)
+        i0 = 0 if x0 is None else max(int(numpy.searchsorted(self.x, x0, side='left')) - 1, 0)
+        i1 = n if x1 is None else min(int(numpy.searchsorted(self.x, x1, side='right')) + 1, n)
+        if i1 - i0 <= 2 * width or not self.levels:
+            # few enough samples, or too few for an envelope on a narrow plot
+            return self.x[i0:i1], self.y[i0:i1]
+        size, y_min, y_max = self.levels[-1]
+        for level in self.levels:
+            if (i1 - i0) // level[0] <= width:
+                size, y_min, y_max = level
+                break
+        b0 = i0 // size
+        b1 = -(-i1 // size)
+        x = numpy.repeat(self.x[b0 * size:b1 * size:size], 2)
+        y = numpy.column_stack((y_min[b0:b1], y_max[b0:b1])).ravel()
+        return x, y
+
+
+class LODView(object):
+    """
+    Redraws the envelopes of a wxmplot plot frame for the visible time range when the plot is zoomed or panned. The
+    envelopes are the plot traces, in order.
+    """
+
+    def __init__(self, frame, envelopes):
+        self.frame = frame
+        self.envelopes = envelopes
+        self.updating = False
+        self.frame.panel.axes.callbacks.connect('xlim_changed', self.xlim_changed)
+
+    def width(self):
+        try:
+            return max(int(self.frame.panel.canvas.get_width_height()[0]), 1)
+        except Exception:
+            return LOD_WIDTH
+
+    def xlim_changed(self, axes):
+        if self.updating:
+            return
+        self.updating = True
+        try:
+            x0, x1 = axes.get_xlim()
+            width = self.width()
+            lines = axes.get_lines()
+            for i, envelope in enumerate(self.envelopes):
+                if i < len(lines):
+                    x, y = envelope.points(x0, x1, width=width)
+                    lines[i].set_data(x, y)
+            self.frame.panel.canvas.draw_idle()
+        finally:
+            self.updating = False
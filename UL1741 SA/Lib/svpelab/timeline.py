@@ -0,0 +1,340 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import os
+import threading
+import collections
+import json
+
+import vclock
+
+'''
+Timeline tracing of test script runs in the Chrome trace event format.
+
+When enabled, the public methods of the drivers created by gridsim_init(), pvsim_init(), loadsim_init(),
+dcsim_init(), der_init() and das_init() are recorded as spans, together with ts.sleep() waits, the test script log
+messages and the spans the script marks for its main steps. The trace is saved as trace.json with the result files
+and can be opened in chrome://tracing or https://ui.perfetto.dev to see how, for example, grid.profile_load(),
+profile_start(), the DAS capture arm and fetch, the waits and the result file writes overlap. Calls made from the DAS
+sample timers appear on the timer threads.
+
+The time stamps are taken from vclock so a run in virtual time shows the virtual timeline. The events are kept in a
+buffer of a fixed number of events, the oldest events being dropped when it is full. When tracing is disabled no
+driver is wrapped and span(), begin() and end() return immediately:
+
+    timeline.timeline_init(ts)
+    ...
+    timeline.begin('step', power=power)
+    grid.voltage(v)
+    with timeline.span('save', file=filename):
+        ds.to_csv(ts.result_file_path(filename))
+    timeline.end()
+    ...
+    timeline.timeline_close(ts)
+'''
+
+TIMELINE_DEFAULT_ID = 'timeline'
+TRACE_FILE = 'trace.json'
+TRACE_BUFFER = 100000
+
+# driver methods that are not traced
+SKIP_METHODS = ['param_value']
+# maximum length of the recorded argument and log message text
+ARG_LEN = 80
+
+
+class TraceError(Exception):
+    """
+    Exception to wrap all trace generated exceptions.
+    """
+    pass
+
+
+def arg_str(args, kwargs):
+    s = ', '.join([repr(a) for a in args] + ['%s=%r' % (k, v) for k, v in sorted(kwargs.items())])
+    if len(s) > ARG_LEN:
+        s = s[:ARG_LEN - 3] + '...'
+    return s
+
+
+class Span(object):
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.tracer.complete(self.name, self.cat, self.start, self.tracer.clock(), self.args)
+        return False
+
+
+class NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+null_span = NullSpan()
+
+
+class Tracer(object):
+    """
+    Bounded buffer of trace events.
+
+    Events are kept as (phase, name, category, time stamp (s), duration (s), thread id, args) tuples.
+    """
+
+    def __init__(self, size=TRACE_BUFFER, clock=None):
+        if clock is None:
+            clock = vclock.time
+        self.clock = clock
+        self.size = int(size)
+        self.events = collections.deque(maxlen=self.size)
+        self.count = 0
+        self.threads = {}
+        self._restore = []
+
+    def _add(self, event):
+        tid = event[5]
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        self.events.append(event)
+        self.count += 1
+
+    def complete(self, name, cat, start, end, args=None):
+        self._add(('X', name, cat, start, end - start, threading.current_thread().ident, args))
+
+    def instant(self, name, cat, args=None):
+        self._add(('i', name, cat, self.clock(), None, threading.current_thread().ident, args))
+
+    def begin(self, name, cat, args=None):
+        self._add(('B', name, cat, self.clock(), None, threading.current_thread().ident, args))
+
+    def end(self):
+        self._add(('E', None, None, self.clock(), None, threading.current_thread().ident, None))
+
+    def span(self, name, cat, args=None):
+        return Span(self, name, cat, args)
+
+    def dropped(self):
+        return self.count - len(self.events)
+
+    def traced(self, name, cat, fn):
+        """
+        Return fn wrapped to record each call as a span.
+        """
+        clock = self.clock
+        complete = self.complete
+
+        def call(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                complete(name, cat, start, clock(), {'args': arg_str(args, kwargs)} if args or kwargs else None)
+        call.traced = fn
+        return call
+
+    def wrap(self, obj, device):
+        """
+        Trace the public methods of a driver. The spans are named <device>.<method>.
+        """
+        for method in dir(type(obj)):
+            if method.startswith('_') or method in SKIP_METHODS:
+                continue
+            if not callable(getattr(type(obj), method, None)):
+                continue
+            fn = getattr(obj, method, None)
+            if fn is None or hasattr(fn, 'traced') or isinstance(fn, type):
+                continue
+            try:
+                setattr(obj, method, self.traced('%s.%s' % (device, method), device, fn))
+            except (AttributeError, TypeError):
+                pass
+        return obj
+
+    def bind(self, ts):
+        """
+        Trace the waits and log messages of the test script.
+        """
+        for attr, cat in [('sleep', 'script'), ('log', 'log'), ('log_warning', 'log'), ('log_error', 'log')]:
+            fn = getattr(ts, attr, None)
+            if fn is None:
+                continue
+            if cat == 'log':
+                wrapped = self._log(attr, fn)
+            else:
+                wrapped = self.traced('ts.' + attr, cat, fn)
+            self._restore.append((attr, ts.__dict__.get(attr)))
+            setattr(ts, attr, wrapped)
+
+    def unbind(self, ts):
+        for attr, fn in reversed(self._restore):
+            if fn is None:
+                try:
+                    delattr(ts, attr)
+                except AttributeError:
+                    pass
+            else:
+                setattr(ts, attr, fn)
+        self._restore = []
+
+    def _log(self, name, fn):
+        def call(msg, *args, **kwargs):
+            s = str(msg)
+            self.instant(name, 'log', {'msg': s if len(s) <= ARG_LEN else s[:ARG_LEN - 3] + '...'})
+            return fn(msg, *args, **kwargs)
+        return call
+
+    def to_json(self, filename):
+        """
+        Write the buffered events as a Chrome trace event JSON file.
+        """
+        pid = os.getpid()
+        f = open(filename, 'w')
+        try:
+            f.write('{"displayTimeUnit": "ms", "otherData": %s,\n"traceEvents": [\n' %
+                    json.dumps({'events': self.count, 'dropped': self.dropped()}))
+            sep = ''
+            for tid, name in sorted(self.threads.items()):
+                f.write(sep + json.dumps({'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': tid,
+                                          'args': {'name': name}}))
+                sep = ',\n'
+            for ph, name, cat, t, dur, tid, args in self.events:
+                e = {'ph': ph, 'ts': round(t * 1e6, 1), 'pid': pid, 'tid': tid}
+                if name is not None:
+                    e['name'] = name
+                    e['cat'] = cat
+                if dur is not None:
+                    e['dur'] = round(dur * 1e6, 1)
+                if ph == 'i':
+                    e['s'] = 't'
+                if args:
+                    e['args'] = args
+                f.write(sep + json.dumps(e))
+                sep = ',\n'
+            f.write('\n]}\n')
+        finally:
+            f.close()
+
+
+tracer = None
+
+
+def span(name, cat='script', **args):
+    """
+    Context manager recording the enclosed code as a span.
+    """
+    if tracer is None:
+        return null_span
+    return tracer.span(name, cat, args or None)
+
+
+def begin(name, cat='script', **args):
+    """
+    Begin a span, ended by the next end() of the thread.
+    """
+    if tracer is not None:
+        tracer.begin(name, cat, args or None)
+
+
+def end():
+    if tracer is not None:
+        tracer.end()
+
+
+def wrap(obj, device):
+    """
+    Trace a driver if tracing is enabled. Returns the driver.
+    """
+    if tracer is not None and obj is not None:
+        tracer.wrap(obj, device)
+    return obj
+
+
+def params(info, group_name=None):
+    if group_name is None:
+        group_name = TIMELINE_DEFAULT_ID
+    name = lambda name: group_name + '.' + name
+    info.param_group(group_name, label='Timeline Trace Parameters', glob=True)
+    info.param(name('mode'), label='Timeline trace', default='Disabled', values=['Disabled', 'Enabled'],
+               desc='Save a Chrome trace of the driver calls, waits and test steps with the results.')
+    info.param(name('buffer'), label='Trace buffer size (events)', default=TRACE_BUFFER,
+               active=name('mode'), active_value=['Enabled'])
+
+
+def timeline_init(ts, group_name=None):
+    """
+    Enable tracing of the test script and of the drivers created after this call if selected. Returns the Tracer or
+    None.
+
+    Must be called after vclock_init() and before the drivers are created.
+    """
+    global tracer
+    if group_name is None:
+        group_name = TIMELINE_DEFAULT_ID
+    tracer = None
+    mode = ts.param_value(group_name + '.' + 'mode')
+    if mode == 'Enabled':
+        size = ts.param_value(group_name + '.' + 'buffer')
+        if size is None:
+            size = TRACE_BUFFER
+        if int(size) <= 0:
+            raise TraceError('Trace buffer size must be greater than zero: %s' % (size))
+        tracer = Tracer(size=size)
+        tracer.bind(ts)
+        ts.log('Timeline trace enabled')
+    return tracer
+
+
+def timeline_close(ts, filename=TRACE_FILE):
+    """
+    Save the trace of the test with the result files.
+    """
+    global tracer
+    if tracer is None:
+        return None
+    t = tracer
+    tracer = None
+    t.unbind(ts)
+    t.to_json(ts.result_file_path(filename))
+    ts.result_file(filename)
+    if t.dropped():
+        ts.log_warning('Trace buffer full, %s oldest events dropped' % (t.dropped()))
+    return filename
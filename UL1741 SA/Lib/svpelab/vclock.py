@@ -0,0 +1,283 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import sys
+import time as _time
+import heapq
+import ctypes
+import ctypes.util
+
+import checkpoint
+
+'''
+Clock used by the test scripts and drivers for waits, timers and elapsed time.
+
+In the default 'Real' mode, ts.sleep() and the test script timers are unchanged and time() follows a monotonic clock
+anchored to the system time, so elapsed times are not affected by system clock adjustments. In 'Virtual' mode,
+vclock_init() binds the sleep and timer methods of the test script to a VirtualClock. The virtual clock advances
+instantly through each wait, running the timers that fall due within the wait in time order at their scheduled virtual
+time. The original sleep of the test script is still called with a zero wait on each virtual wait so the script abort
+check is kept. Combined with the simulator drivers (gridsim_sim, pvsim_sim, der_sim, das_sim) this runs the
+script and suite logic, including the DAS sample timers and result generation, in a fraction of the test time.
+
+Scripts and drivers should use vclock.time() instead of time.time() for elapsed time measurements so they follow the
+bound clock:
+
+    vclock.vclock_init(ts)
+    start = vclock.time()
+    ts.sleep(10)
+    elapsed = vclock.time() - start
+'''
+
+VCLOCK_DEFAULT_ID = 'vclock'
+VCLOCK_REAL = 'Real'
+VCLOCK_VIRTUAL = 'Virtual'
+
+# instrument groups and the modes of each group that may run in virtual time, any DAS group name starts with 'das'
+virtual_groups = ['gridsim', 'pvsim', 'der', 'loadsim', 'dcsim', 'battsim', 'das', 'das_rms', 'das_wf']
+virtual_modes = ['Disabled', 'Grid Simulator Simulation', 'PV Simulator Simulation', 'DER Simulation',
+                 'EUT Simulation', 'DAS Simulation']
+
+
+class VirtualClockError(Exception):
+    """
+    Exception to wrap all virtual clock generated exceptions.
+    """
+    pass
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _monotonic_source():
+    """
+    Return a function returning the seconds of a monotonic clock. Python 2 has no time.monotonic(), so the POSIX
+    clock_gettime(CLOCK_MONOTONIC) is used on Linux and OS X and time.clock() on Windows. Falls back to time.time().
+    """
+    monotonic = getattr(_time, 'monotonic', None)
+    if monotonic is not None:
+        return monotonic
+    if sys.platform == 'win32':
+        return _time.clock
+    clock_id = {'linux': 1, 'darwin': 6}.get(sys.platform.rstrip('0123456789'))
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        clock_gettime = libc.clock_gettime
+    except (OSError, AttributeError, TypeError):
+        clock_gettime = None
+    if clock_id is None or clock_gettime is None:
+        return _time.time
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+
+    def monotonic():
+        t = _Timespec()
+        if clock_gettime(clock_id, ctypes.byref(t)) != 0:
+            raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+        return t.tv_sec + t.tv_nsec * 1e-9
+    try:
+        monotonic()
+    except OSError:
+        return _time.time
+    return monotonic
+
+
+monotonic = _monotonic_source()
+
+
+class WallClock(object):
+    """
+    Wall clock. Time follows the monotonic clock from the system time when the clock is created. Waits and timers are
+    left to the test script.
+    """
+
+    def __init__(self):
+        self.offset = _time.time() - monotonic()
+
+    def time(self):
+        return self.offset + monotonic()
+
+
+class VirtualTimer(object):
+
+    def __init__(self, interval, fn, arg=None, repeating=False):
+        self.interval = float(interval)
+        self.fn = fn
+        self.arg = arg
+        self.repeating = repeating
+        self.active = True
+
+
+class VirtualClock(object):
+    """
+    Discrete event clock. The clock starts at the wall clock time so time stamps remain plausible.
+
+    Timers due at the same time run in the order they were started. check, if set, is called with a zero wait on each
+    sleep, bind() sets it to the original sleep of the test script so the script can still be aborted.
+    """
+
+    def __init__(self, start=None, check=None):
+        if start is None:
+            start = _time.time()
+        self.now = float(start)
+        self.check = check
+        self._events = []
+        self._seq = 0
+        self._running = False
+
+    def time(self):
+        return self.now
+
+    def _schedule(self, timer, t):
+        self._seq += 1
+        heapq.heappush(self._events, (t, self._seq, timer))
+
+    def timer_start(self, interval, fn, arg=None, repeating=False):
+        if interval <= 0:
+            raise VirtualClockError('Timer interval must be greater than zero: %s' % (interval))
+        timer = VirtualTimer(interval, fn, arg=arg, repeating=repeating)
+        self._schedule(timer, self.now + timer.interval)
+        return timer
+
+    def timer_cancel(self, timer):
+        if timer is not None:
+            timer.active = False
+
+    def advance(self, secs):
+        """
+        Advance the clock by secs, running the timers that fall due in time order.
+        """
+        target = self.now + max(float(secs), 0.)
+        if self._running:
+            # sleep called from a timer callback, only move the clock
+            self.now = max(self.now, target)
+            return
+        self._running = True
+        try:
+            while self._events and self._events[0][0] <= target:
+                t, seq, timer = heapq.heappop(self._events)
+                if not timer.active:
+                    continue
+                self.now = max(self.now, t)
+                if timer.repeating:
+                    self._schedule(timer, t + timer.interval)
+                else:
+                    timer.active = False
+                timer.fn(timer.arg)
+            self.now = max(self.now, target)
+        finally:
+            self._running = False
+
+    def sleep(self, secs):
+        if self.check is not None:
+            self.check(0)
+        self.advance(secs)
+
+
+clock = WallClock()
+
+
+def time():
+    """
+    Current time of the bound clock in seconds since the epoch.
+    """
+    return clock.time()
+
+
+def bind(ts, vclock):
+    """
+    Bind the sleep and timer methods of the test script to a virtual clock.
+    """
+    global clock
+    clock = vclock
+    sleep = getattr(ts, 'sleep', None)
+    if vclock.check is None and sleep is not None and not isinstance(getattr(sleep, '__self__', None), VirtualClock):
+        vclock.check = sleep
+    ts.sleep = vclock.sleep
+    ts.timer_start = vclock.timer_start
+    ts.timer_cancel = vclock.timer_cancel
+    ts.clock = vclock
+
+
+def params(info, group_name=None):
+    if group_name is None:
+        group_name = VCLOCK_DEFAULT_ID
+    name = lambda name: group_name + '.' + name
+    info.param_group(group_name, label='Clock Parameters', glob=True)
+    info.param(name('mode'), label='Mode', default=VCLOCK_REAL, values=[VCLOCK_REAL, VCLOCK_VIRTUAL],
+               desc='Virtual runs all waits and timers instantly in event order. Only for use with simulators, the '
+                    'test is not started with any other instrument enabled.')
+
+
+def hardware_modes(ts):
+    """
+    Return the (parameter name, mode) of each instrument mode parameter of the test script that is not a simulator
+    or disabled.
+    """
+    names = set([g + '.mode' for g in virtual_groups])
+    for name in checkpoint.param_names(getattr(ts, 'info', None)):
+        group = name.rsplit('.', 1)[0]
+        if name.endswith('.mode') and '.' not in group and (group in virtual_groups or group.startswith('das')):
+            names.add(name)
+    hardware = []
+    for name in sorted(names):
+        try:
+            mode = ts.param_value(name)
+        except Exception, e:
+            mode = None
+        if mode is not None and mode not in virtual_modes:
+            hardware.append((name, mode))
+    return hardware
+
+
+def vclock_init(ts, group_name=None):
+    """
+    Select the clock for the test script run. Returns the virtual clock in 'Virtual' mode, otherwise None.
+
+    Virtual mode is refused unless every instrument is a simulator or disabled, as the waits of the test would
+    otherwise not be kept while real equipment is commanded.
+    """
+    global clock
+    if group_name is None:
+        group_name = VCLOCK_DEFAULT_ID
+    mode = ts.param_value(group_name + '.' + 'mode')
+    if mode == VCLOCK_VIRTUAL:
+        hardware = hardware_modes(ts)
+        if hardware:
+            raise VirtualClockError('Virtual time is only for use with simulators, instruments configured: %s' %
+                                    (', '.join(['%s = %s' % (name, m) for name, m in hardware])))
+        vclock = VirtualClock()
+        bind(ts, vclock)
+        ts.log('Virtual time enabled')
+        return vclock
+    clock = WallClock()
+    return None
@@ -0,0 +1,277 @@
+"""
+Copyright (c) 2017, Sandia National Labs and SunSpec Alliance
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the names of the Sandia National Labs and SunSpec Alliance nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Questions can be directed to support@sunspec.org
+"""
+
+import os
+import re
+import glob
+
+import dataset
+
+try:
+    import numpy as np
+except Exception, e:
+    print('Error: numpy python package not found!')  # This will appear in the SVP log file.
+
+'''
+Volt-var compliance evaluation of SA13 data captures.
+
+Each sweep dataset is segmented by voltage step and the measured reactive power of every sample is compared with the
+reactive power expected from the programmed Q(V) curve. A sample is within the tolerance band when the measured Q is
+within the range of the curve over the measured voltage +/- v_msa, widened by +/- var_msa. The settling time of a
+step is the time from the start of the step until Q enters the band and stays there. All samples of a sweep are
+evaluated in a single pass using array operations.
+
+The curve is specified by the V and Q of the curve points (V1-V4, Q1-Q4 in SA13) in increasing voltage order. Q is
+held at the end point values outside the curve points. The measured V is the mean of the AC_VRMS phase points and the
+measured Q is the sum of the AC_Q phase points.
+
+With active power priority the curve is programmed as a percentage of the available vars (VAR_AVAL_PCT), which depend
+on the active power. For these tests the rated apparent power and the curve reference Q (the Q of 100%) are supplied
+and the expected Q of each sample is scaled by min(1, sqrt(S_rated^2 - P^2)/Q_ref) from the measured P, the sum of
+the AC_P phase points.
+'''
+
+# SA13 capture file names: VV_<active|reactive>_<high|low>_<test>_<power>_<sweep>.csv, the power priority is
+# missing from the names of captures saved by earlier versions of the script
+SWEEP_FILE_PATTERN = 'VV_*.csv'
+sweep_file_re = re.compile(r'VV_(?:(?P<priority>active|reactive)_)?(?P<direction>high|low)_(?P<test>\d+)_'
+                           r'(?P<power>[0-9.]+)_(?P<sweep>\d+)\.csv$')
+
+eval_points = ['PRIORITY', 'TEST', 'DIRECTION', 'POWER', 'SWEEP', 'STEP', 'START', 'END', 'V', 'Q_EXP', 'Q',
+               'Q_ERR', 'SETTLING_TIME', 'PASS']
+
+
+class VoltVarError(Exception):
+    """
+    Exception to wrap all volt-var analysis generated exceptions.
+    """
+    pass
+
+
+def point_columns(ds, name):
+    """
+    Return the dataset columns for a point name or, if the name is not a dataset point, its phase points.
+    """
+    if name in ds.points:
+        names = [name]
+    else:
+        names = [p for p in ds.points if p.startswith(name + '_')]
+    if len(names) == 0:
+        raise VoltVarError('Point not in dataset: %s' % (name))
+    return [np.asarray(ds.data[ds.points.index(p)], dtype=float) for p in names]
+
+
+def available_q_scale(p, s_rated, q_ref):
+    """
+    Return the fraction of the reference Q available at active powers p, the scale of a curve programmed as a
+    percentage of the available vars.
+    """
+    if s_rated <= 0 or q_ref == 0:
+        raise VoltVarError('Rated apparent power and reference Q required for available vars')
+    p = np.asarray(p, dtype=float)
+    return np.minimum(np.sqrt(np.maximum(float(s_rated)**2 - p**2, 0.))/abs(float(q_ref)), 1.)
+
+
+def expected_q(v, curve_v, curve_q, q_scale=None):
+    """
+    Expected Q at voltages v by piecewise-linear interpolation of the curve points, scaled by q_scale if supplied.
+    """
+    q = np.interp(v, curve_v, curve_q)
+    if q_scale is not None:
+        q = q * q_scale
+    return q
+
+
+def q_band(v, curve_v, curve_q, v_msa, var_msa, q_scale=None):
+    """
+    Return the lower and upper limits of the Q tolerance band for voltages v. The curve Q is scaled by q_scale, per
+    sample, if supplied.
+    """
+    q_low = np.interp(v - v_msa, curve_v, curve_q)
+    q_high = np.interp(v + v_msa, curve_v, curve_q)
+    lo = np.minimum(q_low, q_high)
+    hi = np.maximum(q_low, q_high)
+    # curve points within the voltage accuracy window extend the band
+    for cv, cq in zip(curve_v, curve_q):
+        inside = np.abs(v - cv) <= v_msa
+        lo = np.where(inside, np.minimum(lo, cq), lo)
+        hi = np.where(inside, np.maximum(hi, cq), hi)
+    if q_scale is not None:
+        lo = lo * q_scale
+        hi = hi * q_scale
+    return lo - var_msa, hi + var_msa
+
+
+def segment_steps(v, v_points=None, v_step=None):
+    """
+    Return the start index of each voltage step segment.
+
+    If the test voltage points are supplied, each sample is assigned to the nearest test voltage. Otherwise, a new
+    segment is started where the voltage changes by more than v_step/2 between samples.
+    """
+    v = np.asarray(v, dtype=float)
+    if len(v) == 0:
+        return np.array([], dtype=int)
+    if v_points is not None:
+        points = np.sort(np.asarray(v_points, dtype=float))
+        level = np.searchsorted((points[1:] + points[:-1])/2, v)
+    elif v_step is not None:
+        level = np.cumsum(np.concatenate(([0], np.abs(np.diff(v)) > v_step/2.)))
+    else:
+        raise VoltVarError('Voltage points or voltage step required for segmentation')
+    return np.flatnonzero(np.concatenate(([True], level[1:] != level[:-1])))
+
+
+def evaluate(t, v, q, curve_v, curve_q, v_msa, var_msa, t_settling, v_points=None, v_step=None, q_scale=None):
+    """
+    Evaluate a sweep. q_scale is an optional per sample scale of the curve Q (see available_q_scale()). Returns a
+    dictionary of per step arrays:
+
+        'start', 'end' - sample index range of the step
+        'v' - mean measured voltage after settling
+        'q_exp' - expected Q at 'v'
+        'q' - mean measured Q after settling
+        'q_err' - 'q' - 'q_exp'
+        'settling_time' - time for Q to enter and remain in the tolerance band (NaN if it did not)
+        'pass' - True if Q settled within t_settling
+    """
+    t = np.asarray(t, dtype=float)
+    v = np.asarray(v, dtype=float)
+    q = np.asarray(q, dtype=float)
+    n = len(t)
+    starts = segment_steps(v, v_points=v_points, v_step=v_step)
+    ends = np.append(starts[1:], n)
+    seg = np.repeat(np.arange(len(starts)), ends - starts)
+
+    if q_scale is not None:
+        q_scale = np.asarray(q_scale, dtype=float)
+    lo, hi = q_band(v, curve_v, curve_q, v_msa, var_msa, q_scale=q_scale)
+    out = ~((q >= lo) & (q <= hi))
+
+    # last out of band sample of each segment, -1 if none
+    index = np.arange(n)
+    last_out = np.maximum.reduceat(np.where(out, index, -1), starts) if n else np.array([], dtype=int)
+    settled = last_out < ends - 1
+    first_in = np.where(last_out < starts, starts, last_out + 1)
+    settle_time = np.full(len(starts), np.nan)
+    settle_time[settled] = t[first_in[settled]] - t[starts[settled]]
+
+    # average over the settled samples of each segment or all samples if the segment did not settle
+    weight = (index >= np.where(settled, first_in, starts)[seg]).astype(float)
+    count = np.bincount(seg, weights=weight, minlength=len(starts))
+    v_mean = np.bincount(seg, weights=v * weight, minlength=len(starts))/count
+    q_mean = np.bincount(seg, weights=q * weight, minlength=len(starts))/count
+    scale_mean = None
+    if q_scale is not None:
+        scale_mean = np.bincount(seg, weights=q_scale * weight, minlength=len(starts))/count
+    q_exp = expected_q(v_mean, curve_v, curve_q, q_scale=scale_mean)
+
+    return {'start': starts,
+            'end': ends,
+            'v': v_mean,
+            'q_exp': q_exp,
+            'q': q_mean,
+            'q_err': q_mean - q_exp,
+            'settling_time': settle_time,
+            'pass': settled & (settle_time <= t_settling)}
+
+
+def evaluate_dataset(ds, curve_v, curve_q, v_msa, var_msa, t_settling, v_points=None, v_step=None,
+                     sample_interval=None, s_rated=None, q_ref=None):
+    """
+    Evaluate a sweep dataset. The time of each sample is the 'TIME' point or, if not present, the sample index times
+    the sample interval (secs). If s_rated is supplied, the curve is a percentage of the available vars (active power
+    priority) and the expected Q is scaled from the measured P with q_ref as the Q of 100%.
+    """
+    v_cols = point_columns(ds, 'AC_VRMS')
+    v = v_cols[0] if len(v_cols) == 1 else np.mean(v_cols, axis=0)
+    q = np.sum(point_columns(ds, 'AC_Q'), axis=0)
+    q_scale = None
+    if s_rated is not None:
+        q_scale = available_q_scale(np.sum(point_columns(ds, 'AC_P'), axis=0), s_rated, q_ref)
+    if 'TIME' in ds.points:
+        t = np.asarray(ds.data[ds.points.index('TIME')], dtype=float)
+    elif sample_interval is not None:
+        t = np.arange(len(v)) * float(sample_interval)
+    else:
+        raise VoltVarError('No TIME point in dataset and no sample interval supplied')
+    return evaluate(t, v, q, curve_v, curve_q, v_msa, var_msa, t_settling, v_points=v_points, v_step=v_step,
+                    q_scale=q_scale)
+
+
+def evaluate_run(result_dir, curves, v_msa, var_msa, t_settling, v_points=None, v_step=None, sample_interval=None,
+                 s_rated=None, q_ref=None):
+    """
+    Evaluate all SA13 sweep captures in a result directory.
+
+    curves - dictionary of test number -> (curve_v, curve_q).
+    v_points - optional dictionary of test number -> test voltage points used for segmentation.
+    s_rated, q_ref - rated apparent power and Q of 100% for captures of active power priority tests, they are not
+                     applied to reactive power priority captures.
+
+    Returns a list of (filename, priority, test, direction, power, sweep, result) tuples in file name order.
+    """
+    results = []
+    for filename in sorted(glob.glob(os.path.join(result_dir, SWEEP_FILE_PATTERN))):
+        m = sweep_file_re.search(os.path.basename(filename))
+        if m is None:
+            continue
+        priority, direction = m.group('priority'), m.group('direction')
+        test, power, sweep = int(m.group('test')), float(m.group('power')), int(m.group('sweep'))
+        curve = curves.get(test)
+        if curve is None:
+            continue
+        ds = dataset.Dataset()
+        ds.from_csv(filename)
+        points = None
+        if v_points is not None:
+            points = v_points.get(test)
+        scale_s, scale_q = s_rated, q_ref
+        if priority == 'reactive':
+            scale_s = scale_q = None
+        result = evaluate_dataset(ds, curve[0], curve[1], v_msa, var_msa, t_settling, v_points=points,
+                                  v_step=v_step, sample_interval=sample_interval, s_rated=scale_s, q_ref=scale_q)
+        results.append((os.path.basename(filename), priority, test, direction, power, sweep, result))
+    return results
+
+
+def results_dataset(results):
+    """
+    Return the evaluation results as a Dataset with a record for each voltage step.
+    """
+    ds = dataset.Dataset(list(eval_points))
+    for filename, priority, test, direction, power, sweep, result in results:
+        for i in range(len(result['start'])):
+            ds.append([priority or '', test, direction, power, sweep, i, result['start'][i], result['end'][i], result['v'][i],
+                       result['q_exp'][i], result['q'][i], result['q_err'][i], result['settling_time'][i],
+                       int(result['pass'][i])])
+    return ds
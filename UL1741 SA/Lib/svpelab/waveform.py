@@ -32,6 +32,8 @@ Questions can be directed to support@sunspec.org
 
 import math
 
+import dataset
+
 class WaveformError(Exception):
     """
     Exception to wrap all waveform generated exceptions.
@@ -60,13 +62,22 @@ class Waveform(object):
             chans.append([])
         # print self.channels
         line = 1
-        for data in f:
-            line += 1
-            values = data.split(sep)
-            if len(values) != chan_count:
-                raise WaveformError('Channel data error: line %s' % (line))
-            for i in range(chan_count):
-                chans[i].append(float(values[i]))
+        # parse the channel data in bulk, a block at a time, or value by value if a block is not only numbers
+        for block in dataset.csv_blocks(f):
+            values = dataset.csv_parse_block(block, chan_count, sep=sep)
+            if values is not None:
+                for i in range(chan_count):
+                    chans[i].extend(values[:, i].tolist())
+                line += len(values)
+                continue
+            for data in [l + '\n' for l in block[:-1].split('\n')]:
+                line += 1
+                values = data.split(sep)
+                if len(values) != chan_count:
+                    raise WaveformError('Channel data error: line %s' % (line))
+                for i in range(chan_count):
+                    chans[i].append(float(values[i]))
+        f.close()
 
         for i in range(chan_count):
             self.channel_data.append(chans[i])
@@ -57,6 +57,13 @@ try:
 except Exception, e:
     print('Error: math python package not found!')  # This will appear in the SVP log file.
 
+import dataset
+
+try:
+    from scipy import signal
+except Exception, e:
+    print('Error: scipy python package not found!')  # This will appear in the SVP log file.
+
 def calc_ride_through_duration(wfmtime, ac_current, ac_voltage=None, grid_trig=None, v_window=20., trip_thresh=3.):
     """ Returns the time between the voltage change and when the EUT tripped
 
@@ -145,21 +152,36 @@ def calc_ride_through_duration(wfmtime, ac_current, ac_voltage=None, grid_trig=N
         return trip_time
 
 
+# lowpass filter designs by (fs, order, cutoff, output)
+_filter_cache = {}
+
+
+def lowpass_filter(fs, order=4, cutoff=60., output='ba'):
+    """
+    Return a Butterworth lowpass filter design for the sample rate fs (Hz), as (b, a) if output is 'ba' or second
+    order sections if output is 'sos'. Designs are cached so repeated calls with the same sample rate do not redesign
+    the filter.
+
+    The corner is normalized as in freq_from_crossings, wn = 2*pi*cutoff/fs.
+    """
+    key = (float(fs), int(order), float(cutoff), output)
+    design = _filter_cache.get(key)
+    if design is None:
+        # todo: revisit the wn calculation to be sure it works for multiple sampling rates
+        wn = (2*math.pi*cutoff)/fs  #Wn is normalized from 0 to 1, where 1 is the Nyquist frequency, pi radians/sample
+        design = signal.butter(order, wn, analog=False, output=output)
+        _filter_cache[key] = design
+    return design
+
+
 def freq_from_crossings(wfmtime, sig, fs):
     """Estimate frequency by counting zero crossings
 
     Doesn't work if there are multiple zero crossings per cycle.
 
     """
-    try:
-        from scipy import signal
-    except Exception, e:
-        print('Error: scipy python package not found!')  # This will appear in the SVP log file.
-
     # FILTER THE WAVEFORM WITH LOWPASS BUTTERWORTH FILTER
-    # todo: revisit the wn calculation to be sure it works for multiple sampling rates
-    wn = (2*math.pi*60)/fs  #Wn is normalized from 0 to 1, where 1 is the Nyquist frequency, pi radians/sample
-    b, a = signal.butter(4, wn, analog=False)
+    b, a = lowpass_filter(fs)
     sig_ff = signal.filtfilt(b, a, sig)
 
     #check the frequency response
@@ -178,8 +200,8 @@ def freq_from_crossings(wfmtime, sig, fs):
     # Find the zero crossings of the filtered data
     # Linear interpolation to find truer zero crossings
 
-    indices = find(np.logical_and(sig_ff[1:] >= 0., sig_ff[:-1] < 0.))
-    crossings = [i - sig_ff[i] / (sig_ff[i+1] - sig_ff[i]) for i in indices]  #interpolate
+    indices = np.nonzero(np.logical_and(sig_ff[1:] >= 0., sig_ff[:-1] < 0.))[0]
+    crossings = indices - sig_ff[indices] / (sig_ff[indices+1] - sig_ff[indices])  #interpolate
     cross_times = wfmtime[0] + np.array(crossings)/fs
 
     '''
@@ -194,8 +216,7 @@ def freq_from_crossings(wfmtime, sig, fs):
 
     time_steps = np.diff(crossings)
     avg_freq = fs / np.average(time_steps)
-    freqs = [fs/time_steps[i] for i in xrange(0, len(cross_times)-1)]  #interpolate
-    freq_times = [(cross_times[i]+cross_times[i+1])/2 for i in xrange(0, len(freqs)-1)]  #interpolate
+    freqs = list(fs/time_steps)  #interpolate
 
     # plt.plot(wfmtime, sig, color='red', label='Original')
     # plt.plot(wfmtime, sig_ff, color='blue', label='Filtered data')
@@ -208,6 +229,104 @@ def freq_from_crossings(wfmtime, sig, fs):
     return avg_freq, freqs
 
 
+class FreqTracker(object):
+    """
+    Streaming per-cycle frequency estimator.
+
+    Waveform samples are processed in chunks of any size with process(). Each chunk is filtered with a causal lowpass
+    (second order sections, with the filter state carried between chunks) and the rising zero crossings are located by
+    linear interpolation, including crossings that span chunks. A frequency is produced for each complete cycle, at
+    the time midway between its crossings, so a record is processed once however it is divided.
+
+    The filter delay at the nominal frequency is removed from the crossing times. Crossings closer than half a
+    nominal cycle to the previous crossing are taken to be noise and ignored.
+
+    fs - sample rate (Hz).
+    t_start - time of the first sample (secs).
+    f_nom - nominal frequency (Hz).
+    order, cutoff - lowpass filter order and cutoff, as in lowpass_filter().
+    """
+
+    def __init__(self, fs, t_start=0., f_nom=60., order=4, cutoff=60.):
+        self.fs = float(fs)
+        self.t_start = float(t_start)
+        self.f_nom = float(f_nom)
+        self.sos = lowpass_filter(self.fs, order=order, cutoff=cutoff, output='sos')
+        # phase delay of the filter at the nominal frequency (samples)
+        w = 2*math.pi*self.f_nom/self.fs
+        _, h = signal.sosfreqz(self.sos, worN=[w])
+        self.delay = -np.angle(h[0])/w
+        self.min_period = 0.5*self.fs/self.f_nom
+        self.reset()
+
+    def reset(self):
+        self.zi = None
+        self.count = 0              # samples processed
+        self.last = None            # last filtered sample
+        self.last_cross = None      # last crossing (fractional sample index)
+        self.times = []
+        self.freqs = []
+
+    def process(self, x):
+        """
+        Process the next chunk of samples. Returns (times, freqs) arrays of the cycles completed in the chunk.
+        """
+        x = np.asarray(x, dtype=float)
+        if len(x) == 0:
+            return np.array([]), np.array([])
+        if self.zi is None:
+            # start the filter in steady state at the first sample to limit the start transient
+            self.zi = signal.sosfilt_zi(self.sos) * x[0]
+        y, self.zi = signal.sosfilt(self.sos, x, zi=self.zi)
+
+        # join the last sample of the previous chunk so crossings between chunks are found
+        if self.last is not None:
+            y = np.concatenate(([self.last], y))
+            base = self.count - 1
+        else:
+            base = self.count
+        self.count += len(x)
+        self.last = y[-1]
+
+        indices = np.nonzero(np.logical_and(y[1:] >= 0., y[:-1] < 0.))[0]
+        crossings = base + indices - y[indices]/(y[indices + 1] - y[indices])
+
+        times = []
+        freqs = []
+        for c in crossings:
+            if self.last_cross is not None:
+                period = c - self.last_cross
+                if period < self.min_period:
+                    continue
+                times.append(self.t_start + ((self.last_cross + c)/2 - self.delay)/self.fs)
+                freqs.append(self.fs/period)
+            self.last_cross = c
+        self.times.extend(times)
+        self.freqs.extend(freqs)
+        return np.array(times), np.array(freqs)
+
+
+def freq_per_cycle(ds, point='AC_V_1', chunk_size=65536, f_nom=60.):
+    """
+    Return a dataset with the per-cycle frequency ('TIME', 'AC_FREQ') of the waveform point of a waveform capture
+    dataset, processing the capture in chunks with a FreqTracker. The sample rate is taken from the dataset sample_rate
+    or, if not set, the 'TIME' point.
+    """
+    t = ds.data[ds.points.index('TIME')] if 'TIME' in ds.points else None
+    fs = ds.sample_rate
+    if not fs:
+        if t is None or len(t) < 2:
+            raise ValueError('Waveform sample rate not available')
+        fs = (len(t) - 1)/(t[-1] - t[0])
+    t_start = t[0] if t is not None and len(t) > 0 else 0.
+    tracker = FreqTracker(fs, t_start=t_start, f_nom=f_nom)
+    x = ds.data[ds.points.index(point)]
+    for i in xrange(0, len(x), chunk_size):
+        tracker.process(x[i:i + chunk_size])
+    return dataset.Dataset(points=['TIME', 'AC_FREQ'], data=[list(tracker.times), list(tracker.freqs)],
+                           sample_rate=None)
+
+
 def calculateRMS(data):
     ######################################################################
     #   calculates the RMS data of the given array
@@ -0,0 +1,147 @@
+"""
+Tests of the checkpoint and resume of test scripts.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import checkpoint
+
+
+class Param(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class ParamGroup(object):
+
+    def __init__(self, params=None, param_groups=None):
+        self.params = params or []
+        self.param_groups = param_groups or []
+
+
+class Script(object):
+    """
+    Minimal test script with a results directory and parameter values.
+    """
+
+    def __init__(self, results_dir, param_values):
+        self._results_dir = results_dir
+        self.param_values = param_values
+        self.info = ParamGroup(param_groups=[ParamGroup([Param(name)]) for name in sorted(param_values)])
+        self.results = []
+
+    def log(self, msg):
+        pass
+
+    def param_value(self, name):
+        return self.param_values.get(name)
+
+    def result_file_path(self, name):
+        return os.path.join(self._results_dir, name)
+
+    def result_file(self, name):
+        self.results.append(name)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'Checkpoints', 'test.ckpt')
+        self.values = {'checkpoint.mode': 'Enabled', 'vv.n_r': 3}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_dir(self, name):
+        d = os.path.join(self.dir, name)
+        os.makedirs(d)
+        return d
+
+    def checkpoint(self, ts):
+        return checkpoint.Checkpoint(ts, self.filename, params=checkpoint.params_hash(ts))
+
+    def first_run(self, steps):
+        ts = Script(self.run_dir('run1'), dict(self.values))
+        cp = self.checkpoint(ts)
+        for step in steps:
+            name = 'VV_%s_%s.csv' % step
+            f = open(ts.result_file_path(name), 'w')
+            f.write('%s\n' % (name))
+            f.close()
+            cp.complete(step, [name])
+        # interrupted, the checkpoint is not completed
+        cp.close(complete=False)
+
+    def test_resume(self):
+        self.first_run([('active', 1), ('active', 2)])
+        ts = Script(self.run_dir('run2'), dict(self.values))
+        cp = self.checkpoint(ts)
+        self.assertTrue(cp.restore(('active', 1)))
+        self.assertTrue(cp.restore(('active', 2)))
+        self.assertFalse(cp.restore(('reactive', 1)))
+        self.assertEqual(ts.results, ['VV_active_1.csv', 'VV_active_2.csv'])
+        f = open(ts.result_file_path('VV_active_2.csv'))
+        self.assertEqual(f.read(), 'VV_active_2.csv\n')
+        f.close()
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+        cp.close()
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_resume_records_new_location(self):
+        self.first_run([('active', 1)])
+        ts = Script(self.run_dir('run2'), dict(self.values))
+        cp = self.checkpoint(ts)
+        cp.restore(('active', 1))
+        cp.close(complete=False)
+        # the first run results may be removed once they are copied to the second run
+        shutil.rmtree(os.path.join(self.dir, 'run1'))
+        ts = Script(self.run_dir('run3'), dict(self.values))
+        self.assertTrue(self.checkpoint(ts).restore(('active', 1)))
+
+    def test_params_changed(self):
+        self.first_run([('active', 1)])
+        values = dict(self.values)
+        values['vv.n_r'] = 1
+        ts = Script(self.run_dir('run2'), values)
+        cp = self.checkpoint(ts)
+        self.assertFalse(cp.done(('active', 1)))
+        self.assertFalse(cp.restore(('active', 1)))
+        self.assertEqual(ts.results, [])
+
+    def test_partial_line(self):
+        self.first_run([('active', 1), ('active', 2)])
+        # interrupted while writing the last entry
+        f = open(self.filename, 'r')
+        text = f.read()
+        f.close()
+        f = open(self.filename, 'w')
+        f.write(text[:-10])
+        f.close()
+        cp = self.checkpoint(Script(self.run_dir('run2'), dict(self.values)))
+        self.assertTrue(cp.done(('active', 1)))
+        self.assertFalse(cp.done(('active', 2)))
+
+    def test_interrupted_rewrite(self):
+        self.first_run([('active', 1)])
+        # interrupted after removing the old checkpoint, before renaming the rewrite
+        os.rename(self.filename, self.filename + '.tmp')
+        cp = self.checkpoint(Script(self.run_dir('run2'), dict(self.values)))
+        self.assertTrue(cp.done(('active', 1)))
+
+    def test_param_names(self):
+        group = ParamGroup([Param('a')], [ParamGroup([Param('b')], [ParamGroup([Param('c')])])])
+        self.assertEqual(checkpoint.param_names(group), ['a', 'b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+"""
+Tests of the time lookups and slices of dataset.Dataset.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import dataset
+
+
+class TestSliceTime(unittest.TestCase):
+
+    def test_slice_sample_rate(self):
+        ds = dataset.Dataset(['V'], [[float(i) for i in range(10)]], sample_rate=2.)
+        s = ds.slice_time(1., 2.5)
+        self.assertEqual(s.times().tolist(), [1., 1.5, 2., 2.5])
+        self.assertEqual(s.array('V').tolist(), [2., 3., 4., 5.])
+
+    def test_slice_start_time(self):
+        ds = dataset.Dataset(['V'], [[float(i) for i in range(10)]], start_time=10., sample_rate=2.)
+        s = ds.slice_time(11., 12.)
+        self.assertEqual(s.times().tolist(), [11., 11.5, 12.])
+
+    def test_slice_time_point(self):
+        ds = dataset.Dataset(['TIME', 'V'], [[0., .1, .3, .6, 1.], [1., 2., 3., 4., 5.]])
+        s = ds.slice_time(.1, .6)
+        self.assertEqual(s.times().tolist(), [.1, .3, .6])
+        self.assertEqual(s.array('V').tolist(), [2., 3., 4.])
+
+    def test_slice_trigger_sample(self):
+        ds = dataset.Dataset(['V'], [[float(i) for i in range(10)]], sample_rate=1., trigger_sample=5)
+        self.assertEqual(ds.slice_time(3.).trigger_sample, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Tests of the as-of join and clock offset estimation of datasets.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import math
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import numpy as np
+
+import dataset
+import dataset_align
+
+
+def signal(t):
+    # power steps with a ramp, not periodic within the offsets searched
+    return np.where(t < 3., 1000., 500.) + 100. * np.sin(t * t)
+
+
+class TestAsofJoin(unittest.TestCase):
+
+    def setUp(self):
+        self.base = dataset.Dataset(['TIME', 'AC_P'], [[0., 1., 2., 3.], [10., 11., 12., 13.]])
+        self.other = dataset.Dataset(['TIME', 'W'], [[.4, 1.6, 2.], [1., 2., 3.]])
+
+    def test_backward(self):
+        ds = dataset_align.asof_join(self.base, [self.other])
+        self.assertEqual(ds.points, ['TIME', 'AC_P', 'W'])
+        w = ds.array('W')
+        self.assertTrue(math.isnan(w[0]))
+        self.assertEqual(w[1:].tolist(), [1., 3., 3.])
+
+    def test_forward(self):
+        ds = dataset_align.asof_join(self.base, [self.other], direction=dataset_align.DIRECTION_FORWARD)
+        w = ds.array('W')
+        self.assertEqual(w[:3].tolist(), [1., 2., 3.])
+        self.assertTrue(math.isnan(w[3]))
+
+    def test_nearest_tolerance(self):
+        ds = dataset_align.asof_join(self.base, [self.other], direction=dataset_align.DIRECTION_NEAREST,
+                                     tolerance=.45)
+        w = ds.array('W')
+        # 1.0 is equally near 0.4 and 1.6, the earlier sample is matched and is outside the tolerance
+        self.assertEqual([0 if math.isnan(v) else v for v in w.tolist()], [1., 0, 3., 0])
+
+    def test_offset_prefix(self):
+        ds = dataset_align.asof_join(self.base, [self.other], offsets=[1.], prefixes=['EUT_'])
+        self.assertEqual(ds.points, ['TIME', 'AC_P', 'EUT_W'])
+        # other times 1.4, 2.6 and 3.0 in the base time
+        w = ds.array('EUT_W')
+        self.assertTrue(math.isnan(w[1]))
+        self.assertEqual(w[2:].tolist(), [1., 3.])
+
+    def test_name_suffix(self):
+        other = dataset.Dataset(['TIME', 'AC_P'], [[0., 2.], [1., 2.]])
+        ds = dataset_align.asof_join(self.base, [other])
+        self.assertEqual(ds.points, ['TIME', 'AC_P', 'AC_P_1'])
+        self.assertEqual(ds.array('AC_P_1').tolist(), [1., 1., 2., 2.])
+
+    def test_unsorted(self):
+        other = dataset.Dataset(['TIME', 'W'], [[2., .4, 1.6], [3., 1., 2.]])
+        ds = dataset_align.asof_join(self.base, [other])
+        self.assertEqual(ds.array('W')[1:].tolist(), [1., 3., 3.])
+
+    def test_unknown_direction(self):
+        self.assertRaises(dataset_align.AlignError, dataset_align.asof_join, self.base, [self.other],
+                          direction='sideways')
+
+
+class TestEstimateOffset(unittest.TestCase):
+
+    def test_offset(self):
+        t_ref = np.arange(0., 6., .01)
+        ref = dataset.Dataset(['TIME', 'AC_P'], [t_ref.tolist(), signal(t_ref).tolist()])
+        # EUT clock 0.37 secs behind the reference, sampled at a different rate
+        t_ds = np.arange(.5, 5.5, .02)
+        ds = dataset.Dataset(['TIME', 'W'], [(t_ds - .37).tolist(), signal(t_ds).tolist()])
+        offset, score = dataset_align.estimate_offset(ref, 'AC_P', ds, 'W', max_offset=1.)
+        self.assertAlmostEqual(offset, .37, delta=.01)
+        self.assertTrue(score > .99)
+
+    def test_constant(self):
+        t = np.arange(0., 2., .1)
+        ref = dataset.Dataset(['TIME', 'AC_P'], [t.tolist(), [1.] * len(t)])
+        self.assertRaises(dataset_align.AlignError, dataset_align.estimate_offset, ref, 'AC_P', ref, 'AC_P')
+
+
+if __name__ == '__main__':
+    unittest.main()
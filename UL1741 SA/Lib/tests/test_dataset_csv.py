@@ -0,0 +1,100 @@
+"""
+Tests of the bulk CSV parsing of dataset.Dataset.from_csv() against the per-value loader it replaced.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import dataset
+
+
+def old_from_csv(filename, sep=','):
+    """
+    The per-value Dataset.from_csv() loader before bulk parsing, returning (points, data).
+    """
+    f = open(filename, 'r')
+    ids = None
+    while ids is None:
+        line = f.readline().strip()
+        if len(line) > 0 and line[0] != '#':
+            ids = [e.strip() for e in line.split(sep)]
+    ds = dataset.Dataset(ids)
+    for line in f:
+        data = [float(e.strip()) for e in line.split(sep)]
+        if len(data) > 0:
+            ds.append(data)
+    f.close()
+    return ds.points, ds.data
+
+
+def load(loader, filename, sep=','):
+    try:
+        return loader(filename, sep)
+    except ValueError:
+        return ValueError
+    except dataset.DatasetError:
+        return dataset.DatasetError
+
+
+def new_from_csv(filename, sep=',', chunk_size=None):
+    ds = dataset.Dataset()
+    ds.from_csv(filename, sep=sep, chunk_size=chunk_size)
+    return ds.points, ds.data
+
+
+class TestFromCsv(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'data.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, text, sep=','):
+        f = open(self.filename, 'w')
+        f.write(text)
+        f.close()
+        # compared as repr so nan values compare equal
+        expected = repr(load(old_from_csv, self.filename, sep))
+        self.assertEqual(repr(load(new_from_csv, self.filename, sep)), expected, repr(text))
+        self.assertEqual(repr(load(lambda fn, s: new_from_csv(fn, s, chunk_size=7), self.filename, sep)), expected,
+                         repr(text))
+
+    def test_numbers(self):
+        self.check('TIME, A, B\n0, 1.5, -2\n0.1, 1e3, +.5\n0.2,  7. ,\t-3.25E-2\r\n')
+        self.check('# comment\n\nTIME,A\n1,2\n3,4\n')
+        self.check('TIME\tA\n1\t2\n3\t 4\n', sep='\t')
+
+    def test_blank_fields(self):
+        for text in ['T,A,B\n4, ,6\n', 'T,A\n1, \n', 'T,A\n3,\t\n', 'T,A\n1,\n', 'T,A\n,1\n', 'T,A\n1,2\n\n3,4\n']:
+            self.check(text)
+
+    def test_invalid_numbers(self):
+        for field in ['0+', '7+90', '1 2', 'e5', '1e', '1e+', '.', '+.', '1.2.3', '1e5.3', '--1', '+', '1-',
+                      '0x10', 'nan', 'inf', '1,5']:
+            self.check('T,A\n1,2\n3,%s\n' % (field))
+
+    def test_random_fields(self):
+        rand = random.Random(1)
+        chars = '0123456789+-.eE \t..ee+ '
+        for n in range(300):
+            lines = []
+            for r in range(rand.randint(1, 4)):
+                fields = [''.join(rand.choice(chars) for k in range(rand.randint(0, 6))) for c in range(2)]
+                if rand.random() < .5:
+                    fields = [repr(rand.uniform(-1e3, 1e3)) for c in range(2)]
+                lines.append(','.join(fields))
+            self.check('T,A\n' + '\n'.join(lines) + '\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Tests of the chunked, compressed dataset file storage.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import math
+import random
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import dataset
+import dataset_store
+
+
+def capture(rows, seed=0):
+    """
+    Dataset of a sampled capture with a TIME point, 100 samples/sec.
+    """
+    r = random.Random(seed)
+    t = [i * .01 for i in range(rows)]
+    v = [240. + 10. * math.sin(x) + r.gauss(0, .1) for x in t]
+    p = [float(int(x)) * 100. for x in t]
+    return dataset.Dataset(['TIME', 'AC_V_1', 'AC_P_1'], [t, v, p])
+
+
+class TestDatasetStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'capture.sds')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        ds = capture(1000)
+        dataset_store.save(ds, self.filename, chunk_size=128)
+        loaded = dataset_store.load(self.filename)
+        self.assertEqual(loaded.points, ds.points)
+        self.assertEqual(loaded.data, ds.data)
+
+    def test_codecs(self):
+        ds = capture(300)
+        for codec in [dataset_store.CODEC_AUTO, 'none:zlib', 'shuffle:bz2', 'delta:zlib', 'delta+shuffle:zlib']:
+            ds.data[1][10] = float('NaN')
+            dataset_store.save(ds, self.filename, chunk_size=64, codec=codec)
+            loaded = dataset_store.load(self.filename)
+            self.assertTrue(math.isnan(loaded.data[1][10]))
+            # NaN is not equal to itself
+            loaded.data[1][10] = ds.data[1][10] = 0.
+            self.assertEqual(loaded.data, ds.data, codec)
+
+    def test_json_values(self):
+        ds = dataset.Dataset(['TIME', 'SC_1'], [[0., 1., 2., 3.], [None, True, 'a', 1.5]])
+        dataset_store.save(ds, self.filename)
+        self.assertEqual(dataset_store.load(self.filename).data, ds.data)
+
+    def test_range_read(self):
+        ds = capture(1000)
+        dataset_store.save(ds, self.filename, chunk_size=100)
+        loaded = dataset_store.load(self.filename, t0=2.505, t1=4.5, points=['TIME', 'AC_V_1'])
+        expected = ds.slice_time(2.505, 4.5, points=['TIME', 'AC_V_1'])
+        self.assertEqual(loaded.points, ['TIME', 'AC_V_1'])
+        self.assertEqual(loaded.data, [column.tolist() for column in expected.data])
+
+    def test_range_read_chunks(self):
+        ds = capture(1000)
+        dataset_store.save(ds, self.filename, chunk_size=100)
+        reader = dataset_store.DatasetReader(self.filename)
+        try:
+            self.assertEqual(reader.rows, 1000)
+            self.assertEqual(reader.select_chunks('TIME', 2.505, 4.5), [2, 3, 4])
+            # chunks with any active power at or above 800
+            self.assertEqual(reader.select_chunks('AC_P_1', lo=800.), [8, 9])
+            self.assertEqual(reader.read(t0=9.5, t1=20.).data[0], ds.data[0][950:])
+        finally:
+            reader.close()
+
+    def test_range_read_sample_rate(self):
+        ds = dataset.Dataset(['AC_V_1'], [[float(i) for i in range(50)]], start_time=10., sample_rate=10.,
+                             trigger_sample=25)
+        dataset_store.save(ds, self.filename, chunk_size=16)
+        loaded = dataset_store.load(self.filename, t0=12., t1=13.)
+        self.assertEqual(loaded.data[0], [float(i) for i in range(20, 31)])
+        self.assertEqual(loaded.start_time, 12.)
+        self.assertEqual(loaded.trigger_sample, 5)
+        self.assertEqual(loaded.times().tolist(), ds.times()[20:31].tolist())
+
+    def test_save_csv(self):
+        ds = capture(500)
+        csv_filename = os.path.join(self.dir, 'capture.csv')
+        ds.to_csv(csv_filename)
+        dataset_store.save_csv(csv_filename, self.filename, chunk_size=64)
+        expected = dataset.Dataset()
+        expected.from_csv(csv_filename)
+        self.assertEqual(dataset_store.load(self.filename).data, expected.data)
+
+    def test_incomplete_file(self):
+        dataset_store.save(capture(100), self.filename)
+        f = open(self.filename, 'r+b')
+        f.truncate(os.path.getsize(self.filename) - 4)
+        f.close()
+        self.assertRaises(dataset_store.DatasetStoreError, dataset_store.DatasetReader, self.filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
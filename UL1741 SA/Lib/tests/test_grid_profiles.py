@@ -0,0 +1,134 @@
+"""
+Tests of the grid profile evaluation and of the overlay of the commanded profile on a DAS capture.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import tempfile
+import shutil
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import numpy as np
+
+import dataset
+import vclock
+import grid_profiles
+
+# the DAS module scans the DAS drivers, which need the SVP script module
+try:
+    import das
+except Exception, e:
+    das = None
+
+# step from 100% to 50% voltage 1.0 seconds after the profile start
+step_profile = [
+    (0, 100, 100, 100, 100),
+    (1.0, 100, 100, 100, 100),
+    (1.0, 50, 50, 50, 100),
+    (3.0, 50, 50, 50, 100)
+]
+
+
+class Script(object):
+    """
+    Minimal test script with its sleep and timers bound to a virtual clock.
+    """
+
+    def __init__(self, results_dir):
+        self._results_dir = results_dir
+
+    def log(self, msg):
+        pass
+
+
+class ProfileDevice(object):
+    """
+    DAS device measuring the commanded profile voltage at the clock time of each read.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.start_time = None
+        self.data_points = ['TIME', 'AC_VRMS_1']
+
+    def data_capture(self, enable=True):
+        pass
+
+    def data_read(self):
+        t = vclock.time()
+        v = 100.
+        if self.start_time is not None:
+            v = float(self.profile.voltage(t - self.start_time)[0])
+        return [t, v]
+
+
+class ProfileDAS(das.DAS if das is not None else object):
+
+    def __init__(self, ts, device):
+        das.DAS.__init__(self, ts, 'das', sc_points=[])
+        self.device = device
+        self.data_points = list(device.data_points)
+        self.sample_interval = 100
+        self._init_sc_points()
+
+
+class TestGridProfile(unittest.TestCase):
+
+    def test_evaluate_step(self):
+        profile = grid_profiles.GridProfile(step_profile, v_nom=240.)
+        v = profile.voltage([0., .99, 1., 2.5, 5.])[:, 0]
+        self.assertEqual(v.tolist(), [240., 240., 120., 120., 120.])
+
+    def test_evaluate_ramp(self):
+        profile = grid_profiles.GridProfile([(0, 100, 100, 100, 100), (2, 100, 100, 100, 102)], f_nom=60.)
+        self.assertAlmostEqual(float(profile.freq(1.)), 60.6)
+
+    def test_overlay_points_not_shared(self):
+        points = ['TIME', 'AC_VRMS_1']
+        ds = dataset.Dataset(points, [[0., 1.], [1., 1.]])
+        grid_profiles.GridProfile(step_profile).overlay(ds)
+        self.assertEqual(points, ['TIME', 'AC_VRMS_1'])
+        self.assertEqual(ds.points, ['TIME', 'AC_VRMS_1'] + grid_profiles.PROFILE_POINTS)
+
+
+@unittest.skipIf(das is None, 'DAS module requires the SVP script module')
+class TestCaptureOverlay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved = vclock.clock
+        self.ts = Script(self.tmp_dir)
+        vclock.bind(self.ts, vclock.VirtualClock(start=1000.))
+
+    def tearDown(self):
+        vclock.clock = self.saved
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_overlay_step_edge(self):
+        profile = grid_profiles.GridProfile(step_profile)
+        device = ProfileDevice(profile)
+        daq = ProfileDAS(self.ts, device)
+        daq.data_capture(True)
+        # profile started part way through a sample interval after the capture is enabled
+        self.ts.sleep(.25)
+        device.start_time = start_time = vclock.time()
+        self.ts.sleep(3.)
+        daq.data_capture(False)
+        ds = daq.data_capture_dataset()
+        self.assertEqual(daq.first_sample_time, 1000.1)
+
+        profile.overlay(ds, t_offset=start_time - daq.first_sample_time)
+        measured = ds.array('AC_VRMS_1')
+        commanded = np.asarray(ds.data[ds.points.index('PROFILE_V_1')])
+        # the overlay steps at the same sample as the measured voltage
+        edge = np.flatnonzero(measured < 100.)[0]
+        self.assertEqual(np.flatnonzero(commanded < 100.)[0], edge)
+        self.assertEqual(measured.tolist(), commanded.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Tests of the latency histograms and driver call instrumentation.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import instrument
+
+
+class Clock(object):
+    """
+    Clock advanced by the fake transport.
+    """
+
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class Transport(object):
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def write(self, data):
+        self.clock.now += .002
+
+
+class Driver(object):
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.device = Transport(clock)
+
+    def cmd(self, cmd_str):
+        self.clock.now += .001
+        self.device.write(cmd_str)
+
+    def query(self, cmd_str):
+        self.clock.now += .010
+        if cmd_str.startswith('BAD'):
+            raise IOError('timeout')
+        return '0'
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_bucket_ranges(self):
+        h = instrument.Histogram()
+        for value in [0, 1, 63, 64, 65, 127, 128, 1000, 123456, 2**39]:
+            lo, hi = h.bucket_range(h.index(value))
+            self.assertTrue(lo <= value <= hi, value)
+            # a bucket is at most 1/32 of its value wide
+            self.assertTrue(hi - lo <= max(lo, 1) / 32., value)
+
+    def test_percentiles(self):
+        h = instrument.Histogram()
+        values = range(1, 10001)
+        random.Random(0).shuffle(values)
+        for v in values:
+            h.record(v)
+        self.assertEqual(h.count, 10000)
+        self.assertEqual((h.min, h.max), (1, 10000))
+        self.assertEqual(h.mean(), 5000.5)
+        for pct in (50, 90, 99):
+            expected = pct * 100
+            p = h.percentile(pct)
+            self.assertTrue(expected <= p <= expected * 1.04, (pct, p))
+        self.assertEqual(h.percentile(100), 10000)
+
+    def test_small_values_exact(self):
+        h = instrument.Histogram()
+        for v in [5, 5, 7, 9]:
+            h.record(v)
+        self.assertEqual([h.percentile(p) for p in (25, 50, 75, 100)], [5, 5, 7, 9])
+
+    def test_empty(self):
+        h = instrument.Histogram()
+        self.assertEqual(h.percentile(50), None)
+        self.assertEqual(h.mean(), None)
+
+    def test_merge(self):
+        a = instrument.Histogram()
+        b = instrument.Histogram()
+        for v in range(100):
+            a.record(v)
+        for v in range(100, 1000):
+            b.record(v)
+        a.merge(b)
+        self.assertEqual((a.count, a.min, a.max), (1000, 0, 999))
+        self.assertRaises(instrument.InstrumentError, a.merge, instrument.Histogram(sub_bits=4))
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_wrap(self):
+        clock = Clock()
+        recorder = instrument.Instrumentation(clock=clock)
+        driver = recorder.wrap(Driver(clock), 'gridsim')
+        driver.cmd('SOUR:VOLT 120')
+        driver.cmd('SOUR:VOLT 240')
+        driver.query('SYST:ERR?')
+        self.assertRaises(IOError, driver.query, 'BAD?')
+        entries = dict((key, e) for key, e in recorder.entries.items())
+        # the transport write of a command is not counted again
+        self.assertEqual(sorted(entries), [('gridsim', 'cmd', 'SOUR:VOLT'), ('gridsim', 'query', 'BAD?'),
+                                           ('gridsim', 'query', 'SYST:ERR?')])
+        volt = entries[('gridsim', 'cmd', 'SOUR:VOLT')]
+        self.assertEqual(volt.hist.count, 2)
+        self.assertEqual(volt.hist.percentile(50), 3000)
+        self.assertEqual(entries[('gridsim', 'query', 'BAD?')].errors, 1)
+
+    def test_summary(self):
+        clock = Clock()
+        recorder = instrument.Instrumentation(clock=clock)
+        driver = recorder.wrap(Driver(clock), 'gridsim')
+        driver.cmd('OUTP ON')
+        driver.query('MEAS:VOLT?')
+        ds = recorder.summary()
+        # most total time first
+        self.assertEqual(ds.data[ds.points.index('COMMAND')], ['MEAS:VOLT?', 'OUTP'])
+        self.assertEqual(ds.data[ds.points.index('P50_MS')], [10., 3.])
+
+    def test_command_limit(self):
+        recorder = instrument.Instrumentation()
+        for i in range(instrument.MAX_COMMANDS + 10):
+            recorder.record('der', 'write', str(i), .001)
+        commands = [key[2] for key in recorder.entries]
+        self.assertEqual(len(commands), instrument.MAX_COMMANDS + 1)
+        self.assertEqual(recorder.entries[('der', 'write', instrument.OTHER)].hist.count, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
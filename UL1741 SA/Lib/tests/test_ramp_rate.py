@@ -0,0 +1,144 @@
+"""
+Tests of the streaming ramp rate estimator, fed directly and from a DAS capture in virtual time.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import dataset
+import vclock
+import ramp_rate
+
+
+def ramp(t, rate, t_start=1., level=0., target=100.):
+    """
+    Value (% of rated) of a ramp at rate %/sec starting at t_start.
+    """
+    return min(max(level + (t - t_start) * rate, level), target)
+
+
+class Script(object):
+
+    def log(self, msg):
+        pass
+
+
+class RampDAS(object):
+    """
+    DAS sampled by the caller (sample interval 0), recording the per phase power of a ramp at the clock time.
+    """
+
+    def __init__(self, rate, rated):
+        self.rate = rate
+        self.rated = rated
+        self.sample_interval = 0
+        self.t_start = vclock.time()
+        self.ds = dataset.Dataset(['TIME', 'AC_P_1', 'AC_P_2'])
+
+    def data_capture_dataset(self):
+        return self.ds
+
+    def data_sample(self):
+        t = vclock.time() - self.t_start
+        p = ramp(t, self.rate) * self.rated / 100.
+        self.ds.append([t, p/2, p/2])
+
+
+class TestRampRateEstimator(unittest.TestCase):
+
+    def feed(self, estimator, rate, t_end=20., dt=.1):
+        for i in range(int(t_end/dt) + 1):
+            t = i * dt
+            estimator.update(t, ramp(t, rate) * 10.)
+        return estimator
+
+    def test_linear_fit(self):
+        fit = ramp_rate.LinearFit()
+        for t in range(10):
+            fit.add(100. + t, 3. * t + 1.)
+        self.assertAlmostEqual(fit.slope(), 3.)
+        for t in range(5):
+            fit.remove(100. + t, 3. * t + 1.)
+        self.assertAlmostEqual(fit.slope(), 3.)
+
+    def test_compliant(self):
+        estimator = self.feed(ramp_rate.RampRateEstimator(1000., 10., 2., t_plateau=2.), 10.)
+        self.assertEqual(estimator.state, ramp_rate.RAMP_COMPLETE)
+        self.assertTrue(estimator.compliant, estimator.faults)
+        self.assertAlmostEqual(estimator.rate, 10., delta=.1)
+        self.assertAlmostEqual(estimator.rate_live_max, 10., delta=.1)
+        # ramp from leaving the 5% band to entering the band of the target
+        self.assertAlmostEqual(estimator.ramp_time(), 9., delta=.15)
+
+    def test_too_fast(self):
+        estimator = self.feed(ramp_rate.RampRateEstimator(1000., 10., 2., t_plateau=2.), 20.)
+        self.assertEqual(estimator.state, ramp_rate.RAMP_COMPLETE)
+        self.assertFalse(estimator.compliant)
+        self.assertEqual(len(estimator.faults), 2)
+
+    def test_too_slow(self):
+        estimator = self.feed(ramp_rate.RampRateEstimator(1000., 10., 2., t_plateau=2.), 5., t_end=15.)
+        self.assertEqual(estimator.state, ramp_rate.RAMP_ACTIVE)
+        # not complete within the time of a ramp at the lower limit (12.5 secs)
+        self.assertEqual(estimator.faults, ['ramp not complete within 12.50 secs'])
+
+    def test_no_ramp(self):
+        estimator = ramp_rate.RampRateEstimator(1000., 10., 2.)
+        for i in range(100):
+            estimator.update(i * .1, 20. + (i % 2))
+        self.assertEqual(estimator.state, ramp_rate.RAMP_WAIT)
+        self.assertEqual(estimator.ramp_time(), None)
+
+    def test_missing_values(self):
+        estimator = ramp_rate.RampRateEstimator(1000., 10., 2.)
+        estimator.update(0., None)
+        estimator.update(.1, float('nan'))
+        self.assertEqual(estimator.level, None)
+
+    def test_rated(self):
+        self.assertRaises(ramp_rate.RampRateError, ramp_rate.RampRateEstimator, 0, 10., 2.)
+
+
+class TestWaitRamp(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = vclock.clock
+        self.ts = Script()
+        vclock.bind(self.ts, vclock.VirtualClock(start=0.))
+
+    def tearDown(self):
+        vclock.clock = self.saved
+
+    def test_wait_ramp(self):
+        daq = RampDAS(10., 1000.)
+        estimator = ramp_rate.RampRateEstimator(1000., 10., 2., t_plateau=2.)
+        estimator.point = 'AC_P'
+        state = ramp_rate.wait_ramp(self.ts, daq, estimator, t_max=30., interval=.1)
+        self.assertEqual(state, ramp_rate.RAMP_COMPLETE)
+        self.assertTrue(estimator.compliant)
+        self.assertAlmostEqual(estimator.rate, 10., delta=.1)
+        # returns once the plateau is complete, not at t_max
+        self.assertTrue(vclock.time() < 14.)
+
+    def test_stop_on_fault(self):
+        daq = RampDAS(20., 1000.)
+        estimator = ramp_rate.RampRateEstimator(1000., 10., 2., t_plateau=2.)
+        estimator.point = 'AC_P'
+        state = ramp_rate.wait_ramp(self.ts, daq, estimator, t_max=30., stop_on_fault=True, interval=.1)
+        self.assertEqual(state, ramp_rate.RAMP_ACTIVE)
+        self.assertFalse(estimator.compliant)
+
+    def test_point_missing(self):
+        daq = RampDAS(10., 1000.)
+        estimator = ramp_rate.RampRateEstimator(1000., 10., 2.)
+        estimator.point = 'AC_Q'
+        self.assertRaises(ramp_rate.RampRateError, ramp_rate.wait_ramp, self.ts, daq, estimator, 1.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Tests of the append-oriented result file writer and the incremental result reader.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import result as rslt
+
+
+def child(i):
+    r = rslt.Result(name='Test %s' % (i), type='test', status='complete', params={'index': str(i)})
+    r.add_result(rslt.Result(name='Test %s Log' % (i), type='log', filename='test_%s.log' % (i)))
+    return r
+
+
+class TestResultWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'results.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, count, pretty_print=True, close=True):
+        root = rslt.Result(name='Suite', type='suite', status='active', params={'suite': 'SA13'})
+        writer = rslt.ResultWriter(self.filename, root, pretty_print=pretty_print)
+        for i in range(count):
+            writer.add(child(i))
+        if close:
+            root.status = 'complete'
+            writer.close()
+        return writer
+
+    def test_read(self):
+        for pretty_print in (True, False):
+            self.write(3, pretty_print=pretty_print)
+            root = rslt.read_result(self.filename, recover=False)
+            self.assertEqual((root.name, root.type, root.status), ('Suite', 'suite', 'complete'))
+            self.assertEqual(root.params, {'suite': 'SA13'})
+            self.assertEqual([r.name for r in root.results], ['Test 0', 'Test 1', 'Test 2'])
+            self.assertEqual(root.results[1].params, {'index': '1'})
+            self.assertEqual([r.filename for r in root.results[2].results], ['test_2.log'])
+
+    def test_complete_after_add(self):
+        # each add leaves a complete document
+        writer = self.write(2, close=False)
+        try:
+            root = rslt.read_result(self.filename, recover=False)
+            self.assertEqual(root.status, 'active')
+            self.assertEqual(len(root.results), 2)
+        finally:
+            writer.close()
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+
+    def test_iter_results(self):
+        self.write(4)
+        root = rslt.Result()
+        names = [r.name for r in rslt.iter_results(self.filename, root=root)]
+        self.assertEqual(names, ['Test 0', 'Test 1', 'Test 2', 'Test 3'])
+        self.assertEqual(root.name, 'Suite')
+
+    def test_recover(self):
+        self.write(3)
+        # interrupted part way through writing the last child
+        f = open(self.filename, 'rb')
+        xml = f.read()
+        f.close()
+        f = open(self.filename, 'wb')
+        f.write(xml[:xml.rfind('Test 2 Log')])
+        f.close()
+        names = [r.name for r in rslt.iter_results(self.filename)]
+        self.assertEqual(names, ['Test 0', 'Test 1'])
+        self.assertEqual(len(rslt.read_result(self.filename).results), 2)
+        self.assertRaises(rslt.ResultError, rslt.read_result, self.filename, recover=False)
+
+    def test_add_closed(self):
+        writer = self.write(1)
+        self.assertRaises(rslt.ResultError, writer.add, child(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Tests of the steady-state detector and of the adaptive dwell, run from a DAS capture in virtual time.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import math
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import dataset
+import vclock
+import steady_state
+
+
+class Script(object):
+
+    def log(self, msg):
+        pass
+
+
+class StepDAS(object):
+    """
+    DAS sampled by the caller (sample interval 0), recording a first order response to a step at the clock time.
+    """
+
+    def __init__(self, q_start, q_end, tau):
+        self.q_start = q_start
+        self.q_end = q_end
+        self.tau = tau
+        self.sample_interval = 0
+        self.t_start = vclock.time()
+        self.ds = dataset.Dataset(['TIME', 'AC_Q_1', 'AC_Q_2'])
+
+    def data_capture_dataset(self):
+        return self.ds
+
+    def data_sample(self):
+        t = vclock.time() - self.t_start
+        q = self.q_end + (self.q_start - self.q_end) * math.exp(-t/self.tau)
+        self.ds.append([t, q/2, q/2])
+
+
+class TestSteadyStateDetector(unittest.TestCase):
+
+    def detector(self, window=5):
+        detector = steady_state.SteadyStateDetector(['AC_Q'], [1.], window=window)
+        detector.bind(['TIME', 'AC_Q_1', 'AC_Q_2'])
+        return detector
+
+    def test_bind_phases(self):
+        detector = self.detector()
+        self.assertEqual(detector.indexes, [1, 2])
+        self.assertEqual(detector.point_tolerances, [1., 1.])
+        self.assertRaises(steady_state.SteadyStateError, detector.bind, ['TIME', 'AC_P'])
+
+    def test_steady(self):
+        detector = self.detector()
+        results = [detector.update([10. + .1 * (i % 2), 10.]) for i in range(6)]
+        # not steady until the window is full
+        self.assertEqual(results, [False, False, False, False, True, True])
+
+    def test_spread(self):
+        detector = self.detector()
+        results = [detector.update([10. + (i % 2), 10.]) for i in range(6)]
+        self.assertFalse(any(results))
+
+    def test_drift(self):
+        # the spread of a slow ramp is within the tolerance, its drift over the window is not
+        detector = self.detector(window=9)
+        results = [detector.update([.15 * i, 0.]) for i in range(12)]
+        self.assertFalse(any(results))
+
+    def test_missing_values(self):
+        detector = self.detector(window=2)
+        self.assertFalse(detector.update([None, 1.]))
+        self.assertFalse(detector.update([1., 1.]))
+        self.assertTrue(detector.update([1., 1.]))
+
+    def test_tolerance_mismatch(self):
+        self.assertRaises(steady_state.SteadyStateError, steady_state.SteadyStateDetector, ['AC_Q', 'AC_P'], [1.])
+
+
+class TestWaitSteadyState(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = vclock.clock
+        self.ts = Script()
+        vclock.bind(self.ts, vclock.VirtualClock(start=0.))
+
+    def tearDown(self):
+        vclock.clock = self.saved
+
+    def test_settles(self):
+        daq = StepDAS(0., 100., tau=1.)
+        detector = steady_state.SteadyStateDetector(['AC_Q'], [1.], window=10)
+        t_settle = steady_state.wait_steady_state(self.ts, daq, detector, t_max=20., interval=.1)
+        self.assertTrue(t_settle is not None)
+        # within 1% of the final value after about 4.6 time constants
+        self.assertTrue(3. < t_settle < 6., t_settle)
+        self.assertTrue(vclock.time() < 8.)
+
+    def test_t_min(self):
+        daq = StepDAS(100., 100., tau=1.)
+        detector = steady_state.SteadyStateDetector(['AC_Q'], [1.], window=5)
+        t_settle = steady_state.wait_steady_state(self.ts, daq, detector, t_max=20., t_min=3., interval=.1)
+        # without a DAS sample interval the settling time is the time the steady window is complete
+        self.assertAlmostEqual(t_settle, .4)
+        self.assertTrue(3. <= vclock.time() < 3.2)
+
+    def test_t_response(self):
+        # the values from before the step are not taken as the settled response
+        daq = StepDAS(100., 100., tau=1.)
+        detector = steady_state.SteadyStateDetector(['AC_Q'], [1.], window=5)
+        steady_state.wait_steady_state(self.ts, daq, detector, t_max=20., t_response=2., interval=.1)
+        self.assertTrue(vclock.time() >= 2.)
+
+    def test_not_settled(self):
+        daq = StepDAS(0., 100., tau=100.)
+        detector = steady_state.SteadyStateDetector(['AC_Q'], [.01], window=10)
+        self.assertEqual(steady_state.wait_steady_state(self.ts, daq, detector, t_max=5., interval=.1), None)
+        self.assertAlmostEqual(vclock.time(), 5.)
+
+
+if __name__ == '__main__':
+    unittest.main()
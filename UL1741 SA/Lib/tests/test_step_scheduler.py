@@ -0,0 +1,101 @@
+"""
+Tests of the absolute deadline step scheduler, run in virtual time.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import vclock
+import step_scheduler
+
+
+class Script(object):
+    """
+    Minimal test script with its sleep bound to a virtual clock.
+    """
+
+    def __init__(self):
+        self.logs = []
+
+    def log(self, msg):
+        self.logs.append(msg)
+
+
+class DAS(object):
+
+    def __init__(self):
+        self.sc = {'SC_STEP': 0, 'SC_STEP_TIME': 0}
+
+
+class TestStepScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = vclock.clock
+        self.ts = Script()
+        self.clock = vclock.VirtualClock(start=0.)
+        vclock.bind(self.ts, self.clock)
+        self.actions = []
+
+    def tearDown(self):
+        vclock.clock = self.saved
+
+    def action(self, value, duration=0.):
+        # commands take time, which is taken from the following wait
+        self.actions.append((value, vclock.time()))
+        self.clock.advance(duration)
+
+    def test_deadlines(self):
+        scheduler = step_scheduler.StepScheduler(self.ts)
+        scheduler.add(0, self.action, 'nom', .125)
+        scheduler.add(2, self.action, 'nom', .125)
+        scheduler.add(1, self.action, 'test', .25)
+        steps = scheduler.run(end=3)
+        self.assertEqual(self.actions, [('nom', 0.), ('test', 1.), ('nom', 2.)])
+        self.assertEqual([s.lateness for s in steps], [0., 0., 0.])
+        self.assertEqual(vclock.time(), 3.)
+        self.assertEqual(len(self.ts.logs), 3)
+
+    def test_equal_offsets(self):
+        scheduler = step_scheduler.StepScheduler(self.ts, log=False)
+        scheduler.add(1, self.action, 'a')
+        scheduler.add(1, self.action, 'b')
+        scheduler.add(0, self.action, 'c')
+        scheduler.run()
+        self.assertEqual([a[0] for a in self.actions], ['c', 'a', 'b'])
+        self.assertEqual(self.ts.logs, [])
+
+    def test_lateness(self):
+        scheduler = step_scheduler.StepScheduler(self.ts, log=False)
+        # the first action overruns the second step deadline
+        scheduler.add(0, self.action, 'a', 1.5)
+        scheduler.add(1, self.action, 'b')
+        scheduler.add(2, self.action, 'c')
+        steps = scheduler.run()
+        self.assertEqual([s.t_start for s in steps], [0., 1.5, 2.])
+        self.assertEqual(scheduler.lateness(), (.5, .5/3))
+
+    def test_lateness_not_run(self):
+        scheduler = step_scheduler.StepScheduler(self.ts)
+        scheduler.add(0, self.action, 'a')
+        self.assertEqual(scheduler.lateness(), (None, None))
+
+    def test_soft_channels(self):
+        daq = DAS()
+        scheduler = step_scheduler.StepScheduler(self.ts, daq=daq, log=False)
+        scheduler.add(0, self.action, 'a')
+        scheduler.add(.5, self.action, 'b')
+        scheduler.run()
+        self.assertEqual(daq.sc, {'SC_STEP': 1, 'SC_STEP_TIME': .5})
+
+    def test_negative_offset(self):
+        scheduler = step_scheduler.StepScheduler(self.ts)
+        self.assertRaises(step_scheduler.StepSchedulerError, scheduler.add, -1, self.action, 'a')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+Tests of the virtual clock timer ordering and of the virtual time mode selection.
+
+Run with: python -m unittest discover -s "UL1741 SA/Lib/tests"
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'svpelab'))
+
+import vclock
+
+
+class Param(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Info(object):
+
+    def __init__(self, names):
+        self.params = [Param(name) for name in names]
+        self.param_groups = []
+
+
+class Script(object):
+    """
+    Minimal test script with parameter values and a sleep that records its waits.
+    """
+
+    def __init__(self, param_values=None):
+        self.param_values = param_values or {}
+        self.info = Info(sorted(self.param_values))
+        self.sleeps = []
+
+    def log(self, msg):
+        pass
+
+    def param_value(self, name):
+        return self.param_values.get(name)
+
+    def sleep(self, secs):
+        self.sleeps.append(secs)
+
+
+class TestVirtualClock(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = vclock.clock
+
+    def tearDown(self):
+        vclock.clock = self.saved
+
+    def test_timer_order(self):
+        clock = vclock.VirtualClock(start=0.)
+        events = []
+        clock.timer_start(.3, lambda arg: events.append((arg, clock.time())), arg='c')
+        clock.timer_start(.1, lambda arg: events.append((arg, clock.time())), arg='a')
+        # timers due at the same time run in the order they were started
+        clock.timer_start(.3, lambda arg: events.append((arg, clock.time())), arg='d')
+        clock.timer_start(.2, lambda arg: events.append((arg, clock.time())), arg='b')
+        clock.sleep(1.)
+        self.assertEqual(events, [('a', .1), ('b', .2), ('c', .3), ('d', .3)])
+        self.assertEqual(clock.time(), 1.)
+
+    def test_repeating_timer(self):
+        clock = vclock.VirtualClock(start=0.)
+        times = []
+        timer = clock.timer_start(.25, lambda arg: times.append(clock.time()), repeating=True)
+        clock.sleep(1.)
+        clock.timer_cancel(timer)
+        clock.sleep(1.)
+        self.assertEqual(times, [.25, .5, .75, 1.])
+
+    def test_timer_not_due(self):
+        clock = vclock.VirtualClock(start=0.)
+        times = []
+        clock.timer_start(1.5, lambda arg: times.append(clock.time()))
+        clock.sleep(1.)
+        self.assertEqual(times, [])
+        clock.sleep(1.)
+        self.assertEqual(times, [1.5])
+
+    def test_sleep_in_timer(self):
+        clock = vclock.VirtualClock(start=0.)
+        times = []
+
+        def timeout(arg):
+            # a wait in a timer callback only moves the clock
+            clock.sleep(.125)
+            times.append(clock.time())
+        clock.timer_start(.25, timeout, repeating=True)
+        clock.sleep(.75)
+        self.assertEqual(times, [.375, .625, .875])
+        self.assertEqual(clock.time(), .875)
+
+    def test_bind(self):
+        ts = Script()
+        clock = vclock.VirtualClock(start=100.)
+        vclock.bind(ts, clock)
+        ts.sleep(5)
+        self.assertEqual(vclock.time(), 105.)
+        # the original sleep is called with a zero wait for the abort check
+        self.assertEqual(ts.sleeps, [0])
+
+    def test_bind_without_sleep(self):
+        ts = Info([])
+        vclock.bind(ts, vclock.VirtualClock(start=0.))
+        ts.sleep(1)
+        self.assertEqual(vclock.time(), 1.)
+
+
+class TestVclockInit(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = vclock.clock
+
+    def tearDown(self):
+        vclock.clock = self.saved
+
+    def test_real(self):
+        ts = Script({'vclock.mode': vclock.VCLOCK_REAL, 'gridsim.mode': 'Pacific'})
+        self.assertEqual(vclock.vclock_init(ts), None)
+        self.assertTrue(isinstance(vclock.clock, vclock.WallClock))
+
+    def test_virtual_simulators(self):
+        ts = Script({'vclock.mode': vclock.VCLOCK_VIRTUAL, 'gridsim.mode': 'Grid Simulator Simulation',
+                     'der.mode': 'Disabled', 'das_rms.mode': 'DAS Simulation'})
+        clock = vclock.vclock_init(ts)
+        self.assertTrue(isinstance(clock, vclock.VirtualClock))
+        self.assertTrue(vclock.clock is clock)
+
+    def test_virtual_hardware(self):
+        ts = Script({'vclock.mode': vclock.VCLOCK_VIRTUAL, 'gridsim.mode': 'Grid Simulator Simulation',
+                     'das_wf.mode': 'Sandia DSM'})
+        self.assertRaises(vclock.VirtualClockError, vclock.vclock_init, ts)
+        self.assertTrue(vclock.clock is self.saved)
+
+
+if __name__ == '__main__':
+    unittest.main()
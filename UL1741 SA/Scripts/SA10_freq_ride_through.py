@@ -7,12 +7,18 @@ from svpelab import loadsim
 from svpelab import pvsim
 from svpelab import das
 from svpelab import der
+from svpelab import vclock
+from svpelab import checkpoint
+from svpelab import instrument
+from svpelab import timeline
+from svpelab import step_scheduler
+from svpelab import grid_profiles
+from svpelab import waveform_analysis
 
 import sunspec.core.client as client
 
 import script
 import openpyxl
-import time
 
 def freq_rt_profile(v_nom=100.0, freq_nom=100.0, freq_t=100.0, t_fall=0, t_hold=1, t_rise=0, t_dwell=5, n=5):
     """
@@ -47,9 +53,16 @@ def freq_rt_profile(v_nom=100.0, freq_nom=100.0, freq_t=100.0, t_fall=0, t_hold=
 def test_run():
 
     result = script.RESULT_FAIL
-    eut = grid = load = pv = daq_rms = daq_wf = None
+    eut = grid = load = pv = daq_rms = daq_wf = cp = None
 
     try:
+        # bind waits and timers to the selected clock
+        vclock.vclock_init(ts)
+        # record instrument command latency, if enabled
+        instrument.instrument_init(ts)
+        # record a timeline trace of the test, if enabled
+        timeline.timeline_init(ts)
+
         test_label = ts.param('frt')
         # get test parameters
         freq_msa = ts.param_value('eut.freq_msa')
@@ -62,6 +75,8 @@ def test_run():
         freq_test = ts.param_value('frt.freq_test')
         t_hold = ts.param_value('frt.t_hold')
         n_r = ts.param_value('frt.n_r')
+        wfm_freq = ts.param_value('frt.wfm_freq')
+        wfm_sample_rate = ts.param_value('frt.wfm_sample_rate')
 
         # calculate voltage adjustment based on msa
         freq_msa_adj = freq_msa * 1.5
@@ -96,7 +111,7 @@ def test_run():
         pv.power_on()
 
         # initialize rms data acquisition
-        daq_rms = das.das_init(ts, 'das_rms')
+        daq_rms = das.das_init(ts, 'das_rms', sc_points=list(das.sc_points_default) + step_scheduler.sc_points)
         if daq_rms is not None:
             ts.log('DAS RMS device: %s' % (daq_rms.info()))
 
@@ -109,6 +124,9 @@ def test_run():
         eut = der.der_init(ts)
         eut.config()
 
+        # completed power levels of an earlier run of the test, if checkpoints are enabled
+        cp = checkpoint.checkpoint_init(ts)
+
         # perform all power levels
         for power_level in power_levels:
             # set test power level
@@ -118,47 +136,98 @@ def test_run():
             # delay to allow power change to take effect
             ts.sleep(5)
 
+            step = (power_level[1],)
+            if cp is not None and cp.restore(step):
+                continue
+            timeline.begin('step', step=list(step))
+            files = []
             if daq_rms is not None:
                 ts.log('Starting RMS data capture')
                 daq_rms.data_capture(True)
+            capture = None
+            if daq_wf is not None and wfm_freq == 'Enabled':
+                # capture the waveform of the whole sequence for the per-cycle frequency
+                t_test = (float(t_dwell) + float(t_hold)) * float(n_r) + float(t_dwell)
+                daq_wf.waveform_config({'sample_rate': wfm_sample_rate, 'pre_trigger': 0., 'post_trigger': t_test,
+                                        'trigger_level': 0., 'trigger_cond': 'Rising_Edge',
+                                        'trigger_channel': 'AC_V_1', 'timeout': 10., 'channels': ['AC_V_1']})
+                ts.log('Starting waveform capture')
+                try:
+                    capture = daq_wf.waveform_capture_arm()
+                except das.DASError, e:
+                    # the blocking capture would not start the test sequence until the capture completes
+                    ts.log_warning('Per-cycle frequency is not captured: %s' % (e))
 
             if profile_supported:
                 # create and execute test profile
-                profile = freq_rt_profile(v_nom=v_nom, freq_nom=freq_n/freq_nom, freq_t=freq_t/freq_nom, t_hold=t_hold,
-                                          t_dwell=t_dwell, n=n_r)
+                profile = freq_rt_profile(v_nom=100., freq_nom=freq_n/freq_nom*100., freq_t=freq_t/freq_nom*100.,
+                                          t_hold=t_hold, t_dwell=t_dwell, n=n_r)
                 grid.profile_load(profile=profile)
                 grid.profile_start()
                 # create countdown timer
-                start_time = time.time()
+                start_time = vclock.time()
                 profile_time = profile[-1][0]
                 ts.log('Profile duration is %s seconds' % profile_time)
-                while (time.time() - start_time) < profile_time:
-                    remaining_time = profile_time - (time.time()-start_time)
+                while (vclock.time() - start_time) < profile_time:
+                    remaining_time = profile_time - (vclock.time()-start_time)
                     ts.log('Sleeping for another %0.1f seconds' % remaining_time)
                     sleep_time = min(remaining_time, 10)
                     ts.sleep(sleep_time)
                 grid.profile_stop()
             else:
-                # execute test sequence
+                # execute test sequence, each frequency step at its absolute time from the sequence start
                 ts.log('Test duration is %s seconds' % ((float(t_dwell) + float(t_hold)) * float(n_r) +
                                                             float(t_dwell)))
+                scheduler = step_scheduler.StepScheduler(ts, daq=daq_rms)
+                t = 0.
                 for i in range(n_r):
-                    grid.freq(freq=freq_n)
-                    ts.log('Setting frequency: freq = %s for %s seconds' % (freq_n, t_dwell))
-                    ts.sleep(t_dwell)
-                    grid.voltage(freq=freq_t)
-                    ts.log('Setting frequency: freq = %s for %s seconds' % (freq_t, t_hold))
-                    ts.sleep(t_hold)
-                grid.freq(freq=freq_n)
-                ts.log('Setting frequency: freq = %s for %s seconds' % (freq_n, t_dwell))
-                ts.sleep(t_dwell)
+                    scheduler.add(t, grid.freq, freq_n, label='freq = %s for %s seconds' % (freq_n, t_dwell))
+                    t += t_dwell
+                    scheduler.add(t, grid.freq, freq_t, label='freq = %s for %s seconds' % (freq_t, t_hold))
+                    t += t_hold
+                scheduler.add(t, grid.freq, freq_n, label='freq = %s for %s seconds' % (freq_n, t_dwell))
+                scheduler.run(end=t + t_dwell)
+                late_max, late_mean = scheduler.lateness()
+                ts.log('Step lateness: max = %0.1f ms, mean = %0.1f ms' % (late_max * 1000, late_mean * 1000))
             if daq_rms is not None:
                 daq_rms.data_capture(False)
                 ds = daq_rms.data_capture_dataset()
+                if profile_supported:
+                    # add the commanded profile voltage and frequency for comparison with the measured values,
+                    # aligned on the clock time of the first captured sample
+                    t_first = daq_rms.first_sample_time if daq_rms.first_sample_time is not None else start_time
+                    grid_profiles.GridProfile(profile, v_nom=v_nom, f_nom=freq_nom).overlay(
+                        ds, t_offset=start_time - t_first, sample_interval=float(daq_rms.sample_interval)/1000)
                 filename = '%s_rms_%s.csv' % (test_label, power_level[1])
-                ds.to_csv(ts.result_file_path(filename))
+                with timeline.span('save', file=filename):
+                    ds.to_csv(ts.result_file_path(filename))
                 ts.result_file(filename)
+                files.append(filename)
                 ts.log('Saving data capture %s' % (filename))
+            if capture is not None:
+                ds = capture.result()
+                filename = '%s_wfm_%s.csv' % (test_label, power_level[1])
+                with timeline.span('save', file=filename):
+                    ds.to_csv(ts.result_file_path(filename))
+                ts.result_file(filename)
+                files.append(filename)
+                ts.log('Saving waveform capture %s' % (filename))
+                ds = waveform_analysis.freq_per_cycle(ds, 'AC_V_1', f_nom=freq_nom)
+                filename = '%s_freq_%s.csv' % (test_label, power_level[1])
+                with timeline.span('save', file=filename):
+                    ds.to_csv(ts.result_file_path(filename))
+                ts.result_file(filename)
+                files.append(filename)
+                freqs = ds.data[1]
+                if freqs:
+                    ts.log('Saving per-cycle frequency %s, %s cycles, min = %0.3f Hz, max = %0.3f Hz' %
+                           (filename, len(freqs), min(freqs), max(freqs)))
+            if cp is not None:
+                cp.complete(step, files)
+            timeline.end()
+
+        if cp is not None:
+            cp.close()
 
         result = script.RESULT_COMPLETE
 
@@ -167,6 +236,8 @@ def test_run():
         if reason:
             ts.log_error(reason)
     finally:
+        if cp is not None:
+            cp.close(complete=False)
         if eut is not None:
             eut.close()
         if grid is not None:
@@ -179,6 +250,8 @@ def test_run():
             daq_rms.close()
         if daq_wf is not None:
             daq_wf.close()
+        instrument.instrument_close(ts)
+        timeline.timeline_close(ts)
 
     return result
 
@@ -236,6 +309,9 @@ info.param('frt.freq_grid_max', label='Maximum grid frequency (Hz)', default=60.
 info.param('frt.p_100', label='Power Level 100% Tests', default='Enabled', values=['Disabled', 'Enabled'])
 info.param('frt.p_20', label='Power Level 20% Tests', default='Enabled', values=['Disabled', 'Enabled'])
 info.param('frt.n_r', label='Number of test repetitions', default=5)
+info.param('frt.wfm_freq', label='Waveform per-cycle frequency', default='Disabled', values=['Disabled', 'Enabled'])
+info.param('frt.wfm_sample_rate', label='Waveform sample rate (Hz)', default=10000., active='frt.wfm_freq',
+           active_value=['Enabled'])
 
 info.param_group('eut', label='EUT Parameters', glob=True)
 info.param('eut.p_rated', label='P_rated', default=3000)
@@ -246,6 +322,10 @@ info.param('eut.t_msa', label='T_msa', default=1.0)
 info.param('eut.frt_t_dwell', label='FRT T_dwell', default=5)
 
 der.params(info)
+vclock.params(info)
+checkpoint.params(info)
+instrument.params(info)
+timeline.params(info)
 das.params(info, 'das_rms', 'Data Acquisition (RMS)')
 das.params(info, 'das_wf', 'Data Acquisition (Waveform)')
 gridsim.params(info)
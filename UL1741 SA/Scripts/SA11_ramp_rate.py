@@ -37,7 +37,12 @@ from svpelab import gridsim
 from svpelab import pvsim
 from svpelab import das
 from svpelab import der
+from svpelab import vclock
+from svpelab import checkpoint
+from svpelab import instrument
+from svpelab import timeline
 from svpelab import loadsim
+from svpelab import ramp_rate
 
 import sunspec.core.client as client
 
@@ -56,8 +61,16 @@ def test_run():
     daq_rms = None
     daq_wf = None
     eut = None
+    cp = None
 
     try:
+        # bind waits and timers to the selected clock
+        vclock.vclock_init(ts)
+        # record instrument command latency, if enabled
+        instrument.instrument_init(ts)
+        # record a timeline trace of the test, if enabled
+        timeline.timeline_init(ts)
+
         v_nom = ts.param_value('eut.v_nom')
         i_rated = ts.param_value('eut.i_rated')
         i_low = ts.param_value('eut.i_low')
@@ -78,6 +91,7 @@ def test_run():
         n_r = ts.param_value('rr.n_r')
         v_trip = ts.param_value('rr.v_trip')
         t_reconnect = ts.param_value('rr.t_reconnect')
+        ramp_eval = ts.param_value('rr.ramp_eval') == 'Enabled'
 
         p_low = i_low * v_nom
         p_rated = i_rated * v_nom
@@ -117,6 +131,9 @@ def test_run():
         if eut is not None:
             eut.config()
 
+        # completed passes of an earlier run of the test, if checkpoints are enabled
+        cp = checkpoint.checkpoint_init(ts)
+
         if soft_start:
             test_str = 'ss'
         else:
@@ -138,6 +155,11 @@ def test_run():
                 sample_duration = duration + POWER_WAIT_DELAY
 
             for count in range(1, n_r + 1):
+                step = (rr, count)
+                if cp is not None and cp.restore(step):
+                    continue
+                timeline.begin('step', step=list(step))
+                files = []
                 if daq_rms is not None:
                     ts.log('Starting data capture %s' % (rr))
                     daq_rms.data_capture(True)
@@ -161,16 +183,36 @@ def test_run():
                 ts.log('Setting to I_rated: %s' % (i_rated))
                 pv.power_set(p_rated)
                 ts.log('Sampling for %s seconds' % (sample_duration))
-                ts.sleep(sample_duration)
+                if daq_rms is not None and ramp_eval:
+                    # evaluate the ramp as it is captured and stop sampling once the plateau is confirmed
+                    estimator = ramp_rate.estimator_init(daq_rms, 'AC_P', p_rated, rr, rr_msa, t_plateau=t_dwell)
+                    state = ramp_rate.wait_ramp(ts, daq_rms, estimator, t_max=sample_duration)
+                    if state != ramp_rate.RAMP_COMPLETE:
+                        ts.log_warning('Ramp not complete after %s seconds' % (sample_duration))
+                    if estimator.rate is not None:
+                        ts.log('Ramp rate = %0.2f%%/sec, ramp time = %0.2f seconds' %
+                               (estimator.rate, estimator.ramp_time()))
+                    for reason in estimator.faults:
+                        ts.log_warning('Ramp non-compliant: %s' % (reason))
+                else:
+                    ts.sleep(sample_duration)
                 if daq_rms is not None:
                     # Increase available input power to I_rated
                     ts.log('Sampling complete')
                     daq_rms.data_capture(False)
                     ds = daq_rms.data_capture_dataset()
                     filename = '%s_%s_%s.csv' % (test_str, str(int(rr)), str(count))
-                    ds.to_csv(ts.result_file_path(filename))
+                    with timeline.span('save', file=filename):
+                        ds.to_csv(ts.result_file_path(filename))
                     ts.result_file(filename)
+                    files.append(filename)
                     ts.log('Saving data capture %s' % (filename))
+                if cp is not None:
+                    cp.complete(step, files)
+                timeline.end()
+
+        if cp is not None:
+            cp.close()
 
         result = script.RESULT_COMPLETE
 
@@ -179,6 +221,8 @@ def test_run():
         if reason:
             ts.log_error(reason)
     finally:
+        if cp is not None:
+            cp.close(complete=False)
         if eut is not None:
             eut.close()
         if grid is not None:
@@ -191,6 +235,8 @@ def test_run():
             daq_rms.close()
         if daq_wf is not None:
             daq_wf.close()
+        instrument.instrument_close(ts)
+        timeline.timeline_close(ts)
 
     return result
 
@@ -226,6 +272,10 @@ info.param('rr.rr_max', label='Maximum Ramp Rate Test', default='Enabled', value
 info.param('rr.rr_mid', label='Medium Ramp Rate Test', default='Enabled', values=['Disabled', 'Enabled'])
 info.param('rr.rr_min', label='Minimum Ramp Rate Test', default='Enabled', values=['Disabled', 'Enabled'])
 info.param('rr.n_r', label='Number of test repetitions', default=3)
+info.param('rr.ramp_eval', label='Evaluate ramp during capture', default='Disabled',
+           values=['Disabled', 'Enabled'],
+           desc='Fit the ramp rate from the RMS capture as it is recorded and end the capture once the ramp is complete '
+                'and the output has held at rated power for T_dwell.')
 info.param('rr.soft_start', label='Perform Soft Start', default='Disabled', values=['Disabled', 'Enabled'])
 info.param('rr.v_trip', label='Trip Threshold (% V_nom)', default=140.0,
            active='rr.soft_start', active_value=['Enabled'])
@@ -242,6 +292,10 @@ info.param('eut.t_dwell', label='T_dwell', default=5.0)
 info.param('eut.rr_msa', label='RR_msa', default=5)
 
 der.params(info)
+vclock.params(info)
+checkpoint.params(info)
+instrument.params(info)
+timeline.params(info)
 das.params(info, 'das_rms', 'Data Acquisition (RMS)')
 das.params(info, 'das_wf', 'Data Acquisition (Waveform)')
 gridsim.params(info)
@@ -38,9 +38,30 @@ from svpelab import loadsim
 from svpelab import pvsim
 from svpelab import das
 from svpelab import der
+from svpelab import vclock
+from svpelab import checkpoint
+from svpelab import instrument
+from svpelab import timeline
+from svpelab import steady_state
 import script
 import openpyxl
 
+def sample_dwell(daq, t_dwell, detector=None, t_response=0):
+    """
+    Sample for t_dwell seconds or, if a steady state detector is supplied, until the response has settled. Samples
+    within t_response seconds of the start are not used for steady state detection.
+    """
+    if detector is None:
+        ts.log('Sampling for %s seconds' % (t_dwell))
+        ts.sleep(t_dwell)
+    else:
+        ts.log('Sampling until steady state, at most %s seconds' % (t_dwell))
+        t_settle = steady_state.wait_steady_state(ts, daq, detector, t_max=t_dwell, t_response=t_response)
+        if t_settle is None:
+            ts.log('Steady state not detected within %s seconds' % (t_dwell))
+        else:
+            ts.log('Steady state detected, settling time = %0.2f seconds' % (t_settle))
+
 def test_run():
 
     result = script.RESULT_FAIL
@@ -48,8 +69,16 @@ def test_run():
     pv = None
     daq = None
     eut = None
+    cp = None
 
     try:
+        # bind waits and timers to the selected clock
+        vclock.vclock_init(ts)
+        # record instrument command latency, if enabled
+        instrument.instrument_init(ts)
+        # record a timeline trace of the test, if enabled
+        timeline.timeline_init(ts)
+
         p_rated = ts.param_value('eut.p_rated')
         pf_min_ind = ts.param_value('eut.pf_min_ind')
         pf_min_cap = ts.param_value('eut.pf_min_cap')
@@ -74,6 +103,13 @@ def test_run():
         daq = das.das_init(ts)
         ts.log('DAS device: %s' % daq.info())
 
+        # end each dwell once the reactive power has settled, if adaptive dwell is enabled. The power factor itself
+        # is not used as it swings between -1 and 1 with small changes of reactive power near unity.
+        detector = None
+        if ts.param_value('spf.dwell') == 'Adaptive':
+            q_tol = p_rated * ts.param_value('spf.ss_q_tol')/100.
+            detector = steady_state.detector_init(daq, ['AC_Q'], [q_tol], t_window=ts.param_value('spf.ss_window'))
+
         '''
         3) Turn on the EUT. It is permitted to set all L/HVRT limits and abnormal voltage trip parameters to the
         widest range of adjustability possible with the SPF enabled in order not to cross the must trip
@@ -109,6 +145,9 @@ def test_run():
 
         n_r = ts.param_value('spf.n_r')
 
+        # completed passes of an earlier run of the test, if checkpoints are enabled
+        cp = checkpoint.checkpoint_init(ts)
+
         for pf in pf_targets:
             for power_level in power_levels:
                 '''
@@ -119,6 +158,11 @@ def test_run():
                 ts.log('*** Setting power level to %s W (rated power * %s)' % ((p_rated * power), power))
 
                 for count in range(1, n_r + 1):
+                    step = (pf, power_label, count)
+                    if cp is not None and cp.restore(step):
+                        continue
+                    timeline.begin('step', step=list(step))
+                    files = []
                     ts.log('Starting pass %s' % (count))
                     '''
                     6) Set the EUT power factor to unity. Measure the AC source voltage and EUT current to measure the
@@ -130,14 +174,15 @@ def test_run():
                     ts.log('PF setting: %s' % (pf_setting))
                     ts.log('Starting data capture for pf = %s' % (1.0))
                     daq.data_capture(True)
-                    ts.log('Sampling for %s seconds' % (pf_settling_time * 3))
-                    ts.sleep(pf_settling_time * 3)
+                    sample_dwell(daq, pf_settling_time * 3, detector, pf_settling_time)
                     ts.log('Sampling complete')
                     daq.data_capture(False)
                     ds = daq.data_capture_dataset()
                     filename = 'spf_1000_%s_%s.csv' % (str(power_label), str(count))
-                    ds.to_csv(ts.result_file_path(filename))
+                    with timeline.span('save', file=filename):
+                        ds.to_csv(ts.result_file_path(filename))
                     ts.result_file(filename)
+                    files.append(filename)
                     ts.log('Saving data capture %s' % (filename))
 
                     '''
@@ -152,16 +197,21 @@ def test_run():
                     ts.log('PF setting: %s' % (pf_setting))
                     ts.log('Starting data capture for pf = %s' % (pf))
                     daq.data_capture(True)
-                    ts.log('Sampling for %s seconds' % (pf_settling_time * 3))
-                    ts.sleep(pf_settling_time * 3)
+                    sample_dwell(daq, pf_settling_time * 3, detector, pf_settling_time)
                     ts.log('Sampling complete')
                     daq.data_capture(False)
                     ds = daq.data_capture_dataset()
                     filename = 'spf_%s_%s_%s.csv' % (str(pf * 1000), str(power_label), str(count))
-                    ds.to_csv(ts.result_file_path(filename))
+                    with timeline.span('save', file=filename):
+                        ds.to_csv(ts.result_file_path(filename))
                     ts.result_file(filename)
+                    files.append(filename)
                     ts.log('Saving data capture %s' % (filename))
 
+                    if cp is not None:
+                        cp.complete(step, files)
+                    timeline.end()
+
                     '''
                     8) Repeat steps (6) - (8) for two additional times for a total of three repetitions.
                     '''
@@ -177,6 +227,9 @@ def test_run():
         11) In the case of bi-directional inverters, repeat Steps (6) - (10) for the active power flow direction
         '''
 
+        if cp is not None:
+            cp.close()
+
         result = script.RESULT_COMPLETE
 
     except script.ScriptFail, e:
@@ -184,6 +237,8 @@ def test_run():
         if reason:
             ts.log_error(reason)
     finally:
+        if cp is not None:
+            cp.close(complete=False)
         if grid is not None:
             grid.close()
         if pv is not None:
@@ -192,6 +247,8 @@ def test_run():
             daq.close()
         if eut is not None:
             eut.close()
+        instrument.instrument_close(ts)
+        timeline.timeline_close(ts)
 
     return result
 
@@ -232,6 +289,13 @@ info.param('spf.pf_min_ind', label='Minimum inductive', default='Enabled', value
 info.param('spf.pf_mid_ind', label='Mid-range inductive', default='Enabled', values=['Disabled', 'Enabled'])
 info.param('spf.pf_min_cap', label='Minimum capacitive', default='Enabled', values=['Disabled', 'Enabled'])
 info.param('spf.pf_mid_cap', label='Mid-range capacitive', default='Enabled', values=['Disabled', 'Enabled'])
+info.param('spf.dwell', label='Sampling dwell', default='Fixed', values=['Fixed', 'Adaptive'],
+           desc='Fixed samples for 3 times the PF settling time. Adaptive ends sampling once the reactive power is '
+                'in steady state after the PF settling time, with 3 times the PF settling time as the maximum.')
+info.param('spf.ss_window', label='Steady state window (secs)', default=2.0,
+           active='spf.dwell', active_value=['Adaptive'])
+info.param('spf.ss_q_tol', label='Steady state reactive power tolerance (% of P_rated)', default=1.0,
+           active='spf.dwell', active_value=['Adaptive'])
 
 info.param_group('eut', label='EUT Parameters', glob=True)
 info.param('eut.p_rated', label='P_rated', default=3000)
@@ -240,6 +304,10 @@ info.param('eut.pf_min_cap', label='PF_min_cap', default=-.850)
 info.param('eut.pf_settling_time', label='PF Settling Time', default=1)
 
 der.params(info)
+vclock.params(info)
+checkpoint.params(info)
+instrument.params(info)
+timeline.params(info)
 das.params(info)
 gridsim.params(info)
 loadsim.params(info)
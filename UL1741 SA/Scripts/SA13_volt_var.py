@@ -38,6 +38,14 @@ from svpelab import gridsim
 from svpelab import pvsim
 from svpelab import das
 from svpelab import der
+from svpelab import vclock
+from svpelab import steady_state
+from svpelab import volt_var_analysis
+from svpelab import checkpoint
+from svpelab import instrument
+from svpelab import timeline
+from svpelab import step_scheduler
+from svpelab import dataset
 import script
 
 '''
@@ -76,14 +84,74 @@ def voltage_sample_points(v, segment_count=3):
     points.extend(segment_points(v[4], v[5], segment_count)[1:-1])
     return points
 
+def voltage_dwell(daq, t_settling, detector=None, t_response=0):
+    """
+    Wait t_settling seconds or, if a steady state detector is supplied, until the response has settled. Samples
+    within t_response seconds of the voltage step are not used for steady state detection.
+    """
+    if detector is None:
+        ts.sleep(t_settling)
+    else:
+        t_settle = steady_state.wait_steady_state(ts, daq, detector, t_max=t_settling, t_response=t_response)
+        if t_settle is None:
+            ts.log('        Steady state not detected within %0.1f seconds.' % (t_settling))
+        else:
+            ts.log('        Steady state detected, settling time = %0.2f seconds.' % (t_settle))
+
+def voltage_sweep(grid, daq, points, t_settling, detector=None, t_response=0):
+    """
+    Step the grid voltage through points. With a fixed dwell each step is set at its absolute time from the start of
+    the sweep, otherwise each step dwells until the response has settled.
+    """
+    if detector is None:
+        scheduler = step_scheduler.StepScheduler(ts, daq=daq)
+        for k, v in enumerate(points):
+            scheduler.add(k * t_settling, grid.voltage, v,
+                          label='grid voltage %0.2f for %0.1f seconds' % (v, t_settling))
+        scheduler.run(end=len(points) * t_settling)
+        late_max, late_mean = scheduler.lateness()
+        if late_max is not None:
+            ts.log('        Step lateness: max = %0.1f ms, mean = %0.1f ms' % (late_max * 1000, late_mean * 1000))
+    else:
+        for v in points:
+            ts.log('        Setting the grid voltage to %0.2f and waiting %0.1f seconds.' % (v, t_settling))
+            grid.voltage(v)
+            voltage_dwell(daq, t_settling, detector, t_response)
+
+def sweep_evaluate(results, ds, test_str, curve_v, curve_q, v_msa, var_msa, t_settling, voltage_points,
+                   sample_interval, s_rated=None, q_ref=None):
+    """
+    Evaluate a volt-var sweep capture against the programmed curve and log the result of each voltage step. With
+    active power priority, s_rated and q_ref scale the curve to the vars available at the measured active power.
+    """
+    m = volt_var_analysis.sweep_file_re.search('%s.csv' % (test_str))
+    result = volt_var_analysis.evaluate_dataset(ds, curve_v, curve_q, v_msa, var_msa, t_settling,
+                                                v_points=voltage_points, sample_interval=sample_interval,
+                                                s_rated=s_rated, q_ref=q_ref)
+    results.append(('%s.csv' % (test_str), m.group('priority'), int(m.group('test')), m.group('direction'),
+                    float(m.group('power')), int(m.group('sweep')), result))
+    for i in range(len(result['start'])):
+        ts.log('        V = %0.2f, Q = %0.2f, Q expected = %0.2f, settling time = %0.2f: %s' %
+               (result['v'][i], result['q'][i], result['q_exp'][i], result['settling_time'][i],
+                'Pass' if result['pass'][i] else 'Fail'))
+
+
 def test_run():
 
     result = script.RESULT_FAIL
     daq = None
+    cp = None
     pv = None
     grid = None
 
     try:
+        # bind waits and timers to the selected clock
+        vclock.vclock_init(ts)
+        # record instrument command latency, if enabled
+        instrument.instrument_init(ts)
+        # record a timeline trace of the test, if enabled
+        timeline.timeline_init(ts)
+
         # read test parameters
         tests_param = ts.param_value('eut.tests')
 
@@ -114,6 +182,8 @@ def test_run():
         except ValueError:
             k_var_min = None
         segment_point_count = ts.param_value('srd.vv_segment_point_count')
+        evaluate = ts.param_value('vv.evaluate') == 'Enabled'
+        eval_results = []
 
         # set power priorities to be tested
         power_priorities = []
@@ -239,7 +309,18 @@ def test_run():
         pv.power_on()
 
         # initialize data acquisition
-        daq = das.das_init(ts)
+        daq = das.das_init(ts, sc_points=list(das.sc_points_default) + step_scheduler.sc_points)
+
+        # completed sweeps of an earlier run of the test, if checkpoints are enabled
+        cp = checkpoint.checkpoint_init(ts)
+
+        # end each voltage step dwell once Q and V have settled, if adaptive dwell is enabled
+        detector = None
+        t_response = 0
+        if ts.param_value('vv.dwell') == 'Adaptive':
+            detector = steady_state.detector_init(daq, ['AC_Q', 'AC_VRMS'], [var_msa, v_msa],
+                                                  t_window=ts.param_value('vv.ss_window'))
+            t_response = min(ts.param_value('vv.t_response'), t_settling)
 
         '''
         3) Turn on the EUT. Set all L/HVRT parameters to the widest range of adjustability possible with the
@@ -265,6 +346,8 @@ def test_run():
                 v = tests[test][0]
                 q = tests[test][1]
                 voltage_points = voltage_sample_points(v, segment_point_count)
+                curve_v = v[1:5]
+                curve_q = q[1:5]
                 ts.log('Voltage test points = %s' % (voltage_points))
 
                 # set dependent reference type
@@ -275,6 +358,16 @@ def test_run():
                 else:
                     raise script.ScriptFail('Unknown power priority setting: %s')
 
+                # with active power priority the expected Q depends on the vars available at the measured P
+                eval_s_rated = None
+                test_evaluate = evaluate
+                if evaluate and priority == 'Active':
+                    eval_s_rated = s_rated
+                    if s_rated <= 0:
+                        ts.log_warning('Active power priority sweeps are not evaluated, eut.s_rated is required '
+                                       'to calculate the available vars')
+                        test_evaluate = False
+
                 # set volt/var curve
                 eut.volt_var_curve(1, params={
                     # convert curve points to percentages and set DER parameters
@@ -317,47 +410,70 @@ def test_run():
                         must trip requirements.
                         '''
 
+                        # skip sweeps completed in an earlier run of the test
+                        step = (priority, test, power, i)
+                        if cp is not None and cp.restore(step):
+                            if test_evaluate:
+                                for direction in ('high', 'low'):
+                                    test_str = 'VV_%s_%s_%s_%s_%s' % (priority.lower(), direction, str(test),
+                                                                       str(power), str(i))
+                                    ds = dataset.Dataset()
+                                    ds.from_csv(ts.result_file_path('%s.csv' % (test_str)))
+                                    sweep_evaluate(eval_results, ds, test_str, curve_v, curve_q, v_msa, var_msa,
+                                                   t_settling, voltage_points, float(daq.sample_interval)/1000,
+                                                   s_rated=eval_s_rated, q_ref=q_max_cap)
+                            continue
+                        timeline.begin('step', step=list(step))
+                        sweep_files = []
+
                         # test voltage high to low
                         # start capture
-                        test_str = 'VV_high_%s_%s_%s' % (str(test), str(power), str(i))
+                        test_str = 'VV_%s_high_%s_%s_%s' % (priority.lower(), str(test), str(power), str(i))
                         ts.log('Starting data capture for test %s, testing voltage high to low, with %s, '
                                'Power = %s%%, and sweep = %s' % (test_str, test_labels[test], power*100., i))
                         daq.data_capture(True)
 
-                        for v in reversed(voltage_points):
-                            ts.log('        Setting the grid voltage to %0.2f and waiting %0.1f seconds.' %
-                                   (v, t_settling))
-                            grid.voltage(v)
-                            ts.sleep(t_settling)
+                        voltage_sweep(grid, daq, list(reversed(voltage_points)), t_settling, detector, t_response)
 
                         # stop capture and save
                         daq.data_capture(False)
                         ds = daq.data_capture_dataset()
                         filename = '%s.csv' % (test_str)
-                        ds.to_csv(ts.result_file_path(filename))
+                        with timeline.span('save', file=filename):
+                            ds.to_csv(ts.result_file_path(filename))
                         ts.result_file(filename)
+                        sweep_files.append(filename)
                         ts.log('Saving data capture')
+                        if test_evaluate:
+                            sweep_evaluate(eval_results, ds, test_str, curve_v, curve_q, v_msa, var_msa,
+                                           t_settling, voltage_points, float(daq.sample_interval)/1000,
+                                           s_rated=eval_s_rated, q_ref=q_max_cap)
 
                         # test voltage low to high
                         # start capture
-                        test_str = 'VV_low_%s_%s_%s' % (str(test), str(power), str(i))
+                        test_str = 'VV_%s_low_%s_%s_%s' % (priority.lower(), str(test), str(power), str(i))
                         ts.log('Starting data capture for test %s, testing voltage low to high, with %s, '
                                'Power = %s%%, and sweep = %s' % (test_str, test_labels[test], power*100., i))
                         daq.data_capture(True)
 
-                        for v in voltage_points:
-                            ts.log('        Setting the grid voltage to %0.2f and waiting %0.1f seconds.' %
-                                   (v, t_settling))
-                            grid.voltage(v)
-                            ts.sleep(t_settling)
+                        voltage_sweep(grid, daq, voltage_points, t_settling, detector, t_response)
 
                         # stop capture and save
                         daq.data_capture(False)
                         ds = daq.data_capture_dataset()
                         filename = '%s.csv' % (test_str)
-                        ds.to_csv(ts.result_file_path(filename))
+                        with timeline.span('save', file=filename):
+                            ds.to_csv(ts.result_file_path(filename))
                         ts.result_file(filename)
+                        sweep_files.append(filename)
                         ts.log('Saving data capture')
+                        if test_evaluate:
+                            sweep_evaluate(eval_results, ds, test_str, curve_v, curve_q, v_msa, var_msa,
+                                           t_settling, voltage_points, float(daq.sample_interval)/1000,
+                                           s_rated=eval_s_rated, q_ref=q_max_cap)
+                        if cp is not None:
+                            cp.complete(step, sweep_files)
+                        timeline.end()
 
                         '''
                         9) Repeat test Steps (6) - (8) at power levels of 20 and 66%; as described by the following:
@@ -377,6 +493,18 @@ def test_run():
             other Priority, return the simulated EPS voltage to nominal, and repeat steps (5) - (10).
             '''
 
+        if evaluate and eval_results:
+            ds = volt_var_analysis.results_dataset(eval_results)
+            filename = 'vv_eval.csv'
+            with timeline.span('save', file=filename):
+                ds.to_csv(ts.result_file_path(filename))
+            ts.result_file(filename)
+            failed = len([p for p in ds.data[ds.points.index('PASS')] if not p])
+            ts.log('Volt-var evaluation: %s of %s voltage steps failed' % (failed, len(ds.data[0])))
+
+        if cp is not None:
+            cp.close()
+
         result = script.RESULT_COMPLETE
 
     except script.ScriptFail, e:
@@ -384,12 +512,16 @@ def test_run():
         if reason:
             ts.log_error(reason)
     finally:
+        if cp is not None:
+            cp.close(complete=False)
         if daq is not None:
             daq.close()
         if pv is not None:
             pv.close()
         if grid is not None:
             grid.close()
+        instrument.instrument_close(ts)
+        timeline.timeline_close(ts)
 
     return result
 
@@ -429,6 +561,17 @@ info.param('vv.n_r_66', label='Power level 66% - number of test repetitions', de
 info.param('vv.n_r_min', label='Power level minimum - number of test repetitions', default=3)
 info.param('vv.pp_active', label='Active power priority tests', default='Enabled', values=['Disabled', 'Enabled'])
 info.param('vv.pp_reactive', label='Reactive power priority tests', default='Enabled', values=['Disabled', 'Enabled'])
+info.param('vv.dwell', label='Voltage step dwell', default='Fixed', values=['Fixed', 'Adaptive'],
+           desc='Fixed waits the settling time at each voltage. Adaptive moves to the next voltage once Q and V are '
+                'within the stated accuracies, with the settling time as the maximum.')
+info.param('vv.ss_window', label='Steady state window (secs)', default=2.0,
+           active='vv.dwell', active_value=['Adaptive'])
+info.param('vv.t_response', label='EUT response time (secs)', default=1.0,
+           desc='Steady state is only evaluated on samples after the response time following each voltage step.',
+           active='vv.dwell', active_value=['Adaptive'])
+info.param('vv.evaluate', label='Evaluate Q(V) response', default='Disabled', values=['Disabled', 'Enabled'],
+           desc='Compare each voltage step of the captured sweeps with the programmed curve and save the results '
+                'in vv_eval.csv.')
 
 info.param_group('srd', label='Source Requirements Document', glob=True)
 # source requirements document
@@ -455,6 +598,10 @@ info.param('eut.vv_deadband_max', label='Deadband maximum range (V)', default=0.
 info.param('eut.vv_t_settling', label='Settling time (t)', default=0.0)
 
 der.params(info)
+vclock.params(info)
+checkpoint.params(info)
+instrument.params(info)
+timeline.params(info)
 gridsim.params(info)
 pvsim.params(info)
 das.params(info)
@@ -7,12 +7,17 @@ from svpelab import loadsim
 from svpelab import pvsim
 from svpelab import das
 from svpelab import der
+from svpelab import vclock
+from svpelab import checkpoint
+from svpelab import instrument
+from svpelab import timeline
+from svpelab import step_scheduler
+from svpelab import grid_profiles
 
 import sunspec.core.client as client
 
 import script
 import openpyxl
-import time
 
 def voltage_rt_profile(v_nom=100, v1_t=100, v2_t=100, v3_t=100, t_fall=0, t_hold=1, t_rise=0, t_dwell=5, n=5):
     """
@@ -48,9 +53,16 @@ def voltage_rt_profile(v_nom=100, v1_t=100, v2_t=100, v3_t=100, t_fall=0, t_hold
 def test_run():
 
     result = script.RESULT_FAIL
-    eut = grid = load = pv = daq_rms = daq_wf = None
+    eut = grid = load = pv = daq_rms = daq_wf = cp = None
 
     try:
+        # bind waits and timers to the selected clock
+        vclock.vclock_init(ts)
+        # record instrument command latency, if enabled
+        instrument.instrument_init(ts)
+        # record a timeline trace of the test, if enabled
+        timeline.timeline_init(ts)
+
         test_label = ts.param_value('vrt.test_label')
         # get test parameters
         phases = ts.param_value('eut.phases')
@@ -122,7 +134,7 @@ def test_run():
         pv.power_on()
 
         # initialize rms data acquisition
-        daq_rms = das.das_init(ts, 'das_rms')
+        daq_rms = das.das_init(ts, 'das_rms', sc_points=list(das.sc_points_default) + step_scheduler.sc_points)
         if daq_rms is not None:
             ts.log('DAS RMS device: %s' % (daq_rms.info()))
 
@@ -136,6 +148,9 @@ def test_run():
         if eut is not None:
             eut.config()
 
+        # completed phase tests of an earlier run of the test, if checkpoints are enabled
+        cp = checkpoint.checkpoint_init(ts)
+
         # perform all power levels and phase tests
         for power_level in power_levels:
             # set test power level
@@ -146,6 +161,11 @@ def test_run():
             ts.sleep(5)
 
             for phase_test in phase_tests:
+                step = (power_level[1], phase_test[2])
+                if cp is not None and cp.restore(step):
+                    continue
+                timeline.begin('step', step=list(step))
+                files = []
                 if daq_rms is not None:
                     ts.log('Starting RMS data capture')
                     daq_rms.data_capture(True)
@@ -157,44 +177,58 @@ def test_run():
                     grid.profile_load(profile=profile)
                     grid.profile_start()
                     # create countdown timer
-                    start_time = time.time()
+                    start_time = vclock.time()
                     profile_time = profile[-1][0]
                     ts.log('Profile duration is %s seconds' % profile_time)
-                    while (time.time() - start_time) < profile_time:
-                        remaining_time = profile_time - (time.time()-start_time)
+                    while (vclock.time() - start_time) < profile_time:
+                        remaining_time = profile_time - (vclock.time()-start_time)
                         ts.log('Sleeping for another %0.1f seconds' % remaining_time)
                         sleep_time = min(remaining_time, 10)
                         ts.sleep(sleep_time)
                     grid.profile_stop()
                 else:
-                    # execute test sequence
+                    # execute test sequence, each voltage step at its absolute time from the sequence start
                     ts.log('Test duration is %s seconds' % ((float(t_dwell) + float(t_hold)) * float(n_r) +
                                                             float(t_dwell)))
-                    ts.sleep(t_hold)
+                    v = (v_n/100) * v_nom
+                    v1 = (v_1/100) * v_nom
+                    v2 = (v_2/100) * v_nom
+                    v3 = (v_3/100) * v_nom
+                    scheduler = step_scheduler.StepScheduler(ts, daq=daq_rms)
+                    t = float(t_hold)
                     for i in range(n_r):
-                        v = (v_n/100) * v_nom
-                        v1 = (v_1/100) * v_nom
-                        v2 = (v_2/100) * v_nom
-                        v3 = (v_3/100) * v_nom
-
-                        grid.voltage((v, v, v))
-                        ts.log('Setting voltage: v_1 = %s  v_2 = %s  v_3 = %s for %s seconds' % (v, v, v,
-                                                                                                 t_dwell))
-                        ts.sleep(t_dwell)
-                        grid.voltage((v1, v2, v3))
-                        ts.log('Setting voltage: v_1 = %s  v_2 = %s  v_3 = %s for %s seconds' % (v1, v2, v3,
-                                                                                                 t_hold))
-                        ts.sleep(t_hold)
-                    grid.voltage((v, v, v))
-                    ts.log('Setting voltage: v_1 = %s  v_2 = %s  v_3 = %s for %s seconds' % (v, v, v, t_dwell))
-                    ts.sleep(t_dwell)
+                        scheduler.add(t, grid.voltage, (v, v, v),
+                                      label='v_1 = %s  v_2 = %s  v_3 = %s for %s seconds' % (v, v, v, t_dwell))
+                        t += t_dwell
+                        scheduler.add(t, grid.voltage, (v1, v2, v3),
+                                      label='v_1 = %s  v_2 = %s  v_3 = %s for %s seconds' % (v1, v2, v3, t_hold))
+                        t += t_hold
+                    scheduler.add(t, grid.voltage, (v, v, v),
+                                  label='v_1 = %s  v_2 = %s  v_3 = %s for %s seconds' % (v, v, v, t_dwell))
+                    scheduler.run(end=t + t_dwell)
+                    late_max, late_mean = scheduler.lateness()
+                    ts.log('Step lateness: max = %0.1f ms, mean = %0.1f ms' % (late_max * 1000, late_mean * 1000))
                 if daq_rms is not None:
                     daq_rms.data_capture(False)
                     ds = daq_rms.data_capture_dataset()
+                    if profile_supported:
+                        # add the commanded profile voltages for comparison with the measured values,
+                        # aligned on the clock time of the first captured sample
+                        t_first = daq_rms.first_sample_time if daq_rms.first_sample_time is not None else start_time
+                        grid_profiles.GridProfile(profile, v_nom=v_nom).overlay(
+                            ds, t_offset=start_time - t_first, sample_interval=float(daq_rms.sample_interval)/1000)
                     filename = '%s_rms_%s_%s.csv' % (test_label, phase_test[2], power_level[1])
-                    ds.to_csv(ts.result_file_path(filename))
+                    with timeline.span('save', file=filename):
+                        ds.to_csv(ts.result_file_path(filename))
                     ts.result_file(filename)
+                    files.append(filename)
                     ts.log('Saving data capture %s' % (filename))
+                if cp is not None:
+                    cp.complete(step, files)
+                timeline.end()
+
+        if cp is not None:
+            cp.close()
 
         result = script.RESULT_COMPLETE
 
@@ -203,6 +237,8 @@ def test_run():
         if reason:
             ts.log_error(reason)
     finally:
+        if cp is not None:
+            cp.close(complete=False)
         if eut is not None:
             eut.close()
         if grid is not None:
@@ -215,6 +251,8 @@ def test_run():
             daq_rms.close()
         if daq_wf is not None:
             daq_wf.close()
+        instrument.instrument_close(ts)
+        timeline.timeline_close(ts)
 
     return result
 
@@ -302,6 +340,10 @@ info.param('vrt.phase_1_3', label='Phase 1-3 Fault Tests', default='Enabled', va
            active='eut.phases', active_value=['3-Phase 4-Wire'])
 
 der.params(info)
+vclock.params(info)
+checkpoint.params(info)
+instrument.params(info)
+timeline.params(info)
 das.params(info, 'das_rms', 'Data Acquisition (RMS)')
 das.params(info, 'das_wf', 'Data Acquisition (Waveform)')
 gridsim.params(info)